@@ -0,0 +1,126 @@
+"""Benchmark for the business_logic lookup paths at production-like sizes.
+
+Raises MOCK_DATA_SIZE before common.business_logic is imported, then times
+the indexed repository lookups against the linear scans they replaced.
+
+    python bench/business_lookup.py --customers 1000000 --appointments 200000 --orders 200000
+    python bench/business_lookup.py --customers 1000000 --sqlite
+
+With --sqlite the same dataset is bulk loaded into a temporary SQLite
+database and the lookups are repeated against SqliteRepository.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time business_logic lookups against a large mock dataset")
+    parser.add_argument("--customers", type=int, default=1_000_000)
+    parser.add_argument("--appointments", type=int, default=200_000)
+    parser.add_argument("--orders", type=int, default=200_000)
+    parser.add_argument("--lookups", type=int, default=10_000, help="Indexed lookups per operation")
+    parser.add_argument("--scans", type=int, default=20, help="Linear-scan lookups per operation (they are slow)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--sqlite", action="store_true", help="Also benchmark the SQLite backend")
+    return parser.parse_args()
+
+
+def time_per_call(fn, keys):
+    """Median and p99 microseconds per call over keys"""
+    timings = []
+    for key in keys:
+        started = time.perf_counter()
+        fn(key)
+        timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+
+
+def run_async(coro_fn):
+    loop = asyncio.new_event_loop()
+    return lambda key: loop.run_until_complete(coro_fn(key))
+
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+    sys.path.insert(0, ROOT)
+
+    from common import config
+    config.MOCK_DATA_SIZE.update(customers=args.customers, appointments=args.appointments, orders=args.orders)
+
+    started = time.perf_counter()
+    from common import business_logic
+    business_logic.get_repository()
+    print(f"Generated and indexed {args.customers} customers, {args.appointments} appointments, "
+          f"{args.orders} orders in {time.perf_counter() - started:.1f}s")
+
+    data = business_logic.MOCK_DATA
+    customers = data["customers"]
+    sample = [random.choice(customers) for _ in range(args.lookups)]
+    scan_sample = sample[:args.scans]
+
+    # The linear scans business_logic used before the repository
+    scans = {
+        "customer by phone": lambda c: next((x for x in customers if x["phone"] == c["phone"]), None),
+        "customer by email": lambda c: next((x for x in customers if x["email"] == c["email"]), None),
+        "appointments": lambda c: [a for a in data["appointments"] if a["customer_id"] == c["id"]],
+        "orders": lambda c: [o for o in data["orders"] if o["customer_id"] == c["id"]],
+    }
+    print(f"\n{'operation':<22}{'scan p50 us':>14}{'indexed p50 us':>16}{'indexed p99 us':>16}{'speedup':>10}")
+    report_lookups(business_logic, sample, scans, scan_sample)
+    report_slots(business_logic, customers)
+
+    if args.sqlite:
+        from common.database import open_database
+
+        with tempfile.TemporaryDirectory() as workdir:
+            started = time.perf_counter()
+            repository = open_database(os.path.join(workdir, "business_data.db"))
+            repository.bulk_load(data)
+            print(f"\nBulk loaded into SQLite in {time.perf_counter() - started:.1f}s")
+            business_logic.set_repository(repository)
+            print(f"{'operation':<22}{'scan p50 us':>14}{'sqlite p50 us':>16}{'sqlite p99 us':>16}{'speedup':>10}")
+            report_lookups(business_logic, sample, scans, scan_sample)
+            report_slots(business_logic, customers)
+            repository.close()
+
+
+def report_lookups(business_logic, sample, scans, scan_sample):
+    indexed = {
+        "customer by phone": run_async(lambda c: business_logic.get_customer(phone=c["phone"])),
+        "customer by email": run_async(lambda c: business_logic.get_customer(email=c["email"])),
+        "appointments": run_async(lambda c: business_logic.get_customer_appointments(c["id"])),
+        "orders": run_async(lambda c: business_logic.get_customer_orders(c["id"])),
+    }
+    for name in indexed:
+        scan_p50, _ = time_per_call(scans[name], scan_sample)
+        index_p50, index_p99 = time_per_call(indexed[name], sample)
+        print(f"{name:<22}{scan_p50:>14.1f}{index_p50:>16.1f}{index_p99:>16.1f}{scan_p50 / index_p50:>9.0f}x")
+
+
+def report_slots(business_logic, customers):
+    # A week of hourly slots, before and after booking into it
+    start = datetime.now().replace(minute=0, second=0, microsecond=0)
+    week = (start.isoformat(), (start + timedelta(days=7)).isoformat())
+    slots = run_async(lambda _: business_logic.get_available_appointment_slots(*week))
+    slot_p50, slot_p99 = time_per_call(slots, range(100))
+    free = asyncio.run(business_logic.get_available_appointment_slots(*week))["available_slots"]
+    asyncio.run(business_logic.schedule_appointment(customers[0]["id"], free[0], "Consultation"))
+    after = asyncio.run(business_logic.get_available_appointment_slots(*week))["available_slots"]
+    print(f"slots for one week: p50 {slot_p50:.1f}us p99 {slot_p99:.1f}us "
+          f"({len(free)} free, {len(after)} after booking one: index "
+          f"{'consistent' if len(after) == len(free) - 1 else 'INCONSISTENT'})")
+
+
+if __name__ == "__main__":
+    main()
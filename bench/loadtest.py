@@ -0,0 +1,688 @@
+"""Offline load test for the voice path in call.py.
+
+Spins up local stand-ins for Freshdesk, Groq, Twilio REST and the Deepgram
+agent WebSocket, then drives synthetic Twilio media streams into
+handle_twilio_websocket at real-time mu-law cadence (one 20 ms frame per
+message). Nothing here talks to the real services.
+
+    python bench/loadtest.py --calls 10 --duration 30
+    python bench/loadtest.py --ramp 1,5,10,25,50 --audio recording.wav
+    python bench/loadtest.py --calls 5 --ingestion
+    python bench/loadtest.py --calls 5 --ingestion --cameras 3
+
+The stand-ins run in a separate process so CPU and event-loop lag are
+measured for call.py alone.
+"""
+import argparse
+import array
+import asyncio
+import audioop
+import base64
+import json
+import math
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import types
+import uuid
+import wave
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import websockets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TWILIO_FRAME_SECONDS = 0.02
+TWILIO_FRAME_BYTES = 160  # 20 ms of 8 kHz mu-law
+DEEPGRAM_UPLINK_BYTES_PER_SECOND = 48000 * 2  # linear16 at DEEPGRAM_INPUT_RATE
+DEEPGRAM_CHUNK_BYTES = 640  # 20 ms of 16 kHz linear16
+
+
+# ---------------------------------------------------------------------------
+# Audio
+# ---------------------------------------------------------------------------
+
+def synthetic_audio(seconds=10, rate=8000):
+    """Speech-like bursts (harmonics with a syllable envelope) separated by near-silence"""
+    rng = random.Random(7)
+    samples = array.array("h")
+    for n in range(int(seconds * rate)):
+        t = n / rate
+        in_speech = (t % 4.0) < 1.5
+        if in_speech:
+            envelope = 0.5 + 0.5 * math.sin(2 * math.pi * 4 * t)
+            value = sum(math.sin(2 * math.pi * f * t) / k for k, f in enumerate((140, 280, 420, 700), 1))
+            samples.append(int(6000 * envelope * value))
+        else:
+            samples.append(rng.randint(-40, 40))
+    return audioop.lin2ulaw(samples.tobytes(), 2)
+
+
+def load_frames(path=None):
+    """Base64 mu-law 20 ms frames, from a recording or synthesized.
+
+    Accepts PCM WAV files (any rate/width/channels) or raw 8 kHz mu-law
+    (.ulaw/.raw) such as a dumped Twilio stream.
+    """
+    if not path:
+        mulaw = synthetic_audio()
+    elif path.endswith((".ulaw", ".raw")):
+        with open(path, "rb") as f:
+            mulaw = f.read()
+    else:
+        with wave.open(path) as wav:
+            width = wav.getsampwidth()
+            rate = wav.getframerate()
+            channels = wav.getnchannels()
+            pcm = wav.readframes(wav.getnframes())
+        if channels == 2:
+            pcm = audioop.tomono(pcm, width, 0.5, 0.5)
+        if width != 2:
+            pcm = audioop.lin2lin(pcm, width, 2)
+        if rate != 8000:
+            pcm, _ = audioop.ratecv(pcm, 2, 1, rate, 8000, None)
+        mulaw = audioop.lin2ulaw(pcm, 2)
+
+    return [
+        base64.b64encode(mulaw[i:i + TWILIO_FRAME_BYTES]).decode("ascii")
+        for i in range(0, len(mulaw) - TWILIO_FRAME_BYTES + 1, TWILIO_FRAME_BYTES)
+    ]
+
+
+def agent_audio_chunk():
+    """20 ms of a 220 Hz tone as 16 kHz linear16, standing in for TTS output"""
+    samples = array.array("h", (int(4000 * math.sin(2 * math.pi * 220 * n / 16000)) for n in range(320)))
+    return samples.tobytes()
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+# ---------------------------------------------------------------------------
+# Stand-ins (run in the child process)
+# ---------------------------------------------------------------------------
+
+async def fake_deepgram(websocket, path, config, stats):
+    """Deepgram agent stand-in: Welcome, SettingsApplied, spoken replies.
+
+    Every `turn_seconds` of uplink audio it pretends the responder finished a
+    sentence and answers with `reply_seconds` of audio streamed in real time.
+    With `drop_after` set, each session is cut off abnormally after that many
+    seconds of uplink audio, to exercise the mid-call reconnect.
+    """
+    chunk = agent_audio_chunk()
+    turn_bytes = int(config["turn_seconds"] * DEEPGRAM_UPLINK_BYTES_PER_SECOND)
+    received = 0
+    next_turn = turn_bytes
+    drop_bytes = int(config["drop_after"] * DEEPGRAM_UPLINK_BYTES_PER_SECOND) if config["drop_after"] else None
+    reply_task = None
+
+    async def reply(text):
+        await websocket.send(json.dumps({"type": "ConversationText", "role": "assistant", "content": text}))
+        await websocket.send(json.dumps({"type": "AgentStartedSpeaking"}))
+        started = time.perf_counter()
+        for i in range(int(config["reply_seconds"] / 0.02)):
+            delay = started + i * 0.02 - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await websocket.send(chunk)
+            stats["downlink_chunks"] += 1
+        await websocket.send(json.dumps({"type": "AgentAudioDone"}))
+
+    def start_reply(text):
+        nonlocal reply_task
+        if reply_task and not reply_task.done():
+            reply_task.cancel()
+        reply_task = asyncio.create_task(reply(text))
+
+    stats["sessions"] += 1
+    await websocket.send(json.dumps({"type": "Welcome", "request_id": str(uuid.uuid4())}))
+    try:
+        async for message in websocket:
+            if isinstance(message, bytes):
+                received += len(message)
+                stats["uplink_bytes"] += len(message)
+                stats["uplink_messages"] += 1
+                if drop_bytes and received >= drop_bytes:
+                    stats["drops"] += 1
+                    await websocket.close(code=1011, reason="loadtest drop")
+                    break
+                if received >= next_turn:
+                    next_turn += turn_bytes
+                    await websocket.send(json.dumps({"type": "UserStartedSpeaking"}))
+                    await websocket.send(json.dumps({"type": "ConversationText", "role": "user", "content": "Copy that."}))
+                    start_reply("Thank you, sending the evidence now.")
+                continue
+
+            data = json.loads(message)
+            message_type = data.get("type")
+            stats["control_messages"] += 1
+            if message_type == "Settings":
+                if data["agent"].get("context", {}).get("messages"):
+                    stats["resumed_sessions"] += 1
+                await asyncio.sleep(config["settings_delay"])
+                await websocket.send(json.dumps({"type": "SettingsApplied"}))
+            elif message_type == "InjectAgentMessage":
+                start_reply(data.get("content", ""))
+    except websockets.exceptions.ConnectionClosed:
+        pass
+    finally:
+        if reply_task:
+            reply_task.cancel()
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    """Freshdesk REST and Groq chat-completions stand-in"""
+
+    tickets = []
+    cameras = 1
+    latency = 0.05
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if self.path.startswith("/images/"):
+            return self.image()
+        if self.path.startswith("/api/v2/tickets?"):
+            return self._reply(200, self.tickets)
+        if self.path.startswith("/api/v2/tickets/"):
+            ticket_id = self.path.rsplit("/", 1)[-1]
+            for ticket in self.tickets:
+                if str(ticket["id"]) == ticket_id:
+                    return self._reply(200, ticket)
+        return self._reply(404, {})
+
+    def do_PUT(self):
+        time.sleep(self.latency)
+        body = self._body()
+        return self._reply(200, {"id": self.path.rsplit("/", 1)[-1], **body})
+
+    def do_POST(self):
+        if self.path.startswith("/v1/speak"):
+            return self.speak()
+        if self.path.endswith("/tickets/bulk_update"):
+            time.sleep(self.latency)
+            return self._reply(202, {"job_id": uuid.uuid4().hex})
+        if not self.path.endswith("/chat/completions"):
+            return self._reply(404, {})
+        body = self._body()
+        prompt = body["messages"][0]["content"]
+        ticket_ids = [line.split()[2] for line in prompt.splitlines() if line.startswith("### Ticket ") and len(line.split()) > 2]
+        time.sleep(self.latency * (1 + len(ticket_ids)))
+
+        def extraction(ticket_id):
+            return {
+                "phone_number": "03013225853",
+                "incident_type": "fire",
+                "address": incident_address(int(ticket_id), self.cameras),
+                "priority": 1,
+                "confidence_score": 0.95,
+                "image_urls": [f"http://127.0.0.1:{self.server.server_port}/images/{ticket_id}.bmp"],
+            }
+
+        if ticket_ids:
+            content = {"tickets": [{**extraction(ticket_id), "ticket_id": ticket_id} for ticket_id in ticket_ids]}
+        else:
+            content = extraction(prompt.split("Ticket-Id: ", 1)[1].split()[0])
+        return self._reply(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps(content)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    def image(self):
+        """Camera frame stand-in: every camera of an incident sends the same picture under its own URL"""
+        ticket_id = int(self.path.rsplit("/", 1)[-1].split(".")[0])
+        payload = synthetic_frame(incident_address(ticket_id, self.cameras))
+        self.send_response(200)
+        self.send_header("Content-Type", "image/bmp")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def speak(self):
+        """Deepgram TTS stand-in: ~65 ms of 8 kHz mu-law per character"""
+        text = self._body().get("text", "")
+        time.sleep(self.latency * 4)
+        samples = array.array("h", (int(3000 * math.sin(2 * math.pi * 180 * n / 8000)) for n in range(len(text) * 520)))
+        payload = audioop.lin2ulaw(samples.tobytes(), 2)
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/basic")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def synthetic_frame(seed, width=640, height=480):
+    """A 24-bit BMP gradient, different per seed (BMP needs no encoder, and Pillow can read it)"""
+    shade = sum(seed.encode()) % 256
+    row = bytes((x * 255 // width, shade, (x + shade) % 256)[c] for x in range(width) for c in range(3))
+    pixels = row * height
+    header = b"BM" + (54 + len(pixels)).to_bytes(4, "little") + bytes(4) + (54).to_bytes(4, "little")
+    info = (40).to_bytes(4, "little") + width.to_bytes(4, "little") + height.to_bytes(4, "little")
+    info += (1).to_bytes(2, "little") + (24).to_bytes(2, "little") + bytes(4) + len(pixels).to_bytes(4, "little")
+    info += bytes(16)
+    return header + info + pixels
+
+
+def incident_address(ticket_id, cameras):
+    """Consecutive ticket ids are `cameras` views of one incident, so they share an address"""
+    level, index = divmod(ticket_id, 100000)
+    return f"{level * 100000 + index // cameras + 1} Main Street, Lahore"
+
+
+def synthetic_ticket(ticket_id, cameras=1):
+    return {
+        "id": ticket_id,
+        "status": 2,
+        "subject": (
+            f"1- Incident Type: Fire Incident Detected\n2- Address: {incident_address(ticket_id, cameras)}\n"
+            "3- Phone: 923013225853\n4- Confidence Score: 95%\n"
+        ),
+        "description": f"Incident is critical\nTicket-Id: {ticket_id}",
+    }
+
+
+async def fake_call(call_sid, config, frames):
+    """One Twilio media stream: start, real-time media frames, stop"""
+    result = {
+        "call_sid": call_sid,
+        "first_audio_ms": None,
+        "frames_sent": 0,
+        "frames_received": 0,
+        "late_frames": 0,
+        "clears": 0,
+        "error": None,
+    }
+    await asyncio.sleep(config["ring_delay"])
+    stream_sid = f"MZ{uuid.uuid4().hex}"
+    total_frames = int(config["duration"] / TWILIO_FRAME_SECONDS)
+
+    async def receive(websocket, started):
+        async for message in websocket:
+            data = json.loads(message)
+            if data.get("event") == "media":
+                if result["first_audio_ms"] is None:
+                    result["first_audio_ms"] = (time.perf_counter() - started) * 1000
+                result["frames_received"] += 1
+            elif data.get("event") == "clear":
+                result["clears"] += 1
+
+    try:
+        # Twilio does not negotiate permessage-deflate on media streams
+        async with websockets.connect(config["media_url"], max_size=None, compression=None) as websocket:
+            await websocket.send(json.dumps({"event": "connected", "protocol": "Call", "version": "1.0.0"}))
+            started = time.perf_counter()
+            await websocket.send(json.dumps({
+                "event": "start",
+                "sequenceNumber": "1",
+                "streamSid": stream_sid,
+                "start": {
+                    "callSid": call_sid,
+                    "streamSid": stream_sid,
+                    "mediaFormat": {"encoding": "audio/x-mulaw", "sampleRate": 8000, "channels": 1},
+                },
+            }))
+            receiver = asyncio.create_task(receive(websocket, started))
+            for i in range(total_frames):
+                delay = started + i * TWILIO_FRAME_SECONDS - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif delay < -TWILIO_FRAME_SECONDS:
+                    result["late_frames"] += 1
+                await websocket.send(json.dumps({
+                    "event": "media",
+                    "sequenceNumber": str(i + 2),
+                    "streamSid": stream_sid,
+                    "media": {
+                        "track": "inbound",
+                        "chunk": str(i + 1),
+                        "timestamp": str(i * 20),
+                        "payload": frames[i % len(frames)],
+                    },
+                }))
+                result["frames_sent"] += 1
+            await websocket.send(json.dumps({"event": "stop", "streamSid": stream_sid, "stop": {"callSid": call_sid}}))
+            receiver.cancel()
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+async def run_stand_ins(config, command_queue, result_queue, ready):
+    frames = load_frames(config["audio"])
+    stats = {
+        "sessions": 0, "uplink_bytes": 0, "uplink_messages": 0,
+        "control_messages": 0, "downlink_chunks": 0, "drops": 0, "resumed_sessions": 0,
+    }
+    deepgram_server = await websockets.serve(
+        partial(fake_deepgram, config=config, stats=stats), "127.0.0.1", config["deepgram_port"], max_size=None
+    )
+
+    FakeApiHandler.latency = config["api_latency"]
+    api_server = ThreadingHTTPServer(("127.0.0.1", config["api_port"]), FakeApiHandler)
+    threading.Thread(target=api_server.serve_forever, daemon=True).start()
+    ready.set()
+
+    loop = asyncio.get_running_loop()
+    callers = []
+    while True:
+        command = await loop.run_in_executor(None, command_queue.get)
+        if command[0] == "call":
+            callers.append(asyncio.create_task(fake_call(command[1], config, frames)))
+        elif command[0] == "tickets":
+            FakeApiHandler.cameras = command[2]
+            FakeApiHandler.tickets = [synthetic_ticket(ticket_id, command[2]) for ticket_id in command[1]]
+        elif command[0] == "collect":
+            calls = await asyncio.gather(*callers)
+            callers = []
+            result_queue.put({"calls": calls, "deepgram": dict(stats)})
+            for key in stats:
+                stats[key] = 0
+        elif command[0] == "exit":
+            break
+
+    deepgram_server.close()
+    api_server.shutdown()
+
+
+def stand_in_process(config, command_queue, result_queue, ready):
+    asyncio.run(run_stand_ins(config, command_queue, result_queue, ready))
+
+
+# ---------------------------------------------------------------------------
+# System under test (main process)
+# ---------------------------------------------------------------------------
+
+class FakeTwilioClient:
+    """Twilio REST stand-in: calls.create() returns a CallSid and 'answers' the call.
+
+    `answer(call_sid)` is called from the worker thread once the call is
+    placed; it stands in for Twilio fetching the TwiML of the answered leg.
+    """
+
+    def __init__(self, command_queue, latency, answer=None):
+        self.calls = types.SimpleNamespace(create=self.create_call)
+        self.command_queue = command_queue
+        self.latency = latency
+        self.answer = answer
+
+    def create_call(self, **kwargs):
+        time.sleep(self.latency)
+        call_sid = f"CA{uuid.uuid4().hex}"
+        self.command_queue.put(("call", call_sid))
+        if self.answer:
+            self.answer(call_sid)
+        return types.SimpleNamespace(sid=call_sid)
+
+
+async def measure_loop_lag(samples, interval=0.01):
+    """Record how late a periodic sleep wakes up (event-loop scheduling delay)"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - started - interval) * 1000)
+
+
+async def run_level(call, args, concurrency, level_index, command_queue, result_queue, lag_samples):
+    from common.evidence import EVIDENCE_FETCHES  # After main() has pointed EVIDENCE_CACHE_DIR at a temp dir
+
+    loop = asyncio.get_running_loop()
+    frames_in_before = call.MEDIA_FRAMES.labels("in").value
+    reconnects_before = call.DEEPGRAM_RECONNECTS.labels("ok").value
+    audio_lost_before = call.DEEPGRAM_RECONNECT_AUDIO_LOST.labels().value
+    duplicates_before = call.DUPLICATE_TICKETS.labels().value
+    evidence_before = {result: EVIDENCE_FETCHES.labels(result).value for result in ("stored", "duplicate", "failed")}
+    lag_samples.clear()
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+
+    if args.ingestion:
+        ticket_ids = [level_index * 100000 + i for i in range(concurrency * args.cameras)]
+        command_queue.put(("tickets", ticket_ids, args.cameras))
+        call.processed_tickets.clear()
+        call.PIPELINE_DIAL_CONCURRENCY = concurrency
+        # The stand-in picks up after --ring-delay, as /twilio/incoming would see it
+        answer = lambda call_sid: loop.call_soon_threadsafe(
+            loop.call_later, args.ring_delay, call.ESCALATIONS.answered, call_sid
+        )
+        await call.run_ingestion_pipeline(FakeTwilioClient(command_queue, args.api_latency, answer))
+    else:
+        for i in range(concurrency):
+            call_sid = f"CA{uuid.uuid4().hex}"
+            ticket = {
+                "ticket_id": level_index * 100000 + i,
+                "phone_number": "+923013225853",
+                "incident_type": "fire",
+                "address": "123 Main Street, Lahore",
+                "priority": 1,
+                "confidence_score": 0.95,
+                "image_urls": [],
+            }
+            call.active_calls.add(call.CallSession(call_sid, ticket))
+            # What dial_ticket does right after the Twilio REST call
+            call.prerender_greeting(call_sid, ticket)
+            command_queue.put(("call", call_sid))
+
+    command_queue.put(("collect",))
+    result = await loop.run_in_executor(None, result_queue.get)
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+    # Let per-call cleanup finish before the next level starts
+    await asyncio.sleep(1)
+
+    calls = result["calls"]
+    first_audio = [c["first_audio_ms"] for c in calls if c["first_audio_ms"] is not None]
+    frames_sent = sum(c["frames_sent"] for c in calls)
+    frames_in = call.MEDIA_FRAMES.labels("in").value - frames_in_before
+    errors = [c["error"] for c in calls if c["error"]]
+    lag = list(lag_samples)
+
+    report = {
+        "concurrency": concurrency,
+        "calls": len(calls),
+        "errors": len(errors),
+        "first_audio_p50_ms": percentile(first_audio, 50),
+        "first_audio_p95_ms": percentile(first_audio, 95),
+        "no_audio_calls": len(calls) - len(first_audio),
+        "inbound_delivery": frames_in / frames_sent if frames_sent else 0.0,
+        "caller_late_frames": sum(c["late_frames"] for c in calls),
+        "barge_in_clears": sum(c["clears"] for c in calls),
+        "agent_frames_per_call": statistics.mean(c["frames_received"] for c in calls) if calls else 0,
+        "cpu_seconds": cpu,
+        "cpu_pct_per_call": 100 * cpu / wall / max(concurrency, 1),
+        "loop_lag_p50_ms": percentile(lag, 50),
+        "loop_lag_p99_ms": percentile(lag, 99),
+        "loop_lag_max_ms": max(lag) if lag else None,
+        "deepgram_uplink_messages": result["deepgram"]["uplink_messages"],
+        "deepgram_drops": result["deepgram"]["drops"],
+        "deepgram_reconnects": call.DEEPGRAM_RECONNECTS.labels("ok").value - reconnects_before,
+        "reconnect_audio_lost_ms": call.DEEPGRAM_RECONNECT_AUDIO_LOST.labels().value - audio_lost_before,
+        "duplicate_tickets": call.DUPLICATE_TICKETS.labels().value - duplicates_before,
+        "evidence": {result: EVIDENCE_FETCHES.labels(result).value - before for result, before in evidence_before.items()},
+        "first_errors": errors[:3],
+    }
+    report["sustainable"] = (
+        report["errors"] == 0
+        and report["no_audio_calls"] == 0
+        and report["inbound_delivery"] >= args.min_delivery
+        and (report["loop_lag_p99_ms"] or 0) <= args.max_lag_ms
+        and (report["first_audio_p95_ms"] or 0) <= args.max_first_audio_ms
+    )
+    return report
+
+
+async def run_levels(call, args, levels, command_queue, result_queue):
+    server = await websockets.serve(call.handle_twilio_websocket, "127.0.0.1", args.media_port, max_size=None)
+    lag_samples = []
+    lag_task = asyncio.create_task(measure_loop_lag(lag_samples))
+    # Attribute any stall to a call and a stack, as production does
+    call.LoopMonitor("media", call.logger).start()
+    reports = []
+    try:
+        for level_index, concurrency in enumerate(levels):
+            print(f"▶ {concurrency} simultaneous calls for {args.duration}s ...", flush=True)
+            report = await run_level(call, args, concurrency, level_index, command_queue, result_queue, lag_samples)
+            reports.append(report)
+            print_report(report)
+            if not report["sustainable"] and not args.keep_going:
+                break
+    finally:
+        lag_task.cancel()
+        server.close()
+    return reports
+
+
+def fmt(value, digits=1):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+def print_report(report):
+    print(
+        f"  calls={report['calls']} errors={report['errors']} "
+        f"first_audio p50/p95={fmt(report['first_audio_p50_ms'], 0)}/{fmt(report['first_audio_p95_ms'], 0)}ms "
+        f"delivery={report['inbound_delivery']:.3f} "
+        f"cpu/call={report['cpu_pct_per_call']:.2f}% "
+        f"loop lag p50/p99/max={fmt(report['loop_lag_p50_ms'])}/{fmt(report['loop_lag_p99_ms'])}/{fmt(report['loop_lag_max_ms'])}ms "
+        f"{'OK' if report['sustainable'] else 'OVERLOADED'}"
+    )
+    if report["deepgram_drops"]:
+        print(
+            f"  deepgram drops={report['deepgram_drops']} reconnects={report['deepgram_reconnects']:.0f} "
+            f"audio lost={report['reconnect_audio_lost_ms']:.0f}ms"
+        )
+    if report["duplicate_tickets"]:
+        print(f"  duplicate tickets linked instead of dialed={report['duplicate_tickets']:.0f}")
+    if any(report["evidence"].values()):
+        print("  evidence prefetched " + " ".join(f"{result}={count:.0f}" for result, count in report["evidence"].items()))
+    for error in report["first_errors"]:
+        print(f"    error: {error}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline load test for the Twilio <-> Deepgram voice path")
+    parser.add_argument("--calls", type=int, default=5, help="Simultaneous calls (ignored with --ramp)")
+    parser.add_argument("--ramp", help="Comma separated concurrency levels, e.g. 1,5,10,25")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of audio streamed per call")
+    parser.add_argument("--audio", help="WAV or raw mu-law recording to replay (default: synthetic speech)")
+    parser.add_argument("--ingestion", action="store_true",
+                        help="Start calls through the Freshdesk -> Groq -> Twilio pipeline instead of directly")
+    parser.add_argument("--cameras", type=int, default=1,
+                        help="With --ingestion: tickets per incident (duplicates should not be dialed)")
+    parser.add_argument("--ring-delay", type=float, default=1.0, help="Seconds between dial and media start")
+    parser.add_argument("--settings-delay", type=float, default=0.2, help="Fake Deepgram SettingsApplied delay")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="Fake REST/LLM latency in seconds")
+    parser.add_argument("--turn-seconds", type=float, default=6.0, help="Uplink audio between fake agent replies")
+    parser.add_argument("--reply-seconds", type=float, default=2.0, help="Length of each fake agent reply")
+    parser.add_argument("--drop-deepgram-after", type=float, default=0.0,
+                        help="Cut each fake Deepgram session after this many seconds of audio (tests reconnects)")
+    parser.add_argument("--max-lag-ms", type=float, default=50.0, help="Loop lag p99 budget for a sustainable level")
+    parser.add_argument("--max-first-audio-ms", type=float, default=3000.0, help="First-audio p95 budget")
+    parser.add_argument("--min-delivery", type=float, default=0.99, help="Minimum fraction of frames forwarded")
+    parser.add_argument("--keep-going", action="store_true", help="Run every ramp level even after overload")
+    parser.add_argument("--media-port", type=int, default=18080)
+    parser.add_argument("--deepgram-port", type=int, default=18081)
+    parser.add_argument("--api-port", type=int, default=18082)
+    parser.add_argument("--json", help="Write the level reports to this file")
+    parser.add_argument("--verbose", action="store_true", help="Keep call.py INFO logging")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    levels = [int(level) for level in args.ramp.split(",")] if args.ramp else [args.calls]
+
+    # call.py validates its configuration at import time; point it at the stand-ins
+    os.environ.update({
+        "DEEPGRAM_API_KEY": "loadtest",
+        "TWILIO_ACCOUNT_SID": "ACloadtest",
+        "TWILIO_AUTH_TOKEN": "loadtest",
+        "TWILIO_PHONE_NUMBER": "+15550000000",
+        "WEBHOOK_URL": "http://127.0.0.1:5000/twilio/incoming",
+        "WEBSOCKET_URL": f"ws://127.0.0.1:{args.media_port}",
+        "FRESHDESK_URL": f"http://127.0.0.1:{args.api_port}",
+        "GROQ_BASE_URL": f"http://127.0.0.1:{args.api_port}",
+        "GROQ_API_KEY": "loadtest",
+        "DEEPGRAM_SPEAK_URL": f"http://127.0.0.1:{args.api_port}/v1/speak",
+        "EVIDENCE_CACHE_DIR": tempfile.mkdtemp(prefix="loadtest-evidence-"),
+    })
+    sys.path.insert(0, ROOT)
+    import call
+    import logging
+
+    if not args.verbose:
+        call.logger.setLevel(logging.WARNING)
+    call.VOICE_AGENT_URL = f"ws://127.0.0.1:{args.deepgram_port}"
+    call.DIAL_SPACING = 0
+
+    config = {
+        "audio": args.audio,
+        "duration": args.duration,
+        "ring_delay": args.ring_delay,
+        "settings_delay": args.settings_delay,
+        "api_latency": args.api_latency,
+        "turn_seconds": args.turn_seconds,
+        "reply_seconds": args.reply_seconds,
+        "drop_after": args.drop_deepgram_after,
+        "media_url": f"ws://127.0.0.1:{args.media_port}",
+        "deepgram_port": args.deepgram_port,
+        "api_port": args.api_port,
+    }
+    context = multiprocessing.get_context("spawn")
+    command_queue = context.Queue()
+    result_queue = context.Queue()
+    ready = context.Event()
+    stand_ins = context.Process(
+        target=stand_in_process, args=(config, command_queue, result_queue, ready), daemon=True
+    )
+    stand_ins.start()
+    if not ready.wait(30):
+        sys.exit("Stand-in services did not start")
+
+    try:
+        reports = asyncio.run(run_levels(call, args, levels, command_queue, result_queue))
+    finally:
+        command_queue.put(("exit",))
+        stand_ins.join(5)
+
+    sustainable = [report["concurrency"] for report in reports if report["sustainable"]]
+    print(f"\nMax sustainable concurrency: {max(sustainable) if sustainable else 'none of the tested levels'}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
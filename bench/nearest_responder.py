@@ -0,0 +1,102 @@
+"""Nearest-responder lookup latency for the routing grid index.
+
+Scatters N responders over a city-sized box, then times k-nearest queries
+against ResponderIndex and against a linear scan (checking both agree), and
+times an incremental dataset reload where 1% of responders moved.
+
+    python bench/nearest_responder.py --responders 50000
+    python bench/nearest_responder.py --responders 20000 --cell 0.01 --busy 0.3
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Roughly Lahore
+CENTER = (31.52, 74.35)
+SPAN_DEGREES = 0.4
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time k-nearest responder lookups")
+    parser.add_argument("--responders", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--cell", type=float, default=0.02, help="Grid cell size in degrees")
+    parser.add_argument("--busy", type=float, default=0.1, help="Fraction of responders on a call")
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args()
+
+
+def random_point(rng):
+    return (
+        CENTER[0] + rng.uniform(-SPAN_DEGREES / 2, SPAN_DEGREES / 2),
+        CENTER[1] + rng.uniform(-SPAN_DEGREES / 2, SPAN_DEGREES / 2),
+    )
+
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1e6
+
+
+def summary(label, samples_us):
+    samples = sorted(samples_us)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{label:<28}p50 {statistics.median(samples):>9.1f} us   p99 {p99:>9.1f} us   max {samples[-1]:>9.1f} us")
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, ROOT)
+    from common.geo import Responder, ResponderIndex, haversine_km
+
+    rng = random.Random(args.seed)
+    types = ("fire", "medical", "police")
+
+    def responder(i, point):
+        return Responder(f"r{i}", None, f"+9230{i:08d}", *point, incident_types=(types[i % 3],))
+
+    responders = [responder(i, random_point(rng)) for i in range(args.responders)]
+    index = ResponderIndex(cell_degrees=args.cell)
+    _, build_us = timed(index.sync, responders)
+    for i, r in enumerate(rng.sample(responders, int(len(responders) * args.busy))):
+        index.reserve(f"CA{i}", r.phone)
+    busy = set(index.busy_phones)
+    print(f"{args.responders} responders in {len(index.cells)} cells, built in {build_us / 1000:.0f} ms, {len(busy)} busy")
+
+    def linear(lat, lon, k, incident_type):
+        found = [
+            (haversine_km(lat, lon, r.lat, r.lon), r) for r in responders
+            if r.available and r.phone not in busy and r.handles(incident_type)
+        ]
+        found.sort(key=lambda pair: pair[0])
+        return found[:k]
+
+    grid_us, linear_us = [], []
+    for _ in range(args.queries):
+        lat, lon = random_point(rng)
+        incident_type = rng.choice(types)
+        found, elapsed = timed(index.nearest, lat, lon, k=args.k, incident_type=incident_type)
+        grid_us.append(elapsed)
+        if len(linear_us) < 200:
+            expected, elapsed = timed(linear, lat, lon, args.k, incident_type)
+            linear_us.append(elapsed)
+            # Same responders at the same distances (ties may come back in either order)
+            assert [round(d, 6) for d, _ in found] == [round(d, 6) for d, _ in expected], (lat, lon, found, expected)
+
+    summary(f"grid k={args.k}", grid_us)
+    summary(f"linear scan k={args.k}", linear_us)
+
+    moved = [responder(i, random_point(rng)) if i % 100 == 0 else r for i, r in enumerate(responders)]
+    (changed, removed), reload_us = timed(index.sync, moved)
+    print(f"incremental reload: {changed} moved, {removed} removed in {reload_us / 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Memory per call for the CallSession model.
+
+Creates N sessions the way dial_ticket does and reports the bytes each one
+costs (ticket dicts excluded, they exist either way), next to the plain
+dict layout active_calls used before, a session whose rings are full,
+and - with --agents - the TwilioVoiceAgent and handler a streaming call adds.
+
+    python bench/session_memory.py --calls 10000
+    python bench/session_memory.py --calls 2000 --agents
+"""
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure memory per idle and active call session")
+    parser.add_argument("--calls", type=int, default=10000)
+    parser.add_argument("--agents", action="store_true", help="Also measure a voice agent + Twilio handler per call")
+    return parser.parse_args()
+
+
+def ticket(i):
+    return {
+        "ticket_id": i,
+        "phone_number": "+923013225853",
+        "incident_type": "fire",
+        "address": "123 Main Street, Lahore",
+        "priority": 1,
+        "confidence_score": 0.95,
+        "image_urls": [],
+    }
+
+
+def measure(label, build, calls):
+    """Bytes allocated per call by build(i), kept alive until measured"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(i) for i in range(calls)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    per_call = (after - before) / calls
+    print(f"{label:<42}{per_call:>10.0f} B/call{per_call * calls / 1e6:>10.1f} MB for {calls}")
+    del kept
+    return per_call
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, ROOT)
+    from common.session import CONVERSATION_HISTORY_TURNS, SESSION_EVENT_LIMIT, CallSession, SessionRegistry
+
+    tickets = [ticket(i) for i in range(args.calls)]
+
+    def old_layout(i):
+        return {"ticket_data": tickets[i]}
+
+    registry = SessionRegistry()
+
+    def idle_session(i):
+        session = registry.add(CallSession(f"CA{i:032x}", tickets[i]))
+        registry.bind_stream(session, f"MZ{i:032x}")
+        return session
+
+    def full_rings(i):
+        session = CallSession(f"CA{i:032x}", tickets[i])
+        for turn in range(CONVERSATION_HISTORY_TURNS):
+            session.record("user" if turn % 2 else "assistant", "Copy that, we are on our way.")
+        for _ in range(SESSION_EVENT_LIMIT):
+            session.record("function_call", "retrieve_freshdesk_ticket")
+        return session
+
+    print(f"{'layout':<42}{'per call':>15}{'total':>13}")
+    measure("active_calls dict entry (before)", old_layout, args.calls)
+    measure("idle CallSession + both indexes", idle_session, args.calls)
+    measure(
+        f"CallSession, full rings ({CONVERSATION_HISTORY_TURNS}+{SESSION_EVENT_LIMIT})", full_rings, args.calls
+    )
+
+    if args.agents:
+        os.environ.update({
+            "DEEPGRAM_API_KEY": "bench", "TWILIO_ACCOUNT_SID": "ACbench", "TWILIO_AUTH_TOKEN": "bench",
+            "TWILIO_PHONE_NUMBER": "+15550000000", "WEBHOOK_URL": "http://127.0.0.1/twilio/incoming",
+            "WEBSOCKET_URL": "ws://127.0.0.1",
+        })
+        import call
+
+        async def agents():
+            def streaming(i):
+                agent = call.TwilioVoiceAgent(CallSession(f"CA{i:032x}", tickets[i]))
+                agent.set_twilio_websocket(call.TwilioWebSocketHandler(agent))
+                return agent
+
+            measure("+ TwilioVoiceAgent and handler (streaming)", streaming, args.calls)
+
+        asyncio.run(agents())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,42 @@
-from flask import Flask, request
+from flask import Flask, request, Response
 import asyncio
 import websockets
 import os
 import json
+import sys
 import threading
 import time
 from datetime import datetime
-from twilio.rest import Client
-from twilio.twiml.voice_response import VoiceResponse
-from common.zf import FUNCTION_DEFINITIONS, FUNCTION_MAP, list_freshdesk_tickets, update_freshdesk_ticket_status
+from common.zf import (
+    FUNCTION_DEFINITIONS, FUNCTION_MAP, update_freshdesk_ticket_status, bulk_update_freshdesk_tickets,
+    fetch_freshdesk_tickets,
+    get_grok_ai_async, split_extraction_batches, build_ticket_summary
+)
+from common.pipeline import stage, stage_latency_snapshot
+from common.phone import normalize_phone_number
+from common.metrics import REGISTRY, EXTERNAL_REQUEST_LATENCY
+from common.tracing import TRACER, to_otlp
+from common.greeting import (
+    GREETING_WAIT, greeting_text, prerender_greeting, wait_for_prerendered_greeting,
+    discard_prerendered_greeting, warm_greeting_cache
+)
+from common.tool_cache import CALL_TOOL_CACHE_SIZE, ToolCache, agent_tool_definitions, cached_call
+from common.audio import VAD_ENABLED, AudioRing, VoiceActivityDetector, UplinkAggregator
+from common.loop_monitor import LoopMonitor, SLOW_CALLBACK_LOG, call_task_name
+from common.supervisor import LEAK_LOG, CallSupervisor
+from common.session import CONVERSATION_HISTORY_TURNS, CallSession, SessionRegistry
+from common.escalation import EscalationEngine, responders_for
+from common.incidents import INCIDENT_DEDUP, DUPLICATE_TICKETS, OPEN_INCIDENTS, BatchCloser, IncidentIndex
+from common.geo import ROUTING_MODE, Router
+from common.evidence import EVIDENCE
+from common.business_logic import prepare_agent_filler_message
+from common import jsoncodec
+from common.startup import STARTUP_READY_LINE, preload_in_background, profile_startup
 import logging
 from common.log_formatter import CustomFormatter
 import uuid
 import base64
-import re
+import binascii
 
 # Handle audioop deprecation gracefully
 try:
@@ -48,29 +71,46 @@ TWILIO_ACCOUNT_SID = os.environ.get("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.environ.get("TWILIO_AUTH_TOKEN")
 TWILIO_PHONE_NUMBER = os.environ.get("TWILIO_PHONE_NUMBER")
 POLLING_INTERVAL = int(os.environ.get("POLLING_INTERVAL", 30))
+PIPELINE_EXTRACT_CONCURRENCY = int(os.environ.get("PIPELINE_EXTRACT_CONCURRENCY", 4))
+PIPELINE_DIAL_CONCURRENCY = int(os.environ.get("PIPELINE_DIAL_CONCURRENCY", 1))
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", 64))
+DIAL_SPACING = 5  # Seconds each dial worker waits between calls
 WEBHOOK_URL = os.environ.get("WEBHOOK_URL")
 WEBSOCKET_URL = os.environ.get("WEBSOCKET_URL")
 STATUS_CALLBACK_URL = os.environ.get("WEBHOOK_URL", "").replace("/twilio/incoming", "/twilio/status")
-
-# Validate environment variables
-if not DEEPGRAM_API_KEY:
-    print("Error: DEEPGRAM_API_KEY environment variable is required")
-    exit(1)
-if not TWILIO_ACCOUNT_SID or not TWILIO_AUTH_TOKEN or not TWILIO_PHONE_NUMBER:
-    print("Error: TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, and TWILIO_PHONE_NUMBER are required")
-    exit(1)
-if not WEBHOOK_URL:
-    print("Error: WEBHOOK_URL environment variable is required (e.g., https://<your-domain>/twilio/incoming)")
-    exit(1)
-if not WEBHOOK_URL.endswith("/twilio/incoming"):
-    print(f"Error: WEBHOOK_URL must end with '/twilio/incoming', got {WEBHOOK_URL}")
-    exit(1)
-if not WEBSOCKET_URL:
-    print("Error: WEBSOCKET_URL environment variable is required (e.g., wss://<your-domain>)")
-    exit(1)
-if not TWILIO_PHONE_NUMBER.startswith("+"):
-    print(f"Error: TWILIO_PHONE_NUMBER must be in E.164 format (e.g., +1234567890), got {TWILIO_PHONE_NUMBER}")
-    exit(1)
+MEDIA_PORT = int(os.environ.get("MEDIA_PORT", 8080))
+FUNCTION_TIMEOUT = float(os.environ.get("FUNCTION_TIMEOUT", 20))
+FUNCTION_TIMEOUTS = {
+    "retrieve_freshdesk_ticket": 10,
+    "update_freshdesk_ticket_status": 10,
+    "send_whatsapp_message": 45,  # Selenium send, including chat load
+}
+FILLER_DELAY = float(os.environ.get("FILLER_DELAY", 1.5))  # Speak a filler once a tool runs this long
+FILLER_TYPES = {"retrieve_freshdesk_ticket": "lookup"}
+DEEPGRAM_MAX_RECONNECTS = int(os.environ.get("DEEPGRAM_MAX_RECONNECTS", 3))  # Per call, after the initial connect
+DEEPGRAM_RECONNECT_BUFFER_MS = int(os.environ.get("DEEPGRAM_RECONNECT_BUFFER_MS", 5000))
+
+
+def validate_environment():
+    """Exit with a message when required configuration is missing (called from main, not on import)"""
+    if not DEEPGRAM_API_KEY:
+        print("Error: DEEPGRAM_API_KEY environment variable is required")
+        exit(1)
+    if not TWILIO_ACCOUNT_SID or not TWILIO_AUTH_TOKEN or not TWILIO_PHONE_NUMBER:
+        print("Error: TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, and TWILIO_PHONE_NUMBER are required")
+        exit(1)
+    if not WEBHOOK_URL:
+        print("Error: WEBHOOK_URL environment variable is required (e.g., https://<your-domain>/twilio/incoming)")
+        exit(1)
+    if not WEBHOOK_URL.endswith("/twilio/incoming"):
+        print(f"Error: WEBHOOK_URL must end with '/twilio/incoming', got {WEBHOOK_URL}")
+        exit(1)
+    if not WEBSOCKET_URL:
+        print("Error: WEBSOCKET_URL environment variable is required (e.g., wss://<your-domain>)")
+        exit(1)
+    if not TWILIO_PHONE_NUMBER.startswith("+"):
+        print(f"Error: TWILIO_PHONE_NUMBER must be in E.164 format (e.g., +1234567890), got {TWILIO_PHONE_NUMBER}")
+        exit(1)
 
 VOICE_AGENT_URL = "wss://agent.deepgram.com/v1/agent/converse"
 
@@ -94,15 +134,28 @@ When you get a WhatsApp number, immediately use the send_whatsapp_message functi
 
 Current date: {current_date}"""
 
+RESUME_PROMPT = """
+
+The call audio link dropped briefly and has been restored. The conversation so far is in your history.
+Do not greet the responder again; briefly say you are back and continue where you left off."""
+
 # Simplified settings for Deepgram Voice Agent
 TWILIO_SAMPLE_RATE = 8000
 DEEPGRAM_INPUT_RATE = 48000
 DEEPGRAM_OUTPUT_RATE = 16000
 
-def create_deepgram_settings(ticket_data=None):
-    """Create Deepgram settings with proper formatting"""
+def create_deepgram_settings(ticket_data=None, greeting=None, history=None):
+    """Create Deepgram settings with proper formatting.
+
+    When the greeting was already played from pre-rendered audio it is passed
+    in as conversation history, so the agent knows it has been said.
+    `history` ({"role", "content"} turns) resumes a conversation after a
+    mid-call reconnect.
+    """
     current_date = datetime.now().strftime("%A, %B %d, %Y")
     formatted_prompt = PROMPT_TEMPLATE.format(current_date=current_date)
+    if history is not None:
+        formatted_prompt += RESUME_PROMPT
     
     settings = {
         "type": "Settings",
@@ -131,7 +184,7 @@ def create_deepgram_settings(ticket_data=None):
                     "model": "gpt-4o-mini"
                 },
                 "prompt": formatted_prompt,
-                "functions": FUNCTION_DEFINITIONS  # Add back function calling
+                "functions": agent_tool_definitions(FUNCTION_DEFINITIONS)  # Add back function calling
             },
             "speak": {
                 "provider": {
@@ -141,20 +194,65 @@ def create_deepgram_settings(ticket_data=None):
             },
         }
     }
+
+    messages = []
+    if greeting:
+        messages.append({"type": "History", "role": "assistant", "content": greeting})
+    for turn in history or ():
+        messages.append({"type": "History", "role": turn["role"], "content": turn["content"]})
+    if messages:
+        settings["agent"]["context"] = {"messages": messages}
     
     return settings
 
-# Store active sessions and processed tickets
-active_calls = {}
+# Store active sessions (by CallSid and StreamSid) and processed tickets
+active_calls = SessionRegistry()
 processed_tickets = {}
 
-# Phone number validation regex
-PHONE_NUMBER_REGEX = re.compile(r"^\+\d{10,15}$")
+# Metrics
+MEDIA_FRAMES = REGISTRY.counter("twilio_media_frames", "Twilio media frames", ("direction",))
+MEDIA_BYTES = REGISTRY.counter("twilio_media_bytes", "Decoded mu-law bytes exchanged with Twilio", ("direction",))
+CALL_MEDIA_FPS = REGISTRY.gauge("call_media_fps", "Inbound Twilio frames per second per active call", ("call_sid",))
+DEEPGRAM_MESSAGES = REGISTRY.counter("deepgram_messages", "Messages received from Deepgram by type", ("type",))
+DEEPGRAM_SETUP_LATENCY = REGISTRY.histogram("deepgram_setup_seconds", "Deepgram connect to SettingsApplied")
+TIME_TO_FIRST_AUDIO = REGISTRY.histogram("time_to_first_audio_seconds", "Twilio stream start to first agent audio frame")
+FUNCTION_CALL_LATENCY = REGISTRY.histogram("function_call_seconds", "Agent function call execution time", ("function",))
+POLL_CYCLE_LATENCY = REGISTRY.histogram(
+    "poll_cycle_seconds", "Duration of one Freshdesk ingestion cycle", buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+BARGE_IN_LATENCY = REGISTRY.histogram(
+    "barge_in_seconds", "UserStartedSpeaking received from Deepgram to Twilio clear sent", buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5)
+)
+STALE_AGENT_FRAMES = REGISTRY.counter("stale_agent_frames", "Agent audio frames dropped after a barge-in")
+VAD_BYTES_SAVED = REGISTRY.counter("vad_uplink_bytes_saved", "Deepgram uplink bytes not sent because of silence suppression")
+FUNCTION_CALL_TIMEOUTS = REGISTRY.counter("function_call_timeouts", "Agent function calls abandoned after their timeout", ("function",))
+FILLER_MESSAGES = REGISTRY.counter("filler_messages", "Filler lines injected while a slow function call ran", ("function",))
+DEEPGRAM_UPLINK_MESSAGES = REGISTRY.counter("deepgram_uplink_messages", "Audio messages sent to Deepgram")
+CALL_UPLINK_MPS = REGISTRY.gauge("call_deepgram_uplink_messages_per_second", "Deepgram audio messages per second per active call", ("call_sid",))
+CALL_UPLINK_BPS = REGISTRY.gauge("call_deepgram_uplink_bytes_per_second", "Deepgram audio bytes per second per active call", ("call_sid",))
+ACTIVE_CALLS = REGISTRY.gauge("active_calls", "Calls currently tracked")
+DEEPGRAM_RECONNECTS = REGISTRY.counter("deepgram_reconnects", "Mid-call Deepgram reconnects by outcome", ("outcome",))
+DEEPGRAM_RECONNECT_LATENCY = REGISTRY.histogram("deepgram_reconnect_seconds", "Deepgram drop to audio flowing again")
+DEEPGRAM_RECONNECT_AUDIO_LOST = REGISTRY.counter(
+    "deepgram_reconnect_audio_lost_ms", "Caller audio discarded because the reconnect buffer overflowed"
+)
+ACTIVE_CALLS.set_function(lambda: len(active_calls))
 
 class TwilioVoiceAgent:
-    def __init__(self, call_sid, ticket_data):
-        self.call_sid = call_sid
-        self.ticket_data = ticket_data
+    # Fixed layout: one of these exists per live call
+    __slots__ = (
+        "session", "call_sid", "ticket_data", "session_id", "twilio_ws_handler", "deepgram_ws", "is_running",
+        "loop", "connection_attempts", "max_connection_attempts", "call_active", "deepgram_ready",
+        "initialization_complete", "frames_in", "fps_window_start", "trace", "supervisor", "cleaned_up",
+        "greeting_sent", "greeting_checked", "prerendered_greeting", "agent_audio_stale", "outbound_generation", "vad",
+        "vad_bytes_reported", "last_keep_alive", "function_tasks", "uplink", "uplink_window", "tool_cache",
+        "last_filler_at", "reconnecting", "reconnects", "reconnect_buffer", "audio_lost_ms", "__weakref__",
+    )
+
+    def __init__(self, session):
+        self.session = session
+        self.call_sid = session.call_sid
+        self.ticket_data = session.ticket_data
         self.session_id = str(uuid.uuid4())
         self.twilio_ws_handler = None
         self.deepgram_ws = None
@@ -165,10 +263,43 @@ class TwilioVoiceAgent:
         self.call_active = True
         self.deepgram_ready = False
         self.initialization_complete = asyncio.Event()
+        self.frames_in = 0
+        self.fps_window_start = time.monotonic()
+        self.trace = TRACER.get(self.call_sid)
+        # Owns every task and socket of the call; cleanup() shuts them all down together
+        self.supervisor = CallSupervisor(self.call_sid)
+        self.cleaned_up = False
+        self.greeting_sent = False
+        # Set once the pre-rendered greeting has been looked for; the Deepgram settings depend on it
+        self.greeting_checked = asyncio.Event()
+        self.prerendered_greeting = None
+        # Agent audio still arriving for a reply the responder interrupted
+        self.agent_audio_stale = False
+        self.outbound_generation = 0
+        self.vad = VoiceActivityDetector() if VAD_ENABLED else None
+        self.vad_bytes_reported = 0
+        self.last_keep_alive = time.monotonic()
+        self.function_tasks = set()
+        # linear16 mono at DEEPGRAM_INPUT_RATE: 2 bytes per sample
+        self.uplink = UplinkAggregator(
+            self.send_uplink_message, DEEPGRAM_INPUT_RATE * 2 / 1000, spawn=self.supervisor.spawn
+        )
+        self.uplink_window = (0, 0)
+        self.tool_cache = ToolCache(CALL_TOOL_CACHE_SIZE)
+        self.last_filler_at = 0.0
+        self.reconnecting = False
+        self.reconnects = 0
+        self.reconnect_buffer = AudioRing(DEEPGRAM_RECONNECT_BUFFER_MS * DEEPGRAM_INPUT_RATE * 2 // 1000)
+        self.audio_lost_ms = 0
         
     def set_loop(self, loop):
         self.loop = loop
 
+    @property
+    def accepting_audio(self):
+        """Caller audio is forwarded to Deepgram, or buffered while it reconnects"""
+        return self.call_active and (self.deepgram_ready or self.reconnecting)
+
     async def keep_alive(self):
         """Send keep-alive messages to maintain Deepgram connection"""
         while self.call_active and self.deepgram_ws and not self.deepgram_ws.closed:
@@ -182,36 +313,42 @@ class TwilioVoiceAgent:
                 logger.error(f"Error sending keep-alive for call {self.call_sid}: {e}")
                 break
 
+    async def stream_prerendered_greeting(self):
+        """Play the greeting rendered while the phone was ringing straight to Twilio"""
+        try:
+            greeting = await wait_for_prerendered_greeting(self.call_sid, GREETING_WAIT)
+            if not greeting or self.greeting_sent or not self.twilio_ws_handler:
+                return False
+            self.greeting_sent = True
+            self.prerendered_greeting = greeting
+        finally:
+            self.greeting_checked.set()
+
+        generation = self.outbound_generation
+        for index, frame in enumerate(greeting["frames"], 1):
+            if generation != self.outbound_generation:
+                break  # Responder barged in, drop the rest
+            await self.twilio_ws_handler.send_media(frame)
+            if index % 25 == 0:
+                # Let other calls' audio through while a long greeting is queued
+                await asyncio.sleep(0)
+        self.trace.event("greeting.streamed", frames=len(greeting["frames"]))
+        logger.info(f"✅ Streamed pre-rendered greeting ({len(greeting['frames'])} frames) for call {self.call_sid}")
+        return True
+
     async def send_initial_greeting(self):
         """Send initial greeting and incident information"""
+        if self.greeting_sent:
+            return
+
         if not self.deepgram_ws or self.deepgram_ws.closed:
             logger.warning(f"Cannot send greeting: Deepgram WebSocket not available for call {self.call_sid}")
             return
             
         try:
-            # Wait a brief moment for connection to stabilize
-            await asyncio.sleep(0.5)
-            
-            # Create detailed incident greeting message
-            if self.ticket_data:
-                incident_type = self.ticket_data.get('incident_type', 'security incident')
-                address = self.ticket_data.get('address', 'unknown location')
-                confidence = int(self.ticket_data.get('confidence_score', 0.8) * 100)
-                
-                greeting_message = (
-                    f"Hello, this is Zain from Safe City Authority Emergency Response. "
-                    f"We have detected a {incident_type} at {address} with {confidence}% confidence. "
-                    f"May I have your name, agency, and WhatsApp number to send evidence images?"
-                )
-                
-                logger.info(f"Preparing to send incident greeting: {greeting_message}")
-            else:
-                greeting_message = (
-                    "Hello, this is Zain from Safe City Authority Emergency Response. " 
-                    "May I have your name?"
-                )
-                
-                logger.info(f"Preparing to send default greeting: {greeting_message}")
+            self.greeting_sent = True
+            greeting_message = greeting_text(self.ticket_data)
+            logger.info(f"Preparing to send greeting: {greeting_message}")
             
             # Send greeting using InjectAgentMessage to make agent speak first
             inject_message = {
@@ -221,25 +358,30 @@ class TwilioVoiceAgent:
             
             logger.info(f"Sending InjectAgentMessage to Deepgram for call {self.call_sid}")
             await self.deepgram_ws.send(json.dumps(inject_message))
+            self.trace.event("greeting.injected")
             logger.info(f"✅ Sent incident greeting to Deepgram for call {self.call_sid}")
             
         except Exception as e:
+            self.greeting_sent = False
             logger.error(f"Error sending initial greeting for call {self.call_sid}: {e}")
             logger.error(f"Exception details: {type(e).__name__}: {str(e)}")
 
-    async def setup_deepgram(self):
-        """Setup connection to Deepgram Voice Agent with retry logic."""
+    async def setup_deepgram(self, resume=False):
+        """Setup connection to Deepgram Voice Agent with retry logic.
+
+        With resume=True the conversation so far is sent along with the
+        settings, for a reconnect in the middle of a call.
+        """
         if not self.call_active:
             logger.info(f"Skipping Deepgram setup for call {self.call_sid}: Call is no longer active")
             return False
 
         self.loop = asyncio.get_event_loop()
         self.connection_attempts += 1
-        
-        # Create settings with function calling
-        settings = create_deepgram_settings(self.ticket_data)
 
         try:
+            setup_started = time.perf_counter()
+            setup_started_ns = time.time_ns()
             logger.info(f"Connecting to Deepgram for call {self.call_sid}, attempt {self.connection_attempts}")
             self.deepgram_ws = await websockets.connect(
                 VOICE_AGENT_URL,
@@ -247,7 +389,17 @@ class TwilioVoiceAgent:
                 ping_interval=20,
                 ping_timeout=30
             )
-            
+            self.supervisor.track_socket(self.deepgram_ws)
+
+            # The connect overlaps the greeting wait; the settings need to know whether it played
+            await self.greeting_checked.wait()
+            # Create settings with function calling
+            settings = create_deepgram_settings(
+                self.ticket_data,
+                greeting=self.prerendered_greeting["text"] if self.prerendered_greeting else None,
+                history=self.session.transcript(CONVERSATION_HISTORY_TURNS) if resume else None,
+            )
+
             logger.info(f"Sending settings to Deepgram for call {self.call_sid}")
             await self.deepgram_ws.send(json.dumps(settings))
             
@@ -263,6 +415,7 @@ class TwilioVoiceAgent:
                         message = await asyncio.wait_for(self.deepgram_ws.recv(), timeout=1.0)
                         if isinstance(message, str):
                             message_json = json.loads(message)
+                            DEEPGRAM_MESSAGES.labels(message_json.get("type")).inc()
                             logger.info(f"Deepgram initialization message: {message_json}")
                             
                             if message_json.get("type") == "Welcome":
@@ -271,6 +424,10 @@ class TwilioVoiceAgent:
                             elif message_json.get("type") == "SettingsApplied":
                                 settings_applied = True
                                 self.deepgram_ready = True
+                                DEEPGRAM_SETUP_LATENCY.observe(time.perf_counter() - setup_started)
+                                self.trace.record(
+                                    "deepgram.setup", setup_started_ns, attempt=self.connection_attempts, resume=resume
+                                )
                                 logger.info(f"Deepgram SettingsApplied received for call {self.call_sid}")
                                 break
                             elif message_json.get("type") == "Error":
@@ -296,7 +453,7 @@ class TwilioVoiceAgent:
             logger.info(f"✅ Connected to Deepgram for call {self.call_sid}")
 
             # Update ticket status only on first successful connection
-            if self.ticket_data.get("ticket_id") and self.connection_attempts == 1:
+            if self.ticket_data.get("ticket_id") and self.connection_attempts == 1 and not resume:
                 try:
                     await update_freshdesk_ticket_status({
                         "ticket_id": self.ticket_data["ticket_id"],
@@ -310,33 +467,44 @@ class TwilioVoiceAgent:
             self.initialization_complete.set()
             
             # Start keep-alive task
-            asyncio.create_task(self.keep_alive())
+            self.supervisor.spawn(self.keep_alive())
             
             return True
             
         except Exception as e:
             logger.error(f"Failed to connect to Deepgram for call {self.call_sid}, attempt {self.connection_attempts}: {e}")
-            if self.connection_attempts < self.max_connection_attempts:
-                await asyncio.sleep(2)
-                return await self.setup_deepgram()
+            if self.connection_attempts < self.max_connection_attempts and self.call_active:
+                # The responder is waiting in silence during a reconnect, so retry sooner
+                await asyncio.sleep(0.5 if resume else 2)
+                return await self.setup_deepgram(resume)
             return False
 
     def set_twilio_websocket(self, ws_handler):
         self.twilio_ws_handler = ws_handler
 
+    def decode_mulaw(self, mulaw_data):
+        """Twilio's base64 mu-law payload as 8 kHz linear16"""
+        # a2b_base64 directly: b64decode adds a type check and copy on every frame
+        audio_bytes = binascii.a2b_base64(mulaw_data)
+        if not audio_bytes:
+            return None
+        return audioop.ulaw2lin(audio_bytes, 2)
+
+    def upsample_for_deepgram(self, linear_audio):
+        resampled_audio, _ = audioop.ratecv(
+            linear_audio, 2, 1, TWILIO_SAMPLE_RATE, DEEPGRAM_INPUT_RATE, None
+        )
+        return resampled_audio
+
     def convert_mulaw_to_linear16(self, mulaw_data):
         """Convert Twilio's mu-law audio to linear16 for Deepgram"""
         try:
             if not mulaw_data:
                 return None
-            audio_bytes = base64.b64decode(mulaw_data)
-            if not audio_bytes:
+            linear_audio = self.decode_mulaw(mulaw_data)
+            if not linear_audio:
                 return None
-            linear_audio = audioop.ulaw2lin(audio_bytes, 2)
-            resampled_audio, _ = audioop.ratecv(
-                linear_audio, 2, 1, TWILIO_SAMPLE_RATE, DEEPGRAM_INPUT_RATE, None
-            )
-            return resampled_audio
+            return self.upsample_for_deepgram(linear_audio)
         except Exception as e:
             logger.error(f"Error converting mu-law to linear16 for call {self.call_sid}: {e}")
             return None
@@ -357,49 +525,117 @@ class TwilioVoiceAgent:
             return None
 
     async def send_audio_to_deepgram(self, linear_audio):
-        """Send audio to Deepgram"""
-        if not self.call_active or not self.deepgram_ready:
+        """Queue audio for Deepgram; the uplink aggregator decides when to send"""
+        if not self.accepting_audio:
+            return
+        await self.uplink.add(linear_audio)
+
+    async def send_uplink_message(self, payload):
+        """Send one (possibly aggregated) audio message to Deepgram"""
+        if not self.call_active:
+            return
+        if self.reconnecting:
+            self.reconnect_buffer.append(payload)
+            return
+        if not self.deepgram_ready:
             return
 
         try:
             if self.deepgram_ws and not self.deepgram_ws.closed:
-                await self.deepgram_ws.send(linear_audio)
+                await self.deepgram_ws.send(payload)
+                DEEPGRAM_UPLINK_MESSAGES.inc()
+            else:
+                self.reconnect_buffer.append(payload)
         except Exception as e:
-            logger.error(f"Error sending audio to Deepgram for call {self.call_sid}: {e}")
-            await self.cleanup()
+            # The run loop sees the closed socket and reconnects; keep the audio for it
+            logger.warning(f"Error sending audio to Deepgram for call {self.call_sid}: {e}")
+            self.reconnect_buffer.append(payload)
 
     async def process_twilio_audio(self, mulaw_payload):
         """Process incoming audio from Twilio and send to Deepgram"""
-        if not self.call_active or not self.deepgram_ready:
+        if not self.accepting_audio:
             return
 
         if not mulaw_payload:
             return
+
+        self.frames_in += 1
+        now = time.monotonic()
+        if now - self.fps_window_start >= 1.0:
+            elapsed = now - self.fps_window_start
+            CALL_MEDIA_FPS.labels(self.call_sid).set(round(self.frames_in / elapsed, 1))
+            messages, sent_bytes = self.uplink.messages, self.uplink.bytes
+            CALL_UPLINK_MPS.labels(self.call_sid).set(round((messages - self.uplink_window[0]) / elapsed, 1))
+            CALL_UPLINK_BPS.labels(self.call_sid).set(round((sent_bytes - self.uplink_window[1]) / elapsed))
+            self.uplink_window = (messages, sent_bytes)
+            self.frames_in = 0
+            self.fps_window_start = now
         
+        if self.vad:
+            await self.process_with_vad(mulaw_payload)
+            return
+
         linear_audio = self.convert_mulaw_to_linear16(mulaw_payload)
         if linear_audio:
             await self.send_audio_to_deepgram(linear_audio)
 
+    async def process_with_vad(self, mulaw_payload):
+        """Forward speech (plus hangover and pre-roll); thin out long silences"""
+        try:
+            linear_audio = self.decode_mulaw(mulaw_payload)
+        except Exception as e:
+            logger.error(f"Error decoding mu-law for call {self.call_sid}: {e}")
+            return
+        if not linear_audio:
+            return
+
+        for frame in self.vad.process(linear_audio):
+            await self.send_audio_to_deepgram(self.upsample_for_deepgram(frame))
+
+        saved = self.vad.bytes_suppressed * (DEEPGRAM_INPUT_RATE // TWILIO_SAMPLE_RATE)
+        if saved != self.vad_bytes_reported:
+            VAD_BYTES_SAVED.inc(saved - self.vad_bytes_reported)
+            self.vad_bytes_reported = saved
+
+        # With no audio flowing Deepgram needs explicit keep-alives
+        now = time.monotonic()
+        if self.vad.suppressing and now - self.last_keep_alive >= 5:
+            self.last_keep_alive = now
+            try:
+                if self.deepgram_ws and not self.deepgram_ws.closed:
+                    await self.deepgram_ws.send(json.dumps({"type": "KeepAlive"}))
+            except Exception as e:
+                logger.error(f"Error sending keep-alive for call {self.call_sid}: {e}")
+
     async def handle_deepgram_message(self, message):
         """Handle incoming messages from Deepgram"""
         if not self.call_active:
             return
 
+        received_at = time.perf_counter()
         try:
             if isinstance(message, str):
-                message_json = json.loads(message)
+                message_json = jsoncodec.loads(message)
                 message_type = message_json.get("type")
+                DEEPGRAM_MESSAGES.labels(message_type).inc()
                 
                 if message_type == "UserStartedSpeaking":
                     logger.debug(f"User started speaking for call {self.call_sid}")
+                    await self.handle_barge_in(received_at)
+
+                elif message_type == "AgentStartedSpeaking":
+                    self.agent_audio_stale = False
 
                 elif message_type == "ConversationText":
                     role = message_json.get("role")
                     content = message_json.get("content")
                     logger.info(f"Conversation - {role}: {content} (call {self.call_sid})")
+                    if role and content:
+                        # Replayed to a new Deepgram session if the socket drops mid-call
+                        self.session.record(role, content)
 
                 elif message_type == "FunctionCallRequest":
-                    await self.handle_function_call(message_json)
+                    self.dispatch_function_call(message_json)
 
                 elif message_type == "Welcome":
                     logger.info(f"Connected to Deepgram with request ID: {message_json.get('request_id')} for call {self.call_sid}")
@@ -415,6 +651,10 @@ class TwilioVoiceAgent:
                     await self.cleanup()
 
             elif isinstance(message, bytes):
+                DEEPGRAM_MESSAGES.labels("audio").inc()
+                if self.agent_audio_stale:
+                    STALE_AGENT_FRAMES.inc()
+                    return
                 # Handle audio from Deepgram
                 if self.twilio_ws_handler:
                     mulaw_audio = self.convert_linear16_to_mulaw(message)
@@ -424,6 +664,50 @@ class TwilioVoiceAgent:
         except Exception as e:
             logger.error(f"Error handling Deepgram message for call {self.call_sid}: {e}")
 
+    async def handle_barge_in(self, received_at=None):
+        """Silence the agent as soon as the responder starts talking.
+
+        Drops any outbound frames not yet sent, tells Twilio to discard the
+        audio it has buffered, and ignores Deepgram audio until the agent's
+        next turn starts. Latency is measured from when the UserStartedSpeaking
+        message was taken off the Deepgram socket.
+        """
+        started = received_at or time.perf_counter()
+        self.agent_audio_stale = True
+        self.outbound_generation += 1
+        if self.twilio_ws_handler:
+            await self.twilio_ws_handler.clear_media()
+        BARGE_IN_LATENCY.observe(time.perf_counter() - started)
+        self.trace.event("barge_in")
+        self.session.record("barge_in")
+
+    def dispatch_function_call(self, message_json):
+        """Run a function call in its own task so Deepgram messages keep flowing"""
+        if not self.call_active:
+            return
+        self.session.record("function_call", message_json.get("function_name"))
+        task = self.supervisor.spawn(self.handle_function_call(message_json))
+        if task:
+            self.function_tasks.add(task)
+            task.add_done_callback(self.function_tasks.discard)
+
+    async def send_filler_after(self, delay, function_name):
+        """Have the agent say a holding line if the function is still running after `delay`"""
+        await asyncio.sleep(delay)
+        if not self.call_active or not self.deepgram_ws or self.deepgram_ws.closed:
+            return
+        # One holding line covers calls made in parallel
+        if time.monotonic() - self.last_filler_at < 5:
+            return
+        self.last_filler_at = time.monotonic()
+        filler = await prepare_agent_filler_message(self.deepgram_ws, FILLER_TYPES.get(function_name, "generic"))
+        try:
+            await self.deepgram_ws.send(json.dumps(filler["inject_message"]))
+            FILLER_MESSAGES.labels(function_name).inc()
+            self.trace.event("function.filler", function=function_name)
+        except Exception as e:
+            logger.error(f"Error sending filler message for call {self.call_sid}: {e}")
+
     async def handle_function_call(self, message_json):
         """Handle function calls from Deepgram"""
         if not self.call_active:
@@ -436,6 +720,7 @@ class TwilioVoiceAgent:
         logger.info(f"Function call received: {function_name} for call {self.call_sid}")
         logger.info(f"Parameters: {parameters}")
 
+        filler_task = None
         try:
             func = FUNCTION_MAP.get(function_name)
             if not func:
@@ -457,7 +742,17 @@ class TwilioVoiceAgent:
                 
                 logger.info(f"Enriched WhatsApp parameters with incident data: {parameters}")
 
-            result = await func(parameters)
+            timeout = FUNCTION_TIMEOUTS.get(function_name, FUNCTION_TIMEOUT)
+            filler_task = self.supervisor.spawn(self.send_filler_after(FILLER_DELAY, function_name))
+            with FUNCTION_CALL_LATENCY.labels(function_name).time(), \
+                    self.trace.span(f"function.{function_name}", function_call_id=function_call_id):
+                try:
+                    result = await asyncio.wait_for(
+                        cached_call(function_name, func, parameters, self.tool_cache), timeout
+                    )
+                except asyncio.TimeoutError:
+                    FUNCTION_CALL_TIMEOUTS.labels(function_name).inc()
+                    raise TimeoutError(f"{function_name} did not finish within {timeout}s")
             response = {
                 "type": "FunctionCallResponse",
                 "function_call_id": function_call_id,
@@ -468,6 +763,9 @@ class TwilioVoiceAgent:
                 await self.deepgram_ws.send(json.dumps(response))
                 logger.info(f"Function response sent: {json.dumps(result)} for call {self.call_sid}")
 
+        except asyncio.CancelledError:
+            logger.info(f"Function {function_name} cancelled for call {self.call_sid}")
+            raise
         except Exception as e:
             logger.error(f"Error executing function {function_name} for call {self.call_sid}: {str(e)}")
             result = {"error": str(e)}
@@ -478,6 +776,9 @@ class TwilioVoiceAgent:
             }
             if self.call_active and self.deepgram_ws and not self.deepgram_ws.closed:
                 await self.deepgram_ws.send(json.dumps(response))
+        finally:
+            if filler_task:
+                filler_task.cancel()
 
     async def run(self):
         """Main run loop for the voice agent"""
@@ -501,38 +802,166 @@ class TwilioVoiceAgent:
 
         self.is_running = True
         try:
-            async for message in self.deepgram_ws:
+            while True:
+                try:
+                    async for message in self.deepgram_ws:
+                        if not self.is_running or not self.call_active:
+                            break
+                        await self.handle_deepgram_message(message)
+                except websockets.exceptions.ConnectionClosed as e:
+                    logger.warning(f"Deepgram connection lost for call {self.call_sid}: {e}")
                 if not self.is_running or not self.call_active:
                     break
-                await self.handle_deepgram_message(message)
+                # Deepgram went away while the responder is still on the line
+                if not await self.reconnect_deepgram():
+                    break
         except Exception as e:
             logger.error(f"Error in voice agent run for call {self.call_sid}: {e}")
         finally:
             await self.cleanup()
 
+    async def reconnect_deepgram(self):
+        """Open a new Deepgram session mid-call and pick the conversation back up.
+
+        Caller audio keeps arriving while the socket is down; it is held in a
+        bounded ring and sent, in order, once the new session has applied the
+        settings and conversation history. Audio that overflows the ring is
+        lost and recorded as such.
+        """
+        if self.reconnects >= DEEPGRAM_MAX_RECONNECTS:
+            logger.error(f"Deepgram dropped again for call {self.call_sid}; giving up after {self.reconnects} reconnects")
+            DEEPGRAM_RECONNECTS.labels("exhausted").inc()
+            return False
+
+        started = time.perf_counter()
+        started_ns = time.time_ns()
+        self.reconnects += 1
+        self.session.record("deepgram_reconnect")
+        self.reconnecting = True
+        self.deepgram_ready = False
+        self.agent_audio_stale = False
+        dropped_before = self.reconnect_buffer.dropped
+        logger.warning(f"🔄 Reconnecting to Deepgram for call {self.call_sid} (reconnect {self.reconnects})")
+
+        # Results cannot be delivered to the new session; the agent asks again if it still needs them
+        for task in list(self.function_tasks):
+            task.cancel()
+        # Move the partly filled uplink chunk into the ring
+        await self.uplink.flush()
+
+        self.connection_attempts = 0
+        if not await self.setup_deepgram(resume=True):
+            self.reconnecting = False
+            DEEPGRAM_RECONNECTS.labels("failed").inc()
+            logger.error(f"Failed to reconnect to Deepgram for call {self.call_sid}")
+            return False
+
+        # Audio arriving during the replay is appended behind the backlog, so order is kept
+        buffered_bytes = self.reconnect_buffer.length
+        try:
+            while self.reconnect_buffer:
+                await self.deepgram_ws.send(self.reconnect_buffer.popleft())
+                DEEPGRAM_UPLINK_MESSAGES.inc()
+        except Exception as e:
+            logger.warning(f"Error replaying buffered audio for call {self.call_sid}: {e}")
+        self.reconnecting = False
+
+        bytes_per_ms = DEEPGRAM_INPUT_RATE * 2 / 1000
+        lost_ms = round((self.reconnect_buffer.dropped - dropped_before) / bytes_per_ms)
+        self.audio_lost_ms += lost_ms
+        DEEPGRAM_RECONNECTS.labels("ok").inc()
+        DEEPGRAM_RECONNECT_LATENCY.observe(time.perf_counter() - started)
+        if lost_ms:
+            DEEPGRAM_RECONNECT_AUDIO_LOST.inc(lost_ms)
+        self.trace.record(
+            "deepgram.reconnect", started_ns,
+            reconnect=self.reconnects, buffered_ms=round(buffered_bytes / bytes_per_ms), lost_ms=lost_ms,
+        )
+        logger.info(
+            f"✅ Reconnected to Deepgram for call {self.call_sid} in {(time.perf_counter() - started) * 1000:.0f}ms "
+            f"({buffered_bytes / bytes_per_ms:.0f}ms of audio replayed, {lost_ms}ms lost)"
+        )
+        return True
+
     async def cleanup(self):
-        """Clean up resources"""
+        """Clean up resources.
+
+        Reached from the run loop, the Twilio handler, a Deepgram
+        CloseConnection and the connection handler's finally; only the first
+        call does the work.
+        """
+        if self.cleaned_up:
+            return
+        self.cleaned_up = True
         self.is_running = False
         self.call_active = False
         self.deepgram_ready = False
-        
-        if self.deepgram_ws and not self.deepgram_ws.closed:
-            try:
-                await self.deepgram_ws.close()
-                logger.info(f"Closed Deepgram WebSocket for call {self.call_sid}")
-            except Exception as e:
-                logger.error(f"Error closing Deepgram WebSocket for call {self.call_sid}: {e}")
-        
-        if self.call_sid in active_calls:
-            del active_calls[self.call_sid]
-            logger.info(f"Cleaned up resources for call {self.call_sid}")
+        self.reconnecting = False
+        self.reconnect_buffer.clear()
+
+        self.uplink.close()
+        CALL_MEDIA_FPS.remove(self.call_sid)
+        CALL_UPLINK_MPS.remove(self.call_sid)
+        CALL_UPLINK_BPS.remove(self.call_sid)
+        if self.vad and self.vad.frames_in:
+            logger.info(
+                f"VAD for call {self.call_sid}: suppressed {self.vad.frames_suppressed}/{self.vad.frames_in} frames, "
+                f"saved {self.vad_bytes_reported} uplink bytes"
+            )
+            self.trace.set_attribute("vad_bytes_saved", self.vad_bytes_reported)
+        if self.reconnects:
+            self.trace.set_attribute("deepgram_reconnects", self.reconnects)
+            self.trace.set_attribute("audio_lost_ms", self.audio_lost_ms)
+        discard_prerendered_greeting(self.call_sid)
+        self.trace.event("call.cleanup")
+        TRACER.finish(self.call_sid, outcome="ended")
+
+        self.session.status = "ended"
+        active_calls.remove(self.call_sid)
+
+        # Cancels function calls, keep-alive and the run loop, and closes the Deepgram and Twilio sockets
+        await self.supervisor.close()
+        self.supervisor.watch_for_leaks(voice_agent=self, twilio_handler=self.twilio_ws_handler, deepgram_ws=self.deepgram_ws)
+        logger.info(f"Cleaned up resources for call {self.call_sid}")
+
+
+# Twilio sends {"event":"media",...,"media":{...,"payload":"<base64>"},...} 50 times a second per call
+MEDIA_EVENT_PREFIXES = ('{"event":"media"', '{"event": "media"')
+MEDIA_PAYLOAD_KEYS = ('"payload":"', '"payload": "')
+
+
+def fast_media_payload(message):
+    """Base64 payload of a Twilio media event, found without parsing the JSON.
+
+    Returns None for anything else (control events, unexpected layouts,
+    escaped payloads) so the caller falls back to a full parse.
+    """
+    if not isinstance(message, str) or not message.startswith(MEDIA_EVENT_PREFIXES):
+        return None
+    for key in MEDIA_PAYLOAD_KEYS:
+        start = message.find(key)
+        if start >= 0:
+            start += len(key)
+            end = message.find('"', start)
+            if end < 0:
+                return None
+            payload = message[start:end]
+            return None if "\\" in payload else payload
+    return None
 
 
 class TwilioWebSocketHandler:
+    __slots__ = (
+        "voice_agent", "websocket", "stream_sid", "stream_started_at", "first_audio_sent", "media_prefix", "__weakref__",
+    )
+
     def __init__(self, voice_agent):
         self.voice_agent = voice_agent
         self.websocket = None
         self.stream_sid = None
+        self.stream_started_at = None
+        self.first_audio_sent = False
+        self.media_prefix = None
         
     async def handle_connection(self, websocket, path):
         self.websocket = websocket
@@ -550,7 +979,12 @@ class TwilioWebSocketHandler:
     
     async def handle_message(self, message):
         try:
-            data = json.loads(message)
+            payload = fast_media_payload(message)
+            if payload is not None:
+                await self.handle_media_payload(payload)
+                return
+
+            data = jsoncodec.loads(message)
             event = data.get('event')
             
             if event == 'start':
@@ -560,15 +994,23 @@ class TwilioWebSocketHandler:
             elif event == 'stop':
                 await self.handle_stop(data)
                 
-        except json.JSONDecodeError:
+        except jsoncodec.JSONDecodeError:
             logger.error(f"Invalid JSON received from Twilio for call {self.voice_agent.call_sid}")
         except Exception as e:
             logger.error(f"Error handling Twilio message for call {self.voice_agent.call_sid}: {e}")
     
+    def set_stream_sid(self, stream_sid):
+        self.stream_sid = stream_sid
+        active_calls.bind_stream(self.voice_agent.session, stream_sid)
+        # Outbound media messages are this prefix + payload + '"}}', no per-frame json.dumps
+        self.media_prefix = jsoncodec.dumps({"event": "media", "streamSid": stream_sid})[:-1] + ',"media":{"payload":"'
+
     async def handle_start(self, data):
         start_data = data.get('start', {})
         call_sid = start_data.get('callSid')
-        self.stream_sid = start_data.get('streamSid')
+        self.set_stream_sid(start_data.get('streamSid'))
+        if self.stream_started_at is None:
+            self.stream_started_at = time.perf_counter()
         logger.info(f"Stream started - CallSid: {call_sid}, StreamSid: {self.stream_sid}")
         
         # Wait for Deepgram to be ready
@@ -581,19 +1023,23 @@ class TwilioWebSocketHandler:
                 self.voice_agent.call_active = False
                 return
         
-        # Backup: Send greeting if not already sent
-        if self.voice_agent.deepgram_ready and self.voice_agent.ticket_data:
+        # Have the agent speak the greeting unless pre-rendered audio already played it
+        if self.voice_agent.deepgram_ready and not self.voice_agent.greeting_sent:
             logger.info(f"Ensuring greeting is sent for call {call_sid}")
-            await asyncio.sleep(1)  # Give a moment for things to settle
             await self.voice_agent.send_initial_greeting()
     
     async def handle_media(self, data):
-        if not self.voice_agent.call_active or not self.voice_agent.deepgram_ready:
-            return
-            
         media_data = data.get('media', {})
-        payload = media_data.get('payload')
+        await self.handle_media_payload(media_data.get('payload'))
+
+    async def handle_media_payload(self, payload):
+        if not self.voice_agent.accepting_audio:
+            return
+
         if payload:
+            self.voice_agent.session.frames_in += 1
+            MEDIA_FRAMES.labels("in").inc()
+            MEDIA_BYTES.labels("in").inc(len(payload) * 3 // 4)
             await self.voice_agent.process_twilio_audio(payload)
     
     async def handle_stop(self, data):
@@ -605,19 +1051,29 @@ class TwilioWebSocketHandler:
         if not self.voice_agent.call_active or not self.websocket or not self.stream_sid:
             return
             
-        message = {
-            "event": "media",
-            "streamSid": self.stream_sid,
-            "media": {
-                "payload": audio_payload
-            }
-        }
+        message = self.media_prefix + audio_payload + '"}}'
         try:
-            await self.websocket.send(json.dumps(message))
+            await self.websocket.send(message)
+            self.voice_agent.session.frames_out += 1
+            MEDIA_FRAMES.labels("out").inc()
+            MEDIA_BYTES.labels("out").inc(len(audio_payload) * 3 // 4)
+            if not self.first_audio_sent and self.stream_started_at:
+                self.first_audio_sent = True
+                TIME_TO_FIRST_AUDIO.observe(time.perf_counter() - self.stream_started_at)
+                self.voice_agent.trace.event("agent.first_audio")
         except Exception as e:
             logger.error(f"Failed to send media to Twilio for call {self.voice_agent.call_sid}: {e}")
             self.voice_agent.call_active = False
     
+    async def clear_media(self):
+        """Discard audio Twilio has buffered but not yet played"""
+        if not self.voice_agent.call_active or not self.websocket or not self.stream_sid:
+            return
+        try:
+            await self.websocket.send(json.dumps({"event": "clear", "streamSid": self.stream_sid}))
+        except Exception as e:
+            logger.error(f"Failed to send clear to Twilio for call {self.voice_agent.call_sid}: {e}")
+
     async def cleanup(self):
         self.voice_agent.call_active = False
         if self.voice_agent:
@@ -637,15 +1093,15 @@ async def handle_twilio_websocket(websocket, path):
     logger.info(f"New Twilio WebSocket connection: {path}")
     call_sid = None
     voice_agent = None
-    voice_agent_task = None
     
     try:
         # Wait for the start message to get call_sid
         async for message in websocket:
-            data = json.loads(message)
+            data = jsoncodec.loads(message)
             if data.get('event') == 'start':
                 call_sid = data['start']['callSid']
                 logger.info(f"Received start event - CallSid: {call_sid}")
+                asyncio.current_task().set_name(call_task_name(call_sid))
                 break
         
         if not call_sid:
@@ -653,27 +1109,33 @@ async def handle_twilio_websocket(websocket, path):
             return
             
         # Get call data
-        call_data = active_calls.get(call_sid, {})
-        ticket_data = call_data.get("ticket_data")
+        session = active_calls.get(call_sid)
         
-        if not ticket_data:
+        if not session or not session.ticket_data:
             logger.error(f"No ticket data found for CallSid: {call_sid}")
             return
         
         # Create voice agent
-        voice_agent = TwilioVoiceAgent(call_sid, ticket_data)
-        active_calls[call_sid]["voice_agent"] = voice_agent
+        voice_agent = TwilioVoiceAgent(session)
+        voice_agent.trace.event("media.start", stream_sid=data['start']['streamSid'])
+        session.voice_agent = voice_agent
+        session.status = "streaming"
         
         # Create WebSocket handler
         ws_handler = TwilioWebSocketHandler(voice_agent)
-        ws_handler.websocket = websocket
-        ws_handler.stream_sid = data['start']['streamSid']
+        ws_handler.websocket = voice_agent.supervisor.track_socket(websocket)
+        ws_handler.set_stream_sid(data['start']['streamSid'])
+        # Time to first audio counts from here, so it covers the pre-rendered greeting
+        ws_handler.stream_started_at = time.perf_counter()
         
         # Set the websocket handler in voice agent
         voice_agent.set_twilio_websocket(ws_handler)
         
-        # Start voice agent
-        voice_agent_task = asyncio.create_task(voice_agent.run())
+        # Start voice agent; connecting to Deepgram overlaps the greeting wait below
+        voice_agent.supervisor.spawn(voice_agent.run())
+
+        # Play the pre-rendered greeting the instant media starts
+        await voice_agent.stream_prerendered_greeting()
         
         # Process the start message
         await ws_handler.handle_start(data)
@@ -687,20 +1149,285 @@ async def handle_twilio_websocket(websocket, path):
     except Exception as e:
         logger.error(f"Error handling Twilio WebSocket: {e}")
     finally:
-        if voice_agent_task:
-            voice_agent_task.cancel()
-            try:
-                await voice_agent_task
-            except asyncio.CancelledError:
-                pass
         if voice_agent:
+            # Also cancels the run loop and anything else still running for the call
             await voice_agent.cleanup()
 
 
+def ticket_priority(ticket):
+    """Dial order: extracted priority 1 (Critical) first, unknown priority last"""
+    priority = ticket.get("priority")
+    return priority if isinstance(priority, int) else 5
+
+
+async def poll_cycle():
+    """Pipeline source: one item per poll"""
+    yield time.time()
+
+
+async def fetch_new_tickets(_):
+    """Fetch stage: open tickets not yet claimed, grouped into extraction batches"""
+    result = await fetch_freshdesk_tickets()
+    if "error" in result:
+        logger.error(f"Failed to list tickets: {result.get('error')}")
+        return None
+
+    # Tickets linked to an incident stay open until it is answered; they are not new
+    new_tickets = [
+        ticket for ticket in result["tickets"]
+        if ticket.get("id") not in processed_tickets and ticket.get("status") == 2
+        and not INCIDENTS.linked(ticket.get("id"))
+    ]
+    for ticket in new_tickets:
+        trace = TRACER.start_trace("incident", key=("ticket", ticket.get("id")), ticket_id=ticket.get("id"))
+        trace.event("ticket.detected")
+    return split_extraction_batches(new_tickets)
+
+
+async def extract_tickets(batch):
+    """Extract stage: one LLM request per batch, tickets released individually"""
+    started_ns = time.time_ns()
+    grok_ai = await get_grok_ai_async()
+    extractions = await grok_ai.extract_ticket_batch(batch)
+    for ticket in batch:
+        TRACER.get(("ticket", ticket.get("id"))).record("extract", started_ns, batch_size=len(batch))
+    return [build_ticket_summary(ticket, extractions.get(ticket.get("id"), {})) for ticket in batch]
+
+
+async def validate_ticket_phone(ticket):
+    """Validate stage: normalize the number, hold back tickets nobody could be dialed for"""
+    ticket_id = ticket.get("ticket_id")
+    raw_number = ticket.get("phone_number")
+    phone_number = normalize_phone_number(raw_number)
+    ticket["phone_number"] = phone_number
+
+    # Without a number in the ticket, nearest-responder routing or the directory can still supply one
+    if not phone_number and not ROUTER and not responders_for(ticket):
+        # Leave the ticket open; it is retried once the claim expires
+        logger.info(f"Skipping ticket {ticket_id}: Invalid phone number ({raw_number})")
+        processed_tickets[ticket_id] = time.time()
+        TRACER.finish(("ticket", ticket_id), outcome="invalid_phone")
+        return None
+    if not phone_number:
+        logger.info(f"Ticket {ticket_id} has no dialable number ({raw_number}), dialing routed or directory responders")
+    return ticket
+
+
+async def claim_ticket(ticket):
+    """Claim stage: make sure each ticket is dialed at most once"""
+    ticket_id = ticket.get("ticket_id")
+    if ticket_id in processed_tickets:
+        TRACER.finish(("ticket", ticket_id), outcome="already_claimed")
+        return None
+    processed_tickets[ticket_id] = time.time()
+    # Download and shrink the evidence now, so the WhatsApp alert mid-call only attaches files
+    EVIDENCE.prefetch(ticket.get("image_urls"))
+    return ticket
+
+
+async def close_sibling_tickets(ticket_ids):
+    """Close tickets linked to an incident that is already being handled, in one Freshdesk request"""
+    result = await bulk_update_freshdesk_tickets(ticket_ids, {"status": 5})
+    if "error" not in result:
+        logger.info(f"Closed {len(ticket_ids)} duplicate ticket(s): {ticket_ids}")
+        return
+    # Fall back to one request per ticket
+    logger.warning(f"Bulk close of duplicate tickets failed ({result['error']}), closing one by one")
+    results = await asyncio.gather(
+        *(update_freshdesk_ticket_status({"ticket_id": ticket_id, "status": 5}) for ticket_id in ticket_ids),
+        return_exceptions=True
+    )
+    for ticket_id, result in zip(ticket_ids, results):
+        if isinstance(result, BaseException) or "error" in result:
+            logger.error(f"Failed to close duplicate ticket {ticket_id}: {result}")
+
+
+INCIDENTS = IncidentIndex()
+SIBLING_CLOSER = BatchCloser(close_sibling_tickets)
+OPEN_INCIDENTS.set_function(lambda: len(INCIDENTS))
+
+
+async def correlate_ticket(ticket):
+    """Correlate stage: dial once per incident; other cameras' tickets for it are linked, and closed once answered"""
+    if not INCIDENT_DEDUP:
+        return ticket
+    ticket_id = ticket.get("ticket_id")
+    incident, is_new = INCIDENTS.correlate(ticket)
+    if is_new:
+        return ticket
+
+    primary_id = incident.primary.get("ticket_id")
+    DUPLICATE_TICKETS.inc()
+    logger.info(f"Ticket {ticket_id} is the same {incident.incident_type} as ticket {primary_id}, not dialing")
+    TRACER.get(("ticket", primary_id)).event("incident.sibling", ticket_id=ticket_id)
+    TRACER.finish(("ticket", ticket_id), outcome="duplicate", incident=primary_id)
+    if incident.answered:
+        SIBLING_CLOSER.add(ticket_id)
+    return None
+
+
+async def close_answered_incident(escalation):
+    """A responder took the incident: close the camera tickets linked to it"""
+    incident = INCIDENTS.answered(escalation.ticket_id)
+    for ticket_id in incident.siblings if incident else ():
+        SIBLING_CLOSER.add(ticket_id)
+
+
+def reopen_incident(ticket_id):
+    """Nobody took the incident: its linked tickets are still open, let the next poll pick them up again"""
+    incident = INCIDENTS.reopen(ticket_id)
+    if incident is None or not incident.siblings:
+        return
+    for sibling_id in incident.siblings:
+        processed_tickets.pop(sibling_id, None)
+    logger.info(f"Incident of ticket {ticket_id} unanswered, retrying linked ticket(s) {incident.siblings}")
+
+
+ROUTER = Router() if ROUTING_MODE == "nearest" else None
+
+
+async def route_ticket(ticket):
+    """Route stage: ring the nearest available responders ahead of the number in the ticket"""
+    ticket_id = ticket.get("ticket_id")
+    with TRACER.get(("ticket", ticket_id)).span("route") as span:
+        location, nearest = await ROUTER.nearest_responders(ticket)
+        span["geocoded"] = location is not None
+        span["responders"] = len(nearest)
+    if nearest:
+        distance, responder = nearest[0]
+        ticket["location"] = location
+        ticket["nearby_responders"] = [responder.phone for _, responder in nearest]
+        logger.info(f"Ticket {ticket_id}: nearest responder {responder.name or responder.phone} at {distance:.1f} km")
+    elif location is None:
+        logger.warning(f"Ticket {ticket_id}: could not geocode {ticket.get('address')!r}, using the ticket's number")
+    return ticket
+
+
+async def place_call(client, escalation, phone_number):
+    """Dial one responder leg of an escalation; returns its CallSid"""
+    ticket = escalation.ticket
+    ticket_id = escalation.ticket_id
+    trace = TRACER.get(("ticket", ticket_id))
+
+    with EXTERNAL_REQUEST_LATENCY.labels("twilio", "calls_create").time(), trace.span("dial", to=phone_number) as span:
+        call = await asyncio.to_thread(
+            client.calls.create,
+            to=phone_number,
+            from_=TWILIO_PHONE_NUMBER,
+            url=WEBHOOK_URL,
+            method="POST",
+            status_callback=STATUS_CALLBACK_URL,
+            status_callback_method="POST",
+            status_callback_event=["initiated", "ringing", "answered", "completed"],
+            timeout=60
+        )
+        span["call_sid"] = call.sid
+
+    if ROUTER:
+        # Busy until this leg ends, so routing skips them for other incidents
+        ROUTER.index.reserve(call.sid, phone_number)
+    logger.info(f"✅ Call initiated to {phone_number} for ticket {ticket_id}, CallSid: {call.sid}")
+
+    # Store call data
+    active_calls.add(CallSession(call.sid, ticket))
+    TRACER.bind(call.sid, trace)
+    # Rendered once per incident, whichever leg answers
+    escalation.greeting = prerender_greeting(call.sid, ticket, escalation.greeting)
+    return call.sid
+
+
+async def hang_up_call(client, call_sid):
+    """End a responder leg that lost the race: cancel it while ringing, complete it if it picked up"""
+    for status in ("canceled", "completed"):
+        try:
+            with EXTERNAL_REQUEST_LATENCY.labels("twilio", "calls_update").time():
+                await asyncio.to_thread(lambda: client.calls(call_sid).update(status=status))
+            logger.info(f"Hung up responder leg {call_sid} ({status})")
+            return
+        except Exception as e:
+            error = e
+    logger.error(f"Failed to hang up responder leg {call_sid}: {error}")
+
+
+async def close_unanswered_ticket(escalation):
+    """No responder answered (or none could be dialed): close the ticket"""
+    ticket_id = escalation.ticket_id
+    outcome = "unanswered" if escalation.legs else "dial_failed"
+    logger.warning(f"No responder answered for ticket {ticket_id} ({len(escalation.legs)} legs, {outcome})")
+    # Another camera's ticket for the same incident should be dialed, not closed as a duplicate
+    reopen_incident(ticket_id)
+    TRACER.finish(("ticket", ticket_id), outcome=outcome)
+    try:
+        await update_freshdesk_ticket_status({"ticket_id": ticket_id, "status": 5})
+    except Exception as e:
+        logger.error(f"Failed to update ticket status: {e}")
+
+
+ESCALATIONS = EscalationEngine(on_unanswered=close_unanswered_ticket, on_answered=close_answered_incident)
+
+
+async def dial_ticket(client, ticket):
+    """Dial stage: ring the ticket's responders, first to answer gets the agent"""
+    ticket_id = ticket.get("ticket_id")
+    responders = responders_for(ticket)
+    logger.info(
+        f"Processing ticket {ticket_id}: {ticket.get('incident_type')} at {ticket.get('address')}, "
+        f"ringing {len(responders)} responder(s)"
+    )
+    TRACER.get(("ticket", ticket_id)).set_attribute("responders", len(responders))
+    if not responders:
+        # Routing found nobody and the ticket has no number: leave it open, it is retried once the claim expires
+        logger.warning(f"Skipping ticket {ticket_id}: no responder to dial")
+        TRACER.finish(("ticket", ticket_id), outcome="no_responders")
+        reopen_incident(ticket_id)
+        return None
+
+    escalation = await ESCALATIONS.start(
+        ticket, responders,
+        dial=lambda escalation, number: place_call(client, escalation, number),
+        hang_up=lambda call_sid: hang_up_call(client, call_sid),
+    )
+    if not escalation.legs:
+        # Before the next ticket is correlated; close_unanswered_ticket runs later
+        reopen_incident(ticket_id)
+        return None
+
+    # Small delay between calls
+    await asyncio.sleep(DIAL_SPACING)
+    return ticket
+
+
+async def run_ingestion_pipeline(client):
+    """Stream tickets through fetch → extract → validate phone → claim → correlate → (route) → dial.
+
+    Every stage has its own queue and workers, so a ticket is dialed as soon
+    as its own extraction finishes; the dial queue is ordered by priority.
+    """
+    batches = stage("fetch", poll_cycle(), fetch_new_tickets, fan_out=True)
+    extracted = stage(
+        "extract", batches, extract_tickets,
+        concurrency=PIPELINE_EXTRACT_CONCURRENCY, queue_size=PIPELINE_QUEUE_SIZE, fan_out=True
+    )
+    validated = stage("validate_phone", extracted, validate_ticket_phone, queue_size=PIPELINE_QUEUE_SIZE)
+    claimed = stage("claim", validated, claim_ticket, queue_size=PIPELINE_QUEUE_SIZE)
+    correlated = stage("correlate", claimed, correlate_ticket, queue_size=PIPELINE_QUEUE_SIZE)
+    if ROUTER:
+        correlated = stage("route", correlated, route_ticket, queue_size=PIPELINE_QUEUE_SIZE)
+    dialed = stage(
+        "dial", correlated, lambda ticket: dial_ticket(client, ticket),
+        concurrency=PIPELINE_DIAL_CONCURRENCY, queue_size=PIPELINE_QUEUE_SIZE, priority=ticket_priority
+    )
+    async for _ in dialed:
+        pass
+
+
 async def poll_freshdesk_tickets():
     """Poll Freshdesk for new tickets and make calls"""
+    from twilio.rest import Client
+
     client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
     ticket_timeout = 300
+    LoopMonitor("poll", logger).start()
     
     while True:
         try:
@@ -711,72 +1438,8 @@ async def poll_freshdesk_tickets():
                 if current_time - processed_tickets[ticket_id] > ticket_timeout:
                     del processed_tickets[ticket_id]
 
-            # Get tickets from Freshdesk
-            result = await list_freshdesk_tickets({})
-            if "tickets" in result:
-                sorted_tickets = sorted(
-                    result["tickets"],
-                    key=lambda x: x.get("priority", 0),
-                    reverse=True
-                )
-                
-                for ticket in sorted_tickets:
-                    ticket_id = ticket.get("ticket_id")
-                    
-                    # Skip if already processed
-                    if ticket_id in processed_tickets:
-                        continue
-                        
-                    # Skip if not open status
-                    if ticket.get("status") != 2:
-                        continue
-                    
-                    # Validate phone number
-                    phone_number = ticket.get("phone_number")
-                    if phone_number and not phone_number.startswith("+"):
-                        phone_number = f"+{phone_number}"
-                        ticket["phone_number"] = phone_number
-                        
-                    if not phone_number or not PHONE_NUMBER_REGEX.match(phone_number):
-                        logger.info(f"Skipping ticket {ticket_id}: Invalid phone number ({phone_number})")
-                        try:
-                            await update_freshdesk_ticket_status({"ticket_id": ticket_id, "status": 5})
-                        except Exception as e:
-                            logger.error(f"Failed to update ticket {ticket_id} status: {e}")
-                        continue
-
-                    logger.info(f"Processing ticket {ticket_id}: {ticket.get('incident_type')} at {ticket.get('address')}")
-                    
-                    try:
-                        # Make the call
-                        call = client.calls.create(
-                            to=phone_number,
-                            from_=TWILIO_PHONE_NUMBER,
-                            url=WEBHOOK_URL,
-                            method="POST",
-                            status_callback=STATUS_CALLBACK_URL,
-                            status_callback_method="POST",
-                            status_callback_event=["initiated", "ringing", "answered", "completed"],
-                            timeout=60
-                        )
-                        
-                        logger.info(f"✅ Call initiated to {phone_number} for ticket {ticket_id}, CallSid: {call.sid}")
-                        
-                        # Store call data
-                        active_calls[call.sid] = {"ticket_data": ticket}
-                        processed_tickets[ticket_id] = current_time
-                        
-                        # Small delay between calls
-                        await asyncio.sleep(5)
-                        
-                    except Exception as e:
-                        logger.error(f"Failed to initiate call for ticket {ticket_id}: {str(e)}")
-                        try:
-                            await update_freshdesk_ticket_status({"ticket_id": ticket_id, "status": 5})
-                        except Exception as e:
-                            logger.error(f"Failed to update ticket status: {e}")
-            else:
-                logger.error(f"Failed to list tickets: {result.get('error')}")
+            with POLL_CYCLE_LATENCY.time():
+                await run_ingestion_pipeline(client)
                 
         except Exception as e:
             logger.error(f"Error polling Freshdesk tickets: {str(e)}")
@@ -784,16 +1447,19 @@ async def poll_freshdesk_tickets():
         await asyncio.sleep(POLLING_INTERVAL)
 
 
-def start_websocket_server():
-    """Start the WebSocket server for Twilio connections"""
+def start_websocket_server(ready=None):
+    """Start the WebSocket server for Twilio connections; sets `ready` once it is listening"""
     async def run_server():
         global ws_server
+        LoopMonitor("media", logger).start()
         ws_server = await websockets.serve(
             handle_twilio_websocket, 
             "0.0.0.0", 
-            8080
+            MEDIA_PORT
         )
-        logger.info("Twilio WebSocket server started on port 8080")
+        logger.info(f"Twilio WebSocket server started on port {MEDIA_PORT}")
+        if ready:
+            ready.set()
         await ws_server.wait_closed()
     
     thread = threading.Thread(target=lambda: asyncio.run(run_server()), daemon=True)
@@ -821,6 +1487,8 @@ def index():
         "endpoints": {
             "health": "/health",
             "status": "/status",
+            "metrics": "/metrics",
+            "traces": "/traces",
             "twilio_incoming": "/twilio/incoming",
             "twilio_status": "/twilio/status"
         }
@@ -831,7 +1499,21 @@ def index():
 def handle_incoming_call():
     """Handle incoming call webhook from Twilio"""
     try:
+        from twilio.twiml.voice_response import VoiceResponse
+
         response = VoiceResponse()
+        call_sid = request.form.get("CallSid")
+        won = ESCALATIONS.answered(call_sid)
+        if won is False:
+            # Another responder for the same incident picked up first
+            logger.info(f"Responder leg {call_sid} answered after the incident was taken; hanging up")
+            response.hangup()
+            return str(response)
+        if won:
+            trace = TRACER.get(call_sid)
+            trace.set_attribute("call_sid", call_sid)
+            trace.event("responder.answered", call_sid=call_sid)
+
         connect = response.connect()
         connect.stream(url=WEBSOCKET_URL)
         logger.info(f"Redirecting call to WebSocket: {WEBSOCKET_URL}")
@@ -849,17 +1531,27 @@ def handle_call_status():
     call_status = status_data.get("CallStatus", "unknown")
     
     logger.info(f"Call status update - CallSid: {call_sid}, Status: {call_status}")
+    TRACER.get(call_sid).event(f"twilio.{call_status}")
     
     # Handle call completion
-    if call_status in ["completed", "failed", "no-answer", "busy"]:
-        if call_sid in active_calls:
-            voice_agent = active_calls[call_sid].get("voice_agent")
-            if voice_agent:
-                voice_agent.call_active = False
+    if call_status in ["completed", "failed", "no-answer", "busy", "canceled"]:
+        if ROUTER:
+            ROUTER.index.release(call_sid)
+        if ESCALATIONS.leg_ended(call_sid, call_status) == "leg":
+            # A responder that did not take the incident; the escalation closes the ticket if nobody does
+            active_calls.remove(call_sid)
+            discard_prerendered_greeting(call_sid, cancel=False)
+            TRACER.unbind(call_sid)
+            return {"status": "received"}, 200
+
+        session = active_calls.get(call_sid)
+        if session:
+            if session.voice_agent:
+                session.voice_agent.call_active = False
                 
             # Update ticket status
             try:
-                ticket_data = active_calls[call_sid].get("ticket_data")
+                ticket_data = session.ticket_data
                 if ticket_data:
                     ticket_id = ticket_data.get("ticket_id")
                     if ticket_id:
@@ -872,10 +1564,11 @@ def handle_call_status():
                 logger.error(f"Failed to update ticket status: {e}")
                 
             # Safe cleanup
-            try:
-                del active_calls[call_sid]
+            discard_prerendered_greeting(call_sid)
+            TRACER.finish(call_sid, outcome=call_status)
+            if active_calls.remove(call_sid):
                 logger.info(f"Cleaned up call {call_sid}")
-            except KeyError:
+            else:
                 logger.warning(f"Call {call_sid} already cleaned up")
         else:
             logger.warning(f"Call {call_sid} not found in active_calls")
@@ -895,18 +1588,68 @@ def health_check():
     }
 
 
+@app.route("/metrics")
+def metrics():
+    """Prometheus metrics endpoint"""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/traces")
+def traces():
+    """Recent per-call span timelines, as JSON or OTLP (?format=otlp)"""
+    exported = TRACER.export_json(
+        trace_id=request.args.get("trace_id"),
+        call_sid=request.args.get("call_sid")
+    )
+    if request.args.get("format") == "otlp":
+        return to_otlp([span for trace in exported for span in trace["spans"]])
+    return {"traces": exported}
+
+
+def call_resources():
+    """Per-call state plus live tasks and sockets"""
+    resources = {}
+    for session in active_calls.sessions():
+        resources[session.call_sid] = session.snapshot()
+        if session.voice_agent:
+            resources[session.call_sid].update(session.voice_agent.supervisor.counts())
+    return resources
+
+
 @app.route("/status")
 def status():
     """Status endpoint"""
     return {
         "active_calls": len(active_calls),
+        "calls": call_resources(),
+        "leaks": list(LEAK_LOG)[-10:],
+        "escalations": ESCALATIONS.snapshot(),
+        "incidents": INCIDENTS.snapshot(),
+        "routing": ROUTER.snapshot() if ROUTER else {"mode": ROUTING_MODE},
+        "evidence": EVIDENCE.snapshot(),
         "processed_tickets": list(processed_tickets.keys()),
+        "pipeline_latency": stage_latency_snapshot(),
+        "slow_callbacks": list(SLOW_CALLBACK_LOG)[-10:],
         "timestamp": datetime.now().isoformat(),
         "mode": "city_monitor"
     }
 
 
 if __name__ == "__main__":
+    if "--startup-profile" in sys.argv:
+        profile_startup(__file__, "call")
+        sys.exit(0)
+
+    if "--startup-probe" in sys.argv:
+        # Used by --startup-profile: report once the media server accepts connections
+        media_ready = threading.Event()
+        start_websocket_server(media_ready)
+        media_ready.wait(10)
+        print(STARTUP_READY_LINE, flush=True)
+        sys.exit(0)
+
+    validate_environment()
+
     print("\n" + "=" * 70)
     print("🚨 City Monitor Agent Starting!")
     print("=" * 70)
@@ -918,12 +1661,18 @@ if __name__ == "__main__":
     print(f"   - POLLING_INTERVAL: {POLLING_INTERVAL}s")
     
     print("\n🚀 Starting services...")
+
+    # Render the fixed greeting segments before the first call needs them
+    warm_greeting_cache()
     
     # Start WebSocket server
     start_websocket_server()
     
     # Start polling thread
     threading.Thread(target=start_polling, daemon=True).start()
+
+    # Twilio, Groq and Selenium load on first use; warm them now that streams are being accepted
+    preload_in_background(logger=logger)
     
     # Start Flask app
     port = int(os.environ.get("PORT", 5000))
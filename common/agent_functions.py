@@ -6,6 +6,7 @@ from typing import Dict, Any
 from .business_logic import (
     get_customer,
 )
+from .tool_cache import register_tools
 
 
 async def find_customer(params):
@@ -146,6 +147,8 @@ FUNCTION_DEFINITIONS = [
                 },
             },
         },
+        "idempotent": True,
+        "cache_ttl": 300,
     },
     {
     "name": "email_verification",
@@ -165,7 +168,9 @@ FUNCTION_DEFINITIONS = [
             }
         },
         "required": ["email"]
-    }
+    },
+    "idempotent": True,
+    "cache_ttl": 3600,
 },
 {
     "name": "create_freshdesk_ticket",
@@ -212,3 +217,5 @@ FUNCTION_MAP = {
     "email_verification": email_verification,
     "create_freshdesk_ticket": create_freshdesk_ticket,
 }
+
+register_tools(FUNCTION_DEFINITIONS)
@@ -0,0 +1,211 @@
+import array
+import asyncio
+import os
+import random
+from collections import deque
+
+# Handle audioop deprecation gracefully (call.py reports the missing module)
+try:
+    import audioop
+except ImportError:
+    import audioop3 as audioop
+
+VAD_ENABLED = os.environ.get("VAD_ENABLED", "false").lower() == "true"
+VAD_MODE = os.environ.get("VAD_MODE", "keepalive")  # "keepalive" or "comfort_noise"
+VAD_HANGOVER_MS = int(os.environ.get("VAD_HANGOVER_MS", 600))
+VAD_PREROLL_MS = int(os.environ.get("VAD_PREROLL_MS", 200))
+VAD_MIN_RMS = int(os.environ.get("VAD_MIN_RMS", 300))
+VAD_COMFORT_INTERVAL_MS = 200
+FRAME_MS = 20
+
+# Deepgram uplink aggregation: 20 sends one message per Twilio frame, 40-100 trades latency for fewer sends
+UPLINK_CHUNK_MS = int(os.environ.get("UPLINK_CHUNK_MS", 20))
+UPLINK_FLUSH_MS = int(os.environ.get("UPLINK_FLUSH_MS", UPLINK_CHUNK_MS))
+
+
+def comfort_noise_frame(frame_bytes, level=30, seed=1):
+    """Low-level white noise, so the recognizer keeps hearing a live line"""
+    rng = random.Random(seed)
+    return array.array("h", (rng.randint(-level, level) for _ in range(frame_bytes // 2))).tobytes()
+
+
+class VoiceActivityDetector:
+    """Energy / zero-crossing VAD for one call's inbound 16-bit PCM frames.
+
+    Per-frame RMS and zero-crossing counts come from audioop, which works on
+    the whole frame in C. Speech is energy above an adaptive noise floor (or
+    VAD_MIN_RMS), with very high zero-crossing rates at low energy treated as
+    hiss. The floor only rises during silence that has outlasted the hangover,
+    and slowly, so the quieter frames inside an utterance can't ratchet the
+    threshold up; it falls quickly and never exceeds min_rms. Frames are forwarded during speech and for `hangover_ms` after it;
+    the last `preroll_ms` of silence is replayed when speech starts so onsets
+    are never clipped. Long silence is dropped, or thinned to a comfort-noise
+    frame every VAD_COMFORT_INTERVAL_MS in comfort_noise mode.
+    """
+
+    def __init__(self, mode=VAD_MODE, hangover_ms=VAD_HANGOVER_MS, preroll_ms=VAD_PREROLL_MS,
+                 min_rms=VAD_MIN_RMS, noise_ratio=3.0):
+        self.mode = mode
+        self.hangover_frames = max(hangover_ms // FRAME_MS, 1)
+        self.preroll = deque(maxlen=max(preroll_ms // FRAME_MS, 1))
+        self.preroll_enabled = preroll_ms >= FRAME_MS
+        self.min_rms = min_rms
+        self.noise_ratio = noise_ratio
+        self.noise_floor = float(min_rms) / noise_ratio
+        self.frames_since_speech = self.hangover_frames + 1
+        self.comfort_every = max(VAD_COMFORT_INTERVAL_MS // FRAME_MS, 1)
+        self.comfort_frame = None
+        self.suppressed_run = 0
+        self.frames_in = 0
+        self.frames_suppressed = 0
+        self.bytes_suppressed = 0
+
+    @property
+    def suppressing(self):
+        return self.frames_since_speech > self.hangover_frames
+
+    def is_speech(self, frame):
+        rms = audioop.rms(frame, 2)
+        threshold = max(self.min_rms, self.noise_floor * self.noise_ratio)
+        if rms < threshold:
+            if rms < self.noise_floor:
+                self.noise_floor += 0.5 * (rms - self.noise_floor)
+            elif self.suppressing:
+                # Rise only with the line quiet past the hangover, never from pauses within speech
+                self.noise_floor = min(self.noise_floor + 0.01 * (rms - self.noise_floor), self.min_rms)
+            return False
+        samples = len(frame) // 2
+        zero_crossing_rate = audioop.cross(frame, 2) / samples if samples else 0.0
+        return zero_crossing_rate < 0.5 or rms > 2 * threshold
+
+    def process(self, frame):
+        """Frames to forward for this input frame (possibly none, or pre-roll + frame)"""
+        self.frames_in += 1
+        if self.is_speech(frame):
+            output = []
+            if self.suppressing and self.preroll_enabled:
+                output.extend(self.preroll)
+                self.frames_suppressed -= len(self.preroll)
+                self.bytes_suppressed -= sum(len(f) for f in self.preroll)
+            self.preroll.clear()
+            self.frames_since_speech = 0
+            self.suppressed_run = 0
+            output.append(frame)
+            return output
+
+        self.frames_since_speech += 1
+        if not self.suppressing:
+            return [frame]
+
+        self.suppressed_run += 1
+        if self.mode == "comfort_noise" and self.suppressed_run % self.comfort_every == 0:
+            if self.comfort_frame is None or len(self.comfort_frame) != len(frame):
+                self.comfort_frame = comfort_noise_frame(len(frame))
+            # Something was sent in this frame's place, so it is neither suppressed nor replayed
+            return [self.comfort_frame]
+
+        if self.preroll_enabled:
+            self.preroll.append(frame)
+        self.frames_suppressed += 1
+        self.bytes_suppressed += len(frame)
+        return []
+
+
+class UplinkAggregator:
+    """Coalesces uplink audio into chunk_ms messages in a preallocated buffer.
+
+    Frames are copied into one bytearray that is reused for the life of the
+    call; a message is sent when chunk_ms of audio is buffered, or flush_ms
+    after the first buffered frame, whichever comes first, so added latency
+    never exceeds flush_ms. `send` is the coroutine that writes one message;
+    `spawn` schedules the timer-driven flushes (e.g. a call supervisor's).
+    """
+
+    def __init__(self, send, bytes_per_ms, chunk_ms=UPLINK_CHUNK_MS, flush_ms=UPLINK_FLUSH_MS,
+                 spawn=asyncio.ensure_future):
+        self.send = send
+        self.spawn = spawn
+        self.chunk_bytes = max(int(bytes_per_ms * chunk_ms), 1)
+        self.flush_delay = flush_ms / 1000
+        # Room for a full chunk plus one more 20 ms frame before the threshold check
+        self.buffer = bytearray(self.chunk_bytes + int(bytes_per_ms * FRAME_MS))
+        self.view = memoryview(self.buffer)
+        self.length = 0
+        self.timer = None
+        self.messages = 0
+        self.bytes = 0
+
+    async def add(self, data):
+        if self.length + len(data) > len(self.buffer):
+            await self.flush()
+            if len(data) > len(self.buffer):
+                await self._send(bytes(data))
+                return
+        self.view[self.length:self.length + len(data)] = data
+        self.length += len(data)
+        if self.length >= self.chunk_bytes:
+            await self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.flush_delay, self._flush_on_timer)
+
+    def _flush_on_timer(self):
+        self.timer = None
+        if self.length:
+            self.spawn(self.flush())
+
+    async def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.length:
+            return
+        # Copy out before awaiting so frames arriving during the send start a new chunk
+        payload = bytes(self.view[:self.length])
+        self.length = 0
+        await self._send(payload)
+
+    async def _send(self, payload):
+        self.messages += 1
+        self.bytes += len(payload)
+        await self.send(payload)
+
+    def close(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.length = 0
+
+
+class AudioRing:
+    """Bounded FIFO of uplink audio held while the Deepgram socket is down.
+
+    Once more than max_bytes is queued the oldest audio is discarded and
+    counted in `dropped`, so a long outage costs the start of the gap rather
+    than unbounded memory.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.chunks = deque()
+        self.length = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def append(self, data):
+        self.chunks.append(bytes(data))
+        self.length += len(data)
+        while self.length > self.max_bytes and self.chunks:
+            oldest = self.chunks.popleft()
+            self.length -= len(oldest)
+            self.dropped += len(oldest)
+
+    def popleft(self):
+        chunk = self.chunks.popleft()
+        self.length -= len(chunk)
+        return chunk
+
+    def clear(self):
+        self.chunks.clear()
+        self.length = 0
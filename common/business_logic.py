@@ -1,13 +1,17 @@
 import asyncio
-import json
+import shutil
+import threading
 from datetime import datetime, timedelta
-import random
-from common.config import ARTIFICIAL_DELAY, MOCK_DATA_SIZE
+from common.config import ARTIFICIAL_DELAY, MOCK_DATA_SIZE, DATABASE_CONFIG
+from common.mock_data import MOCK_DATA_SEED, load_sqlite, write_ndjson
+from common.mock_data import generate_mock_data as build_mock_data
+from common.repository import InMemoryRepository
+from common.database import open_database
 import pathlib
 
 
-def save_mock_data(data):
-    """Save mock data to a timestamped file in mock_data_outputs directory."""
+def save_mock_data(sizes=MOCK_DATA_SIZE, seed=MOCK_DATA_SEED):
+    """Stream the mock dataset as NDJSON to a timestamped directory in mock_data_outputs."""
     # Create mock_data_outputs directory if it doesn't exist
     output_dir = pathlib.Path("mock_data_outputs")
     output_dir.mkdir(exist_ok=True)
@@ -15,131 +19,70 @@ def save_mock_data(data):
     # Clean up old mock data files
     cleanup_mock_data_files(output_dir)
 
-    # Generate timestamp for filename
+    # Generate timestamp for the directory name
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = output_dir / f"mock_data_{timestamp}.json"
+    output_path = output_dir / f"mock_data_{timestamp}"
+    write_ndjson(str(output_path), sizes, seed)
 
-    # Save the data with pretty printing
-    with open(output_file, "w") as f:
-        json.dump(data, f, indent=2)
-
-    print(f"\nMock data saved to: {output_file}")
+    print(f"\nMock data saved to: {output_path}")
 
 
 def cleanup_mock_data_files(output_dir):
     """Remove all existing mock data files in the output directory."""
-    for file in output_dir.glob("mock_data_*.json"):
+    for path in output_dir.glob("mock_data_*"):
         try:
-            file.unlink()
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
         except Exception as e:
-            print(f"Warning: Could not delete {file}: {e}")
+            print(f"Warning: Could not delete {path}: {e}")
 
 
 # Mock data generation
 def generate_mock_data():
-    customers = []
-    appointments = []
-    orders = []
-
-    # Generate customers
-    for i in range(MOCK_DATA_SIZE["customers"]):
-        customer = {
-            "id": f"CUST{i:04d}",
-            "name": f"Customer {i}",
-            "phone": f"+1555{i:07d}",
-            "email": f"customer{i}@example.com",
-            "joined_date": (
-                datetime.now() - timedelta(days=random.randint(0, 7))
-            ).isoformat(),
-        }
-        customers.append(customer)
-
-    # Generate appointments
-    for i in range(MOCK_DATA_SIZE["appointments"]):
-        customer = random.choice(customers)
-        appointment = {
-            "id": f"APT{i:04d}",
-            "customer_id": customer["id"],
-            "customer_name": customer["name"],
-            "date": (datetime.now() + timedelta(days=random.randint(0, 7))).isoformat(),
-            "service": random.choice(
-                ["Consultation", "Follow-up", "Review", "Planning"]
-            ),
-            "status": random.choice(["Scheduled", "Completed", "Cancelled"]),
-        }
-        appointments.append(appointment)
-
-    # Generate orders
-    for i in range(MOCK_DATA_SIZE["orders"]):
-        customer = random.choice(customers)
-        order = {
-            "id": f"ORD{i:04d}",
-            "customer_id": customer["id"],
-            "customer_name": customer["name"],
-            "date": (datetime.now() - timedelta(days=random.randint(0, 7))).isoformat(),
-            "items": random.randint(1, 5),
-            "total": round(random.uniform(10.0, 500.0), 2),
-            "status": random.choice(["Pending", "Shipped", "Delivered", "Cancelled"]),
-        }
-        orders.append(order)
-
-    # Format sample data for display
-    sample_data = []
-    sample_customers = random.sample(customers, 3)
-    for customer in sample_customers:
-        customer_data = {
-            "Customer": customer["name"],
-            "ID": customer["id"],
-            "Phone": customer["phone"],
-            "Email": customer["email"],
-            "Appointments": [],
-            "Orders": [],
-        }
-
-        # Add appointments
-        customer_appointments = [
-            a for a in appointments if a["customer_id"] == customer["id"]
-        ]
-        for apt in customer_appointments[:2]:
-            customer_data["Appointments"].append(
-                {
-                    "Service": apt["service"],
-                    "Date": apt["date"][:10],
-                    "Status": apt["status"],
-                }
-            )
-
-        # Add orders
-        customer_orders = [o for o in orders if o["customer_id"] == customer["id"]]
-        for order in customer_orders[:2]:
-            customer_data["Orders"].append(
-                {
-                    "ID": order["id"],
-                    "Total": f"${order['total']}",
-                    "Status": order["status"],
-                    "Date": order["date"][:10],
-                    "# Items": order["items"],
-                }
-            )
-
-        sample_data.append(customer_data)
-
-    # Create data object
-    mock_data = {
-        "customers": customers,
-        "appointments": appointments,
-        "orders": orders,
-        "sample_data": sample_data,
-    }
-
-    # Save the mock data
-    save_mock_data(mock_data)
-
-    return mock_data
-
-
-# Initialize mock data
-MOCK_DATA = generate_mock_data()
+    """Build the mock dataset in memory (seeded, so every start sees the same records)."""
+    return build_mock_data(MOCK_DATA_SIZE, seed=MOCK_DATA_SEED)
+
+
+_repository = None
+_mock_data = None
+_repository_lock = threading.Lock()
+
+
+def get_repository():
+    """The business data repository, built on first use rather than at import."""
+    global _repository, _mock_data
+    with _repository_lock:
+        if _repository is None:
+            # SQLite is loaded once and reused across restarts, mock data lives in RAM
+            if DATABASE_CONFIG["enable"]:
+                repository = open_database(DATABASE_CONFIG["path"], DATABASE_CONFIG.get("pool_size", 4))
+                if repository.is_empty():
+                    # Streamed straight into SQLite, never held in memory
+                    load_sqlite(repository, MOCK_DATA_SIZE, seed=MOCK_DATA_SEED)
+            else:
+                _mock_data = generate_mock_data()
+                repository = InMemoryRepository(_mock_data)
+            _repository = repository
+    return _repository
+
+
+def set_repository(repository):
+    """Swap in another repository (e.g. a SqliteRepository built elsewhere)."""
+    global _repository
+    with _repository_lock:
+        _repository = repository
+
+
+def __getattr__(name):
+    # MOCK_DATA and REPOSITORY used to be built at import; they are still reachable, lazily
+    if name == "REPOSITORY":
+        return get_repository()
+    if name == "MOCK_DATA":
+        get_repository()
+        return _mock_data
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 async def simulate_delay(delay_type):
@@ -147,25 +90,23 @@ async def simulate_delay(delay_type):
     await asyncio.sleep(ARTIFICIAL_DELAY[delay_type])
 
 
+async def query(method_name, *args, **kwargs):
+    """Run a repository method, off the event loop when it does blocking I/O."""
+    repository = get_repository()
+    method = getattr(repository, method_name)
+    if repository.blocking:
+        return await asyncio.to_thread(method, *args, **kwargs)
+    return method(*args, **kwargs)
+
+
 async def get_customer(phone=None, email=None, customer_id=None):
     """Look up a customer by phone, email, or ID."""
     await simulate_delay("database")
 
-    if phone:
-        customer = next(
-            (c for c in MOCK_DATA["customers"] if c["phone"] == phone), None
-        )
-    elif email:
-        customer = next(
-            (c for c in MOCK_DATA["customers"] if c["email"] == email), None
-        )
-    elif customer_id:
-        customer = next(
-            (c for c in MOCK_DATA["customers"] if c["id"] == customer_id), None
-        )
-    else:
+    if not (phone or email or customer_id):
         return {"error": "No search criteria provided"}
 
+    customer = await query("find_customer", phone=phone, email=email, customer_id=customer_id)
     return customer if customer else {"error": "Customer not found"}
 
 
@@ -173,9 +114,7 @@ async def get_customer_appointments(customer_id):
     """Get all appointments for a customer."""
     await simulate_delay("database")
 
-    appointments = [
-        a for a in MOCK_DATA["appointments"] if a["customer_id"] == customer_id
-    ]
+    appointments = await query("appointments_for", customer_id)
     return {"customer_id": customer_id, "appointments": appointments}
 
 
@@ -183,7 +122,7 @@ async def get_customer_orders(customer_id):
     """Get all orders for a customer."""
     await simulate_delay("database")
 
-    orders = [o for o in MOCK_DATA["orders"] if o["customer_id"] == customer_id]
+    orders = await query("orders_for", customer_id)
     return {"customer_id": customer_id, "orders": orders}
 
 
@@ -196,19 +135,8 @@ async def schedule_appointment(customer_id, date, service):
     if "error" in customer:
         return customer
 
-    # Create new appointment
-    appointment_id = f"APT{len(MOCK_DATA['appointments']):04d}"
-    appointment = {
-        "id": appointment_id,
-        "customer_id": customer_id,
-        "customer_name": customer["name"],
-        "date": date,
-        "service": service,
-        "status": "Scheduled",
-    }
-
-    MOCK_DATA["appointments"].append(appointment)
-    return appointment
+    # Create new appointment (keeps the customer and date indexes in step)
+    return await query("add_appointment", customer, date, service)
 
 
 async def get_available_appointment_slots(start_date, end_date):
@@ -219,18 +147,18 @@ async def get_available_appointment_slots(start_date, end_date):
     start = datetime.fromisoformat(start_date)
     end = datetime.fromisoformat(end_date)
 
-    # Generate available slots (9 AM to 5 PM, 1-hour slots)
-    slots = []
+    # Generate candidate slots (9 AM to 5 PM, 1-hour slots)
+    candidates = []
     current = start
     while current <= end:
         if current.hour >= 9 and current.hour < 17:
-            slot_time = current.isoformat()
-            # Check if slot is already taken
-            taken = any(a["date"] == slot_time for a in MOCK_DATA["appointments"])
-            if not taken:
-                slots.append(slot_time)
+            candidates.append(current.isoformat())
         current += timedelta(hours=1)
 
+    # Check which slots are already taken in one indexed lookup
+    taken = await query("booked_among", candidates)
+    slots = [slot_time for slot_time in candidates if slot_time not in taken]
+
     return {"available_slots": slots}
 
 
@@ -246,12 +174,12 @@ async def prepare_agent_filler_message(websocket, message_type):
     if message_type == "lookup":
         inject_message = {
             "type": "InjectAgentMessage",
-            "message": "Let me look that up for you...",
+            "content": "Let me look that up for you...",
         }
     else:
         inject_message = {
             "type": "InjectAgentMessage",
-            "message": "One moment please...",
+            "content": "One moment please...",
         }
 
     # Return the result first - this becomes the function call response
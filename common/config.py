@@ -13,8 +13,9 @@ MOCK_DATA_SIZE = {
 }
 
 # Database settings (if using SQLite)
-# Not in use in this reference implementation but left as an example for how to potentially integrate with a DB
+# With enable=True business_logic serves lookups from common/database.py, seeded with MOCK_DATA_SIZE on first run
 DATABASE_CONFIG = {
     "path": "business_data.db",
-    "enable": False  # Set to True to use actual SQLite instead of mock data
+    "enable": False,  # Set to True to use actual SQLite instead of mock data
+    "pool_size": 4  # Connections shared by lookups running in worker threads
 } 
\ No newline at end of file
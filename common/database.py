@@ -0,0 +1,211 @@
+import os
+import queue
+import sqlite3
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    email TEXT NOT NULL,
+    joined_date TEXT
+);
+CREATE TABLE IF NOT EXISTS appointments (
+    id TEXT PRIMARY KEY,
+    customer_id TEXT NOT NULL,
+    customer_name TEXT,
+    date TEXT NOT NULL,
+    service TEXT,
+    status TEXT
+);
+CREATE TABLE IF NOT EXISTS orders (
+    id TEXT PRIMARY KEY,
+    customer_id TEXT NOT NULL,
+    customer_name TEXT,
+    date TEXT,
+    items INTEGER,
+    total REAL,
+    status TEXT
+);
+"""
+
+# Created after a bulk load so inserts do not maintain them row by row
+INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS customers_phone ON customers (phone);
+CREATE UNIQUE INDEX IF NOT EXISTS customers_email ON customers (email);
+CREATE INDEX IF NOT EXISTS appointments_customer ON appointments (customer_id);
+CREATE INDEX IF NOT EXISTS appointments_date ON appointments (date);
+CREATE INDEX IF NOT EXISTS orders_customer ON orders (customer_id);
+"""
+
+COLUMNS = {
+    "customers": ("id", "name", "phone", "email", "joined_date"),
+    "appointments": ("id", "customer_id", "customer_name", "date", "service", "status"),
+    "orders": ("id", "customer_id", "customer_name", "date", "items", "total", "status"),
+}
+
+# Fixed SQL text so sqlite3's per-connection statement cache reuses the prepared statements
+SELECT_CUSTOMER_BY_PHONE = "SELECT * FROM customers WHERE phone = ?"
+SELECT_CUSTOMER_BY_EMAIL = "SELECT * FROM customers WHERE email = ?"
+SELECT_CUSTOMER_BY_ID = "SELECT * FROM customers WHERE id = ?"
+SELECT_APPOINTMENTS = "SELECT * FROM appointments WHERE customer_id = ? ORDER BY rowid"
+SELECT_ORDERS = "SELECT * FROM orders WHERE customer_id = ? ORDER BY rowid"
+SELECT_BOOKED = "SELECT 1 FROM appointments WHERE date = ? LIMIT 1"
+COUNT_APPOINTMENTS = "SELECT COUNT(*) FROM appointments"
+
+SQLITE_MAX_PARAMS = 900
+BULK_CHUNK_SIZE = 10000
+
+
+def _insert_sql(table):
+    columns = COLUMNS[table]
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+
+
+class SqliteRepository:
+    """business_logic data in SQLite, with the same methods as InMemoryRepository.
+
+    Connections come from a small pool so lookups can run in worker threads
+    (business_logic hands them to asyncio.to_thread) without sharing a
+    connection. The database runs in WAL mode so those readers never block
+    on the occasional appointment write.
+    """
+
+    blocking = True
+
+    def __init__(self, path, pool_size=4):
+        self.path = path
+        self.pool = queue.LifoQueue()
+        for _ in range(pool_size):
+            self.pool.put(self._connect())
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, cached_statements=64)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self.pool.get()
+        try:
+            yield conn
+        finally:
+            self.pool.put(conn)
+
+    def close(self):
+        while not self.pool.empty():
+            self.pool.get_nowait().close()
+
+    def _one(self, sql, params):
+        with self.connection() as conn:
+            row = conn.execute(sql, params).fetchone()
+        return dict(row) if row else None
+
+    def _all(self, sql, params):
+        with self.connection() as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def is_empty(self):
+        with self.connection() as conn:
+            return conn.execute("SELECT 1 FROM customers LIMIT 1").fetchone() is None
+
+    def bulk_load(self, data, chunk_size=BULK_CHUNK_SIZE):
+        """Insert a mock dataset ({"customers": [...], ...}, lists or iterables) in chunked transactions"""
+        with self.connection() as conn:
+            conn.execute("PRAGMA synchronous=OFF")
+            try:
+                for table, columns in COLUMNS.items():
+                    sql = _insert_sql(table)
+                    chunk = []
+                    for record in data.get(table, ()):
+                        chunk.append(tuple(record.get(column) for column in columns))
+                        if len(chunk) >= chunk_size:
+                            self._insert_chunk(conn, sql, chunk)
+                            chunk = []
+                    if chunk:
+                        self._insert_chunk(conn, sql, chunk)
+                conn.executescript(INDEXES)
+                conn.execute("ANALYZE")
+            finally:
+                conn.execute("PRAGMA synchronous=NORMAL")
+
+    def _insert_chunk(self, conn, sql, rows):
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(sql, rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def find_customer(self, phone=None, email=None, customer_id=None):
+        if phone:
+            return self._one(SELECT_CUSTOMER_BY_PHONE, (phone,))
+        if email:
+            return self._one(SELECT_CUSTOMER_BY_EMAIL, (email,))
+        if customer_id:
+            return self._one(SELECT_CUSTOMER_BY_ID, (customer_id,))
+        return None
+
+    def appointments_for(self, customer_id):
+        return self._all(SELECT_APPOINTMENTS, (customer_id,))
+
+    def orders_for(self, customer_id):
+        return self._all(SELECT_ORDERS, (customer_id,))
+
+    def add_appointment(self, customer, date, service):
+        with self.connection() as conn:
+            # IMMEDIATE takes the write lock up front so two bookings cannot reuse an id
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                count = conn.execute(COUNT_APPOINTMENTS).fetchone()[0]
+                appointment = {
+                    "id": f"APT{count:04d}",
+                    "customer_id": customer["id"],
+                    "customer_name": customer["name"],
+                    "date": date,
+                    "service": service,
+                    "status": "Scheduled",
+                }
+                conn.execute(
+                    _insert_sql("appointments"),
+                    tuple(appointment[column] for column in COLUMNS["appointments"]),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return appointment
+
+    def is_booked(self, date):
+        with self.connection() as conn:
+            return conn.execute(SELECT_BOOKED, (date,)).fetchone() is not None
+
+    def booked_among(self, dates):
+        """The subset of `dates` (ISO strings) that already have an appointment"""
+        dates = list(dates)
+        booked = set()
+        with self.connection() as conn:
+            for i in range(0, len(dates), SQLITE_MAX_PARAMS):
+                chunk = dates[i:i + SQLITE_MAX_PARAMS]
+                placeholders = ", ".join("?" for _ in chunk)
+                booked.update(
+                    row[0] for row in conn.execute(
+                        f"SELECT DISTINCT date FROM appointments WHERE date IN ({placeholders})", chunk
+                    )
+                )
+        return booked
+
+
+def open_database(path, pool_size=4):
+    """Open (creating if needed) the SQLite business database"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return SqliteRepository(path, pool_size=pool_size)
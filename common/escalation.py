@@ -0,0 +1,268 @@
+"""Responder escalation: ring several responders for an incident, first answer wins.
+
+Responders come from the ticket (the nearest responders found by routing,
+the number the LLM extracted, plus an optional "responders" list) and from a
+local directory file keyed by incident type:
+
+    {"fire": ["+923001234567", {"name": "Station 4", "phone": "0301 7654321"}],
+     "default": ["+923009999999"]}
+
+In "parallel" mode every responder rings at once; in "waves" mode they ring
+ESCALATION_WAVE_SIZE at a time, the next wave starting after
+ESCALATION_WAVE_DELAY seconds or as soon as every leg of the current wave
+has ended unanswered. The first leg to answer is bridged to the voice agent
+and the others are hung up.
+
+Twilio reports answers and hang-ups on the Flask thread, while legs are dialed
+from the ingestion loop. answered() therefore decides the winner under a lock
+and returns at once. All other state changes are handed to the loop.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+
+from common.metrics import REGISTRY
+from common.phone import normalize_phone_number
+
+ESCALATION_MODE = os.environ.get("ESCALATION_MODE", "parallel")  # "parallel" or "waves"
+ESCALATION_WAVE_SIZE = int(os.environ.get("ESCALATION_WAVE_SIZE", 2))
+ESCALATION_WAVE_DELAY = float(os.environ.get("ESCALATION_WAVE_DELAY", 20))
+ESCALATION_MAX_RESPONDERS = int(os.environ.get("ESCALATION_MAX_RESPONDERS", 6))
+RESPONDER_DIRECTORY = os.environ.get("RESPONDER_DIRECTORY")  # JSON file, see above
+
+ANSWER_LATENCY = REGISTRY.histogram(
+    "escalation_answer_seconds", "First responder dialed to a responder answering", ("incident_type",),
+    buckets=(1, 2.5, 5, 10, 15, 20, 30, 45, 60, 90, 120)
+)
+ESCALATION_OUTCOMES = REGISTRY.counter("escalations", "Escalated incidents by outcome", ("outcome",))
+LEG_OUTCOMES = REGISTRY.counter("escalation_legs", "Responder call legs by outcome", ("outcome",))
+
+_directory = None
+_directory_lock = threading.Lock()
+
+
+def load_responder_directory(path=RESPONDER_DIRECTORY):
+    """{incident type (lower case): [E.164 numbers]} from the directory file, loaded once"""
+    global _directory
+    with _directory_lock:
+        if _directory is None:
+            _directory = {}
+            if path:
+                try:
+                    with open(path) as f:
+                        raw = json.load(f)
+                    for incident_type, entries in raw.items():
+                        _directory[incident_type.lower()] = [
+                            entry.get("phone") if isinstance(entry, dict) else entry for entry in entries
+                        ]
+                except (OSError, ValueError, AttributeError) as e:
+                    print(f"[ERROR] Could not load responder directory {path}: {e}")
+        return _directory
+
+
+def responders_for(ticket, directory=None, limit=ESCALATION_MAX_RESPONDERS):
+    """Dialable, de-duplicated numbers for a ticket: routed, then ticket-supplied, then the directory"""
+    directory = load_responder_directory() if directory is None else directory
+    incident_type = (ticket.get("incident_type") or "").lower()
+    candidates = [*(ticket.get("nearby_responders") or ()), ticket.get("phone_number"), *(ticket.get("responders") or ())]
+    candidates += directory.get(incident_type) or directory.get("default") or []
+
+    numbers = []
+    for raw in candidates:
+        number = normalize_phone_number(raw) if raw else None
+        if number and number not in numbers:
+            numbers.append(number)
+    return numbers[:limit]
+
+
+def plan_waves(responders, mode=ESCALATION_MODE, wave_size=ESCALATION_WAVE_SIZE):
+    if mode == "waves":
+        size = max(wave_size, 1)
+        return [responders[i:i + size] for i in range(0, len(responders), size)]
+    return [responders] if responders else []
+
+
+class Escalation:
+    """The responder legs ringing for one incident"""
+
+    def __init__(self, ticket, waves, dial, hang_up):
+        self.ticket = ticket
+        self.ticket_id = ticket.get("ticket_id")
+        self.waves = waves
+        self.dial = dial
+        self.hang_up = hang_up
+        self.legs = {}  # CallSid -> (number, wave index)
+        self.ended = set()
+        self.winner = None
+        self.answer_seconds = None
+        self.finished = False
+        self.waves_dialed = 0
+        self.dialing = 0  # Legs whose create request has not returned yet
+        self.started_at = time.perf_counter()
+        self.wave_done = asyncio.Event()
+        self.wave_task = None
+        self.greeting = None  # Shared greeting render, set by the dialer
+        self.lock = threading.Lock()
+
+    def live_legs(self):
+        return [sid for sid in self.legs if sid not in self.ended and sid != self.winner]
+
+    def snapshot(self):
+        return {
+            "ticket_id": self.ticket_id,
+            "legs": {sid: number for sid, (number, _) in self.legs.items()},
+            "ended": len(self.ended),
+            "waves": f"{self.waves_dialed}/{len(self.waves)}",
+            "winner": self.winner,
+            "answer_seconds": self.answer_seconds,
+            "elapsed_seconds": round(time.perf_counter() - self.started_at, 1),
+        }
+
+
+class EscalationEngine:
+    """Tracks escalations by ticket and by leg CallSid.
+
+    `on_answered(escalation)` is awaited on the engine's loop once a leg wins,
+    `on_unanswered(escalation)` when every leg of every wave ended without an
+    answer.
+    """
+
+    def __init__(self, on_unanswered=None, wave_delay=ESCALATION_WAVE_DELAY, on_answered=None):
+        self.on_unanswered = on_unanswered
+        self.on_answered = on_answered
+        self.wave_delay = wave_delay
+        self.by_call_sid = {}
+        self.active = {}  # ticket id -> Escalation
+        self.loop = None
+
+    async def start(self, ticket, responders, dial, hang_up, mode=ESCALATION_MODE):
+        """Dial the first wave and schedule the rest; returns the Escalation.
+
+        `dial(escalation, number)` places one leg and returns its CallSid,
+        `hang_up(call_sid)` cancels a leg that is still ringing.
+        """
+        self.loop = asyncio.get_running_loop()
+        escalation = Escalation(ticket, plan_waves(responders, mode), dial, hang_up)
+        self.active[escalation.ticket_id] = escalation
+        if escalation.waves:
+            await self.dial_wave(escalation)
+        if escalation.waves_dialed < len(escalation.waves) and not escalation.finished:
+            escalation.wave_task = asyncio.create_task(self.run_waves(escalation))
+        else:
+            self.check_unanswered(escalation)
+        return escalation
+
+    async def dial_wave(self, escalation):
+        index = escalation.waves_dialed
+        wave = escalation.waves[index]
+        escalation.waves_dialed += 1
+        escalation.wave_done.clear()
+        await asyncio.gather(*(self.dial_leg(escalation, number, index) for number in wave))
+        if not escalation.live_legs():
+            escalation.wave_done.set()
+
+    async def dial_leg(self, escalation, number, index):
+        """Place one leg and register its CallSid the moment Twilio returns it, so it can be answered"""
+        escalation.dialing += 1
+        error = "no CallSid"
+        try:
+            call_sid = await escalation.dial(escalation, number)
+        except Exception as e:
+            call_sid, error = None, e
+        finally:
+            escalation.dialing -= 1
+        if not call_sid:
+            LEG_OUTCOMES.labels("dial_failed").inc()
+            print(f"[ERROR] Could not dial responder {number} for ticket {escalation.ticket_id}: {error}")
+            return
+        escalation.legs[call_sid] = (number, index)
+        self.by_call_sid[call_sid] = escalation
+        if escalation.finished:
+            # Someone answered while this leg was being dialed and settle() already hung up the others
+            self.cancel_leg(escalation, call_sid)
+
+    async def run_waves(self, escalation):
+        while escalation.waves_dialed < len(escalation.waves):
+            try:
+                await asyncio.wait_for(escalation.wave_done.wait(), self.wave_delay)
+            except asyncio.TimeoutError:
+                pass
+            if escalation.finished:
+                return
+            await self.dial_wave(escalation)
+        self.check_unanswered(escalation)
+
+    def answered(self, call_sid):
+        """Twilio fetched TwiML for an answered leg. True: bridge it, False: hang it up, None: not a leg"""
+        escalation = self.by_call_sid.get(call_sid)
+        if escalation is None:
+            return None
+        with escalation.lock:
+            if escalation.winner is not None:
+                won = escalation.winner == call_sid
+                if not won:
+                    LEG_OUTCOMES.labels("answered_late").inc()
+                return won
+            escalation.winner = call_sid
+            escalation.answer_seconds = round(time.perf_counter() - escalation.started_at, 2)
+        ANSWER_LATENCY.labels(escalation.ticket.get("incident_type") or "unknown").observe(escalation.answer_seconds)
+        ESCALATION_OUTCOMES.labels("answered").inc()
+        LEG_OUTCOMES.labels("answered").inc()
+        self.loop.call_soon_threadsafe(self.settle, escalation)
+        return True
+
+    def settle(self, escalation):
+        """A responder answered: stop the waves and hang up every other leg"""
+        escalation.finished = True
+        escalation.wave_done.set()
+        if escalation.wave_task:
+            escalation.wave_task.cancel()
+        for call_sid in escalation.live_legs():
+            self.cancel_leg(escalation, call_sid)
+        if self.on_answered:
+            asyncio.ensure_future(self.on_answered(escalation))
+
+    def cancel_leg(self, escalation, call_sid):
+        LEG_OUTCOMES.labels("cancelled").inc()
+        asyncio.ensure_future(escalation.hang_up(call_sid))
+
+    def leg_ended(self, call_sid, status):
+        """A leg's call ended. Returns "winner", "leg" (a responder that did not win) or None (not a leg)"""
+        # Losing legs stay mapped until their own end, so a late "canceled" is still recognized
+        escalation = self.by_call_sid.pop(call_sid, None)
+        if escalation is None:
+            return None
+        if escalation.winner == call_sid:
+            self.loop.call_soon_threadsafe(self.forget, escalation)
+            return "winner"
+        self.loop.call_soon_threadsafe(self.on_leg_ended, escalation, call_sid, status)
+        return "leg"
+
+    def on_leg_ended(self, escalation, call_sid, status):
+        escalation.ended.add(call_sid)
+        if escalation.winner is None:
+            LEG_OUTCOMES.labels(status).inc()
+        if not escalation.live_legs() and not escalation.dialing:
+            escalation.wave_done.set()
+            self.check_unanswered(escalation)
+
+    def check_unanswered(self, escalation):
+        if escalation.finished or escalation.winner or escalation.live_legs() or escalation.dialing:
+            return
+        if escalation.waves_dialed < len(escalation.waves):
+            return  # run_waves dials the next wave now that wave_done is set
+        escalation.finished = True
+        ESCALATION_OUTCOMES.labels("unanswered").inc()
+        self.forget(escalation)
+        if self.on_unanswered:
+            asyncio.ensure_future(self.on_unanswered(escalation))
+
+    def forget(self, escalation):
+        escalation.finished = True
+        if self.active.get(escalation.ticket_id) is escalation:
+            del self.active[escalation.ticket_id]
+
+    def snapshot(self):
+        return [escalation.snapshot() for escalation in list(self.active.values())]
@@ -0,0 +1,313 @@
+"""Evidence image prefetch: download, dedupe, shrink and cache a ticket's images before anyone calls.
+
+As soon as a ticket is claimed, its image_urls are downloaded concurrently
+(EVIDENCE_DOWNLOAD_CONCURRENCY at a time, at most EVIDENCE_MAX_BYTES each).
+Each image is identified by the SHA-256 of its content, so the same frame
+behind several URLs (or several tickets) is processed and stored once.
+
+A worker pool turns each new image into a JPEG thumbnail of at most
+EVIDENCE_THUMBNAIL_PX on the long side. Pillow is optional; without it the
+original bytes are stored instead. The pool is threads, because Pillow
+releases the GIL while decoding, resizing and encoding.
+
+Results live in EVIDENCE_CACHE_DIR as <sha256>.<ext>, a least recently used
+store capped at EVIDENCE_CACHE_MB. When the agent sends the WhatsApp alert,
+attachments() returns whichever files are already on disk and never waits
+for downloads still in flight. URLs that failed to download are reported
+as unreachable instead of being forwarded.
+"""
+import asyncio
+import concurrent.futures
+import hashlib
+import importlib.util
+import io
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+from common.metrics import REGISTRY, EXTERNAL_REQUEST_LATENCY
+
+EVIDENCE_PREFETCH = os.environ.get("EVIDENCE_PREFETCH", "true").lower() == "true"
+EVIDENCE_CACHE_DIR = os.environ.get("EVIDENCE_CACHE_DIR", "evidence_cache")
+EVIDENCE_CACHE_MB = float(os.environ.get("EVIDENCE_CACHE_MB", 200))
+EVIDENCE_MAX_BYTES = int(os.environ.get("EVIDENCE_MAX_BYTES", 15 * 1024 * 1024))
+EVIDENCE_DOWNLOAD_CONCURRENCY = int(os.environ.get("EVIDENCE_DOWNLOAD_CONCURRENCY", 8))
+EVIDENCE_THUMBNAIL_WORKERS = int(os.environ.get("EVIDENCE_THUMBNAIL_WORKERS", 2))
+EVIDENCE_THUMBNAIL_PX = int(os.environ.get("EVIDENCE_THUMBNAIL_PX", 960))
+EVIDENCE_THUMBNAIL_QUALITY = int(os.environ.get("EVIDENCE_THUMBNAIL_QUALITY", 70))
+EVIDENCE_DOWNLOAD_TIMEOUT = 15
+EVIDENCE_RETRY_SECONDS = 300  # A URL that failed is tried again by a later ticket after this long
+EVIDENCE_URL_MEMORY = 10000
+
+EVIDENCE_FETCHES = REGISTRY.counter(
+    "evidence_fetches", "Evidence image prefetches by result (stored, duplicate, cached, failed)", ("result",)
+)
+EVIDENCE_BYTES = REGISTRY.counter("evidence_bytes", "Evidence bytes downloaded and stored", ("kind",))
+THUMBNAIL_LATENCY = REGISTRY.histogram("evidence_thumbnail_seconds", "Hashing and thumbnailing one evidence image")
+EVIDENCE_CACHE_BYTES = REGISTRY.gauge("evidence_cache_bytes", "Bytes in the on-disk evidence cache")
+
+
+_pillow = None
+
+
+class EvidenceError(Exception):
+    pass
+
+
+def pillow():
+    """(Image, ImageOps), or None when Pillow is not installed; imported on first use like the other heavy SDKs"""
+    global _pillow
+    if _pillow is None:
+        try:
+            from PIL import Image, ImageOps
+            _pillow = (Image, ImageOps)
+        except ImportError:
+            _pillow = ()
+    return _pillow or None
+
+
+class DiskLRU:
+    """Content-addressed files in `directory`, oldest-used evicted beyond `max_bytes`"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # sha256 -> (path, size), least recently used first
+        self.total = 0
+        self.lock = threading.Lock()
+        self.loaded = False
+
+    def load(self):
+        """Pick up files from a previous run, in last-used (mtime) order"""
+        with self.lock:
+            if self.loaded:
+                return
+            self.loaded = True
+            os.makedirs(self.directory, exist_ok=True)
+            files = []
+            for entry in os.scandir(self.directory):
+                digest, _, ext = entry.name.partition(".")
+                if entry.is_file() and len(digest) == 64 and not ext.endswith("tmp"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, digest, entry.path, stat.st_size))
+            for _, digest, path, size in sorted(files):
+                if digest in self.entries:
+                    continue
+                self.entries[digest] = (path, size)
+                self.total += size
+        self.evict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, digest):
+        return digest in self.entries
+
+    def get(self, digest):
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                return None
+            self.entries.move_to_end(digest)
+        try:
+            os.utime(entry[0])  # Keeps the LRU order across restarts
+        except OSError:
+            with self.lock:
+                self.remove(digest)  # Deleted behind our back, or evicted meanwhile
+            return None
+        return entry[0]
+
+    def put(self, digest, data, ext):
+        path = os.path.join(self.directory, f"{digest}{ext}")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self.lock:
+            if digest in self.entries:
+                self.total -= self.entries[digest][1]
+            self.entries[digest] = (path, len(data))
+            self.total += len(data)
+        self.evict()
+        return path
+
+    def evict(self):
+        with self.lock:
+            while self.total > self.max_bytes and len(self.entries) > 1:
+                path = self.remove(next(iter(self.entries)))
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def remove(self, digest):
+        """Forget an entry (caller holds the lock); returns its path, or None if it was already gone"""
+        entry = self.entries.pop(digest, None)
+        if entry is None:
+            return None
+        self.total -= entry[1]
+        return entry[0]
+
+
+def download(url, max_bytes=EVIDENCE_MAX_BYTES):
+    """(bytes, content type) for an image URL; raises EvidenceError"""
+    try:
+        with EXTERNAL_REQUEST_LATENCY.labels("evidence", "download").time():
+            with requests.get(url, stream=True, timeout=EVIDENCE_DOWNLOAD_TIMEOUT) as response:
+                if response.status_code != 200:
+                    raise EvidenceError(f"HTTP {response.status_code}")
+                content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                if content_type and not content_type.startswith("image/"):
+                    raise EvidenceError(f"not an image ({content_type})")
+                chunks, size = [], 0
+                for chunk in response.iter_content(64 * 1024):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise EvidenceError(f"larger than {max_bytes} bytes")
+                    chunks.append(chunk)
+    except requests.RequestException as e:
+        raise EvidenceError(str(e)) from e
+    return b"".join(chunks), content_type
+
+
+def thumbnail(data, max_px=EVIDENCE_THUMBNAIL_PX, quality=EVIDENCE_THUMBNAIL_QUALITY):
+    """JPEG bytes no larger than max_px on either side"""
+    Image, ImageOps = pillow()
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)  # Phone and camera frames often rely on the EXIF rotation
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((max_px, max_px))
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=quality, optimize=True)
+        return out.getvalue()
+
+
+class EvidencePrefetcher:
+    """Per-URL prefetch state in front of a DiskLRU of thumbnails.
+
+    prefetch() runs on the ingestion loop; attachments() is called from the
+    call's media loop, so per-URL results are plain dict entries guarded by
+    a lock rather than asyncio futures.
+    """
+
+    def __init__(self, directory=EVIDENCE_CACHE_DIR, max_mb=EVIDENCE_CACHE_MB):
+        self.store = DiskLRU(directory, int(max_mb * 1024 * 1024))
+        self.urls = OrderedDict()  # url -> (sha256 or None if it failed, when)
+        self.in_flight = set()
+        self.tasks = set()  # The loop only keeps weak references to tasks
+        self.storing = set()  # Digests a worker is thumbnailing right now
+        self.lock = threading.Lock()
+        self.pool = concurrent.futures.ThreadPoolExecutor(EVIDENCE_THUMBNAIL_WORKERS, "evidence")
+        self.semaphore = None
+        self.loaded = None
+        self.loop = None
+        EVIDENCE_CACHE_BYTES.set_function(lambda: self.store.total)
+
+    def prefetch(self, urls):
+        """Start downloading any of `urls` not cached or in flight; returns the tasks started"""
+        if not EVIDENCE_PREFETCH or not urls:
+            return []
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.semaphore = asyncio.Semaphore(EVIDENCE_DOWNLOAD_CONCURRENCY)
+            # Scan the cache directory once, before anything is stored
+            self.loaded = loop.run_in_executor(self.pool, self.store.load)
+        tasks = []
+        now = time.time()
+        with self.lock:
+            for url in dict.fromkeys(urls):
+                digest, fetched_at = self.urls.get(url, (None, None))
+                if url in self.in_flight:
+                    continue
+                if digest in self.store:
+                    EVIDENCE_FETCHES.labels("cached").inc()
+                    continue
+                if fetched_at and not digest and now - fetched_at < EVIDENCE_RETRY_SECONDS:
+                    continue  # Failed recently
+                self.in_flight.add(url)
+                task = asyncio.create_task(self.fetch(url))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+                tasks.append(task)
+        return tasks
+
+    async def fetch(self, url):
+        digest = None
+        try:
+            await self.loaded
+            async with self.semaphore:
+                data, content_type = await asyncio.to_thread(download, url)
+            EVIDENCE_BYTES.labels("downloaded").inc(len(data))
+            digest, outcome = await asyncio.get_running_loop().run_in_executor(self.pool, self.store_image, data, content_type)
+            EVIDENCE_FETCHES.labels(outcome).inc()
+        except Exception as e:
+            EVIDENCE_FETCHES.labels("failed").inc()
+            print(f"[ERROR] Could not prefetch evidence {url}: {e}")
+        finally:
+            with self.lock:
+                self.in_flight.discard(url)
+                self.urls[url] = (digest, time.time())
+                self.urls.move_to_end(url)
+                while len(self.urls) > EVIDENCE_URL_MEMORY:
+                    self.urls.popitem(last=False)
+        return digest
+
+    def store_image(self, data, content_type):
+        """Worker pool: hash, and unless already stored, thumbnail and store. Returns (sha256, outcome)"""
+        with THUMBNAIL_LATENCY.time():
+            digest = hashlib.sha256(data).hexdigest()
+            with self.lock:
+                # Another camera's copy of the same frame may be in the other worker right now
+                if digest in self.store or digest in self.storing:
+                    return digest, "duplicate"
+                self.storing.add(digest)
+            try:
+                if pillow():
+                    data, ext = thumbnail(data), ".jpg"
+                else:
+                    ext = mimetypes.guess_extension(content_type or "") or ".jpg"
+                self.store.put(digest, data, ext)
+            finally:
+                with self.lock:
+                    self.storing.discard(digest)
+            EVIDENCE_BYTES.labels("stored").inc(len(data))
+            return digest, "stored"
+
+    def attachments(self, urls):
+        """({url: local file} for images ready now, [urls that could not be fetched]); never waits"""
+        ready, unreachable = {}, []
+        with self.lock:
+            known = {url: self.urls.get(url) for url in urls if url not in self.in_flight}
+        for url, entry in known.items():
+            if entry is None:
+                continue
+            path = self.store.get(entry[0]) if entry[0] else None
+            if path:
+                ready[url] = path
+            elif entry[0] is None:
+                unreachable.append(url)
+        return ready, unreachable
+
+    def snapshot(self):
+        with self.lock:
+            failed = sum(1 for digest, _ in self.urls.values() if digest is None)
+            urls = len(self.urls)
+            in_flight = len(self.in_flight)
+        return {
+            "enabled": EVIDENCE_PREFETCH,
+            "thumbnails": importlib.util.find_spec("PIL") is not None,
+            "files": len(self.store),
+            "bytes": self.store.total,
+            "urls": urls,
+            "failed": failed,
+            "in_flight": in_flight,
+        }
+
+
+EVIDENCE = EvidencePrefetcher()
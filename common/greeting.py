@@ -0,0 +1,136 @@
+import asyncio
+import base64
+import json
+import os
+import threading
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from common.metrics import REGISTRY, EXTERNAL_REQUEST_LATENCY
+
+DEEPGRAM_API_KEY = os.environ.get("DEEPGRAM_API_KEY")
+GREETING_PRERENDER = os.environ.get("GREETING_PRERENDER", "true").lower() == "true"
+GREETING_TTS_MODEL = "aura-2-andromeda-en"  # Same voice as the agent's speak provider
+DEEPGRAM_SPEAK_URL = os.environ.get("DEEPGRAM_SPEAK_URL", "https://api.deepgram.com/v1/speak")
+GREETING_TTS_URL = f"{DEEPGRAM_SPEAK_URL}?model={GREETING_TTS_MODEL}&encoding=mulaw&sample_rate=8000&container=none"
+GREETING_CACHE_SIZE = 256
+GREETING_WAIT = float(os.environ.get("GREETING_WAIT", 0.25))  # Max wait at media start for a late render
+TWILIO_FRAME_BYTES = 160  # 20 ms of 8 kHz mu-law
+
+GREETING_INTRO = "Hello, this is Zain from Safe City Authority Emergency Response."
+GREETING_INCIDENT_QUESTION = "May I have your name, agency, and WhatsApp number to send evidence images?"
+GREETING_DEFAULT_QUESTION = "May I have your name?"
+
+GREETING_CACHE = REGISTRY.counter("greeting_segment_cache", "Greeting TTS segment cache lookups", ("result",))
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="greeting")
+_segment_cache = OrderedDict()
+_segment_lock = threading.Lock()
+_pending = {}
+
+
+def greeting_segments(ticket_data):
+    """Greeting split into fixed (cacheable) and incident-specific segments"""
+    if not ticket_data:
+        return [GREETING_INTRO, GREETING_DEFAULT_QUESTION]
+
+    incident_type = ticket_data.get('incident_type') or 'security incident'
+    address = ticket_data.get('address') or 'unknown location'
+    confidence = int((ticket_data.get('confidence_score') or 0.8) * 100)
+    return [
+        GREETING_INTRO,
+        f"We have detected a {incident_type} at {address} with {confidence}% confidence.",
+        GREETING_INCIDENT_QUESTION,
+    ]
+
+
+def greeting_text(ticket_data):
+    return " ".join(greeting_segments(ticket_data))
+
+
+def synthesize(text):
+    """Render text with Deepgram TTS as raw 8 kHz mu-law (Twilio's native format)"""
+    request = urllib.request.Request(
+        GREETING_TTS_URL,
+        data=json.dumps({"text": text}).encode("utf-8"),
+        headers={"Authorization": f"Token {DEEPGRAM_API_KEY}", "Content-Type": "application/json"},
+        method="POST",
+    )
+    with EXTERNAL_REQUEST_LATENCY.labels("deepgram", "speak").time():
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.read()
+
+
+def render_segment(text):
+    with _segment_lock:
+        audio = _segment_cache.get(text)
+        if audio is not None:
+            _segment_cache.move_to_end(text)
+    if audio is not None:
+        GREETING_CACHE.labels("hit").inc()
+        return audio
+
+    GREETING_CACHE.labels("miss").inc()
+    audio = synthesize(text)
+    with _segment_lock:
+        _segment_cache[text] = audio
+        while len(_segment_cache) > GREETING_CACHE_SIZE:
+            _segment_cache.popitem(last=False)
+    return audio
+
+
+def render_greeting(ticket_data):
+    """Greeting text and its mu-law audio, pre-split into base64 Twilio frames"""
+    audio = b"".join(render_segment(segment) for segment in greeting_segments(ticket_data))
+    frames = [
+        base64.b64encode(audio[i:i + TWILIO_FRAME_BYTES]).decode("ascii")
+        for i in range(0, len(audio), TWILIO_FRAME_BYTES)
+    ]
+    return {"text": greeting_text(ticket_data), "frames": frames}
+
+
+def warm_greeting_cache():
+    """Render the fixed segments in the background so the first call hits the cache"""
+    if not GREETING_PRERENDER or not DEEPGRAM_API_KEY:
+        return
+    for segment in (GREETING_INTRO, GREETING_INCIDENT_QUESTION, GREETING_DEFAULT_QUESTION):
+        _executor.submit(render_segment, segment)
+
+
+def prerender_greeting(call_sid, ticket_data, future=None):
+    """Start rendering a call's greeting while the phone is ringing.
+
+    Legs ringing for the same incident pass the first leg's returned future,
+    so the greeting is rendered once however many responders are dialed.
+    """
+    if not GREETING_PRERENDER or not DEEPGRAM_API_KEY:
+        return None
+    _pending[call_sid] = future or _executor.submit(render_greeting, ticket_data)
+    return _pending[call_sid]
+
+
+async def wait_for_prerendered_greeting(call_sid, timeout):
+    """The call's rendered greeting, waiting at most `timeout` seconds for it.
+
+    Returns None when there is nothing usable so the caller can fall back to
+    having the agent speak the greeting itself.
+    """
+    future = _pending.pop(call_sid, None)
+    if future is None:
+        return None
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+    except asyncio.TimeoutError:
+        print(f"[DEBUG] Greeting for call {call_sid} not rendered within {timeout}s")
+        return None
+    except Exception as e:
+        print(f"[ERROR] Greeting pre-render failed for call {call_sid}: {e}")
+        return None
+
+
+def discard_prerendered_greeting(call_sid, cancel=True):
+    # cancel=False for a leg whose render is shared with other legs still ringing
+    future = _pending.pop(call_sid, None)
+    if future is not None and cancel:
+        future.cancel()
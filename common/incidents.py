@@ -0,0 +1,234 @@
+"""Correlate tickets from several cameras into one incident.
+
+Tickets of the same incident type whose addresses are similar and that
+arrive within INCIDENT_WINDOW_SECONDS of the incident's latest ticket are
+grouped. Only the first ticket of an incident is dialed; the rest are
+linked to it (their evidence images are added to the primary ticket) and
+held open until a responder answers for the primary, then closed in
+batches.
+
+Addresses are compared as normalized token sets (Jaccard), falling back to
+character trigrams (Dice) so small spelling differences between camera
+feeds still match. An inverted index from token to incident keeps a lookup
+to the few incidents that share a token with the new address.
+
+If nobody could be reached for an incident's primary ticket, reopen()
+forgets the incident and hands back its linked tickets, which are still
+open, so they go through the pipeline again and one of them is dialed.
+"""
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+
+from common.metrics import REGISTRY
+
+INCIDENT_DEDUP = os.environ.get("INCIDENT_DEDUP", "true").lower() == "true"
+INCIDENT_WINDOW_SECONDS = float(os.environ.get("INCIDENT_WINDOW_SECONDS", 900))
+INCIDENT_SIMILARITY = float(os.environ.get("INCIDENT_SIMILARITY", 0.6))
+INCIDENT_CLOSE_BATCH_DELAY = float(os.environ.get("INCIDENT_CLOSE_BATCH_DELAY", 2))
+INCIDENT_MAX_IMAGES = 10
+
+TOKEN_REGEX = re.compile(r"[a-z0-9]+")
+ADDRESS_ABBREVIATIONS = {
+    "st": "street", "rd": "road", "ave": "avenue", "av": "avenue", "blvd": "boulevard",
+    "hwy": "highway", "ln": "lane", "dr": "drive", "sq": "square", "mkt": "market",
+    "no": "number", "nr": "near", "opp": "opposite", "blk": "block", "sec": "sector", "ph": "phase",
+}
+ADDRESS_STOPWORDS = {"the", "at", "of", "near", "opposite", "number", "and", "in", "on", "area", "unknown", "location"}
+
+DUPLICATE_TICKETS = REGISTRY.counter("incident_duplicate_tickets", "Tickets linked to an existing incident instead of dialed")
+OPEN_INCIDENTS = REGISTRY.gauge("incidents_open", "Incidents in the correlation window")
+
+
+def address_tokens(address):
+    """Normalized, de-duplicated address tokens: lower case, abbreviations expanded, filler words dropped"""
+    tokens = []
+    for token in TOKEN_REGEX.findall((address or "").lower()):
+        token = ADDRESS_ABBREVIATIONS.get(token, token)
+        if token not in ADDRESS_STOPWORDS and token not in tokens:
+            tokens.append(token)
+    return frozenset(tokens)
+
+
+def trigrams(tokens):
+    text = f" {' '.join(sorted(tokens))} "
+    return frozenset(text[i:i + 3] for i in range(len(text) - 2))
+
+
+def address_similarity(tokens_a, tokens_b, trigrams_a=None, trigrams_b=None):
+    """0..1: token Jaccard, or trigram Dice when that is higher (spelling variants)"""
+    if not tokens_a or not tokens_b:
+        return 0.0
+    numbers_a = {token for token in tokens_a if token.isdigit()}
+    numbers_b = {token for token in tokens_b if token.isdigit()}
+    if numbers_a and numbers_b and not numbers_a & numbers_b:
+        return 0.0  # Different house/plot/street numbers are different places however alike the rest is
+    jaccard = len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+    trigrams_a = trigrams_a or trigrams(tokens_a)
+    trigrams_b = trigrams_b or trigrams(tokens_b)
+    dice = 2 * len(trigrams_a & trigrams_b) / (len(trigrams_a) + len(trigrams_b))
+    return max(jaccard, dice)
+
+
+class Incident:
+    __slots__ = (
+        "primary", "incident_type", "tokens", "trigrams", "first_seen", "last_seen", "ticket_ids", "answered",
+    )
+
+    def __init__(self, primary, incident_type, tokens, now):
+        self.primary = primary
+        self.incident_type = incident_type
+        self.tokens = tokens
+        self.trigrams = trigrams(tokens)
+        self.first_seen = now
+        self.last_seen = now
+        self.ticket_ids = [primary["ticket_id"]]
+        self.answered = False  # A responder took the primary's call; siblings can be closed
+
+    @property
+    def siblings(self):
+        return self.ticket_ids[1:]
+
+    def snapshot(self):
+        return {
+            "primary_ticket": self.primary["ticket_id"],
+            "incident_type": self.incident_type,
+            "address": self.primary.get("address"),
+            "tickets": list(self.ticket_ids),
+            "answered": self.answered,
+            "age_seconds": round(time.time() - self.first_seen),
+        }
+
+
+class IncidentIndex:
+    """Open incidents indexed by (incident type, address token), expiring after `window` seconds idle"""
+
+    def __init__(self, window=INCIDENT_WINDOW_SECONDS, threshold=INCIDENT_SIMILARITY):
+        self.window = window
+        self.threshold = threshold
+        self.by_token = {}  # (incident type, token) -> set of Incidents
+        self.by_ticket = {}  # id of every linked ticket, primary included -> Incident
+        self.incidents = OrderedDict()  # Incident -> None, least recently seen first, for expiry
+
+    def __len__(self):
+        return len(self.incidents)
+
+    def correlate(self, ticket, now=None):
+        """(incident, is_new): the incident this ticket belongs to, creating one if nothing matches"""
+        now = now or time.time()
+        self.expire(now)
+        incident_type = (ticket.get("incident_type") or "").strip().lower()
+        tokens = address_tokens(ticket.get("address"))
+
+        match = self.find(incident_type, tokens) if incident_type and tokens else None
+        if match is not None:
+            match.last_seen = now
+            self.incidents.move_to_end(match)
+            match.ticket_ids.append(ticket["ticket_id"])
+            self.by_ticket[ticket["ticket_id"]] = match
+            merge_evidence(match.primary, ticket)
+            return match, False
+
+        incident = Incident(ticket, incident_type, tokens, now)
+        if incident_type and tokens:
+            self.incidents[incident] = None
+            self.by_ticket[ticket["ticket_id"]] = incident
+            for token in tokens:
+                self.by_token.setdefault((incident_type, token), set()).add(incident)
+        return incident, True
+
+    def find(self, incident_type, tokens):
+        candidates = set()
+        for token in tokens:
+            candidates.update(self.by_token.get((incident_type, token), ()))
+        if not candidates:
+            # No shared token; a misspelled address can still match on trigrams
+            candidates = {incident for incident in self.incidents if incident.incident_type == incident_type}
+        best, best_score = None, self.threshold
+        query_trigrams = trigrams(tokens)
+        for incident in candidates:
+            score = address_similarity(tokens, incident.tokens, query_trigrams, incident.trigrams)
+            if score >= best_score:
+                best, best_score = incident, score
+        return best
+
+    def expire(self, now):
+        while self.incidents:
+            incident = next(iter(self.incidents))
+            if now - incident.last_seen <= self.window:
+                break
+            self.remove(incident)
+
+    def linked(self, ticket_id):
+        """True for a ticket already part of an open incident (e.g. re-fetched while held open)"""
+        return ticket_id in self.by_ticket
+
+    def primary_incident(self, ticket_id):
+        incident = self.by_ticket.get(ticket_id)
+        if incident is None or incident.primary["ticket_id"] != ticket_id:
+            return None
+        return incident
+
+    def answered(self, ticket_id):
+        """A responder took the incident led by `ticket_id`; returns it so its siblings can be closed"""
+        incident = self.primary_incident(ticket_id)
+        if incident is not None:
+            incident.answered = True
+        return incident
+
+    def reopen(self, ticket_id):
+        """Forget the incident led by `ticket_id` (its call failed); returns it so its siblings can be retried"""
+        incident = self.primary_incident(ticket_id)
+        if incident is not None:
+            self.remove(incident)
+        return incident
+
+    def remove(self, incident):
+        self.incidents.pop(incident, None)
+        for ticket_id in incident.ticket_ids:
+            if self.by_ticket.get(ticket_id) is incident:
+                del self.by_ticket[ticket_id]
+        for token in incident.tokens:
+            key = (incident.incident_type, token)
+            siblings = self.by_token.get(key)
+            if siblings is not None:
+                siblings.discard(incident)
+                if not siblings:
+                    del self.by_token[key]
+
+    def snapshot(self):
+        return [incident.snapshot() for incident in list(self.incidents) if len(incident.ticket_ids) > 1]
+
+
+def merge_evidence(primary, sibling, limit=INCIDENT_MAX_IMAGES):
+    """Add a sibling camera's images to the primary ticket, which the call in progress reads from"""
+    images = primary.setdefault("image_urls", [])
+    for url in sibling.get("image_urls") or ():
+        if url not in images and len(images) < limit:
+            images.append(url)
+
+
+class BatchCloser:
+    """Collects sibling ticket ids and closes them together `delay` seconds after the first arrives"""
+
+    def __init__(self, close, delay=INCIDENT_CLOSE_BATCH_DELAY):
+        self.close = close  # async close(ticket_ids)
+        self.delay = delay
+        self.pending = []
+        self.flush_task = None
+
+    def add(self, ticket_id):
+        self.pending.append(ticket_id)
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(self.delay)
+        await self.flush()
+
+    async def flush(self):
+        batch, self.pending = self.pending, []
+        if batch:
+            await self.close(batch)
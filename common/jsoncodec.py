@@ -0,0 +1,32 @@
+import json
+import os
+
+# "auto" uses orjson when it is installed, "json" forces the standard library
+JSON_CODEC = os.environ.get("JSON_CODEC", "auto")
+
+JSONDecodeError = json.JSONDecodeError  # orjson.JSONDecodeError subclasses it
+
+try:
+    if JSON_CODEC == "json":
+        raise ImportError
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    CODEC_NAME = "orjson"
+
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumps(obj):
+        # WebSocket text frames need str; orjson returns UTF-8 bytes
+        return orjson.dumps(obj).decode("utf-8")
+else:
+    CODEC_NAME = "json"
+
+    def loads(data):
+        return json.loads(data)
+
+    def dumps(obj):
+        return json.dumps(obj, separators=(",", ":"))
@@ -1,7 +1,10 @@
 import logging
 import json
 from datetime import datetime
-from flask_socketio import SocketIO
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # flask_socketio is heavy to import and only needed by callers that pass one in
+    from flask_socketio import SocketIO
 
 
 class CustomFormatter(
@@ -9,7 +12,7 @@ class CustomFormatter(
 ):
     """Custom formatter to color-code log messages based on their content."""
 
-    def __init__(self, socketio: SocketIO = None):
+    def __init__(self, socketio: "SocketIO" = None):
         self.socketio = socketio
 
     # ANSI escape codes for colors - using accessible palette
@@ -0,0 +1,130 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+from common.metrics import REGISTRY
+
+LOOP_LAG_INTERVAL = float(os.environ.get("LOOP_LAG_INTERVAL", 0.1))
+SLOW_CALLBACK_THRESHOLD = float(os.environ.get("SLOW_CALLBACK_THRESHOLD", 0.05))
+STACK_SAMPLE_INTERVAL = 0.01
+STACK_DEPTH = 12
+
+LOOP_LAG = REGISTRY.histogram(
+    "event_loop_lag_seconds", "Heartbeat scheduling delay per event loop", ("loop",),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+SLOW_CALLBACKS = REGISTRY.counter("slow_callbacks", "Loop blocked longer than the slow-callback threshold", ("loop",))
+
+# Most recent slow callbacks across all loops, for /status
+SLOW_CALLBACK_LOG = deque(maxlen=50)
+
+CALL_TASK_PREFIX = "call:"
+
+
+def call_task_name(call_sid):
+    """Task name that lets the monitor attribute a blocked loop to a call"""
+    return f"{CALL_TASK_PREFIX}{call_sid}"
+
+
+class LoopMonitor:
+    """Heartbeat + watchdog for one asyncio loop.
+
+    A heartbeat task sleeps `interval` seconds and records how late it woke
+    up. A watchdog thread notices when the heartbeat is overdue by more than
+    `threshold`, samples the loop thread's stack while it stays blocked, and
+    reports the dominant stack and the CallSid of the running task once the
+    loop recovers.
+    """
+
+    def __init__(self, name, logger, interval=LOOP_LAG_INTERVAL, threshold=SLOW_CALLBACK_THRESHOLD):
+        self.name = name
+        self.logger = logger
+        self.interval = interval
+        self.threshold = threshold
+        self.loop = None
+        self.thread_id = None
+        self.last_beat = time.perf_counter()
+        self.samples = []
+        self.call_sid = None
+        self.blocked_since = None
+        self.lag = LOOP_LAG.labels(name)
+        self.slow = SLOW_CALLBACKS.labels(name)
+
+    def start(self):
+        """Start monitoring the running loop (call from inside it)"""
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.last_beat = time.perf_counter()
+        self.heartbeat_task = self.loop.create_task(self.heartbeat(), name=f"loop-monitor:{self.name}")
+        threading.Thread(target=self.watchdog, name=f"loop-watchdog-{self.name}", daemon=True).start()
+        return self
+
+    async def heartbeat(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self.lag.observe(max(now - expected, 0.0))
+            self.last_beat = now
+
+    def watchdog(self):
+        while True:
+            time.sleep(STACK_SAMPLE_INTERVAL)
+            overdue = time.perf_counter() - self.last_beat - self.interval
+            if overdue > self.threshold:
+                if self.blocked_since is None:
+                    self.blocked_since = self.last_beat + self.interval
+                    self.samples = []
+                    self.call_sid = None
+                self.sample()
+            elif self.blocked_since is not None:
+                self.report()
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        stack = tuple(
+            f"{os.path.basename(entry.filename)}:{entry.lineno} {entry.name}"
+            for entry in traceback.extract_stack(frame, limit=STACK_DEPTH)
+        )
+        self.samples.append(stack)
+        if self.call_sid is None:
+            self.call_sid = self.find_call_sid(frame)
+
+    def find_call_sid(self, frame):
+        task = asyncio.current_task(self.loop)
+        if task is not None and task.get_name().startswith(CALL_TASK_PREFIX):
+            return task.get_name()[len(CALL_TASK_PREFIX):]
+        # Fall back to any voice agent / handler on the stack
+        while frame is not None:
+            owner = frame.f_locals.get("self")
+            call_sid = getattr(owner, "call_sid", None) or getattr(getattr(owner, "voice_agent", None), "call_sid", None)
+            if call_sid:
+                return call_sid
+            frame = frame.f_back
+        return None
+
+    def report(self):
+        duration = self.last_beat - self.blocked_since
+        self.blocked_since = None
+        self.slow.inc()
+        stack, hits = Counter(self.samples).most_common(1)[0] if self.samples else ((), 0)
+        event = {
+            "loop": self.name,
+            "call_sid": self.call_sid,
+            "blocked_ms": round(duration * 1000, 1),
+            "stack": list(stack),
+            "stack_share": round(hits / len(self.samples), 2) if self.samples else None,
+            "timestamp": time.time(),
+        }
+        SLOW_CALLBACK_LOG.append(event)
+        where = stack[-1] if stack else "unknown"
+        self.logger.warning(
+            f"Event loop '{self.name}' stalled for {event['blocked_ms']}ms (call {self.call_sid}) at {where}\n"
+            + "\n".join(f"    {line}" for line in stack)
+        )
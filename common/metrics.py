@@ -0,0 +1,210 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds (seconds) shared by every latency histogram
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_PREFIX = "city_monitor_"
+
+
+class Counter:
+    """Monotonic counter, safe to increment from any thread"""
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        return [(name + "_total", labels, self.value)]
+
+
+class Gauge:
+    """Value that can go up and down, or be read from a callback at scrape time"""
+
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self.lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        self.function = function
+
+    def samples(self, name, labels):
+        value = self.function() if self.function else self.value
+        return [(name, labels, value)]
+
+
+class Histogram:
+    """Fixed-bucket histogram, safe to observe from any thread"""
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def snapshot(self):
+        """Cumulative bucket counts keyed by upper bound, Prometheus style"""
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+            count = self.count
+        cumulative = {}
+        running = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            running += bucket_count
+            cumulative[str(bound)] = running
+        cumulative["+Inf"] = count
+        return {"count": count, "sum": round(total, 6), "buckets": cumulative}
+
+    def samples(self, name, labels):
+        snapshot = self.snapshot()
+        samples = [
+            (name + "_bucket", labels + (("le", bound),), value)
+            for bound, value in snapshot["buckets"].items()
+        ]
+        samples.append((name + "_sum", labels, snapshot["sum"]))
+        samples.append((name + "_count", labels, snapshot["count"]))
+        return samples
+
+
+class MetricFamily:
+    """A named metric with zero or more label dimensions.
+
+    Unlabelled families proxy inc/set/observe/time straight to their only
+    series, so `REGISTRY.counter(...).inc()` works without `.labels()`.
+    """
+
+    def __init__(self, name, documentation, kind, labelnames, factory):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, *values):
+        key = tuple(str(value) for value in values)
+        child = self.children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self.lock:
+                child = self.children.setdefault(key, self.factory())
+        return child
+
+    def remove(self, *values):
+        with self.lock:
+            self.children.pop(tuple(str(value) for value in values), None)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self.children.items()):
+            labels = tuple(zip(self.labelnames, key))
+            for sample_name, sample_labels, value in child.samples(self.name, labels):
+                if sample_labels:
+                    rendered = ",".join(f'{label}="{_escape(label_value)}"' for label, label_value in sample_labels)
+                    lines.append(f"{sample_name}{{{rendered}}} {_format_value(value)}")
+                else:
+                    lines.append(f"{sample_name} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Registry:
+    """In-process metric registry rendered in the Prometheus text format"""
+
+    def __init__(self, prefix=METRIC_PREFIX):
+        self.prefix = prefix
+        self.families = {}
+        self.lock = threading.Lock()
+
+    def _family(self, name, documentation, kind, labelnames, factory):
+        name = self.prefix + name
+        with self.lock:
+            family = self.families.get(name)
+            if family is None:
+                family = MetricFamily(name, documentation, kind, labelnames, factory)
+                if not family.labelnames:
+                    family.labels()
+                self.families[name] = family
+        return family
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._family(name, documentation, "counter", labelnames, Counter)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._family(name, documentation, "gauge", labelnames, Gauge)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._family(name, documentation, "histogram", labelnames, lambda: Histogram(buckets))
+
+    def render(self):
+        with self.lock:
+            families = list(self.families.values())
+        return "\n".join(family.render() for family in families) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+REGISTRY = Registry()
+
+# Shared across modules: Freshdesk, Groq and Twilio REST round trips
+EXTERNAL_REQUEST_LATENCY = REGISTRY.histogram(
+    "external_request_seconds", "Latency of outbound REST/LLM requests", ("service", "operation")
+)
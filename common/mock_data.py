@@ -0,0 +1,224 @@
+"""Seeded, streaming generator for the business_logic mock dataset.
+
+Records are produced lazily, one table at a time, so millions of rows can
+be written to NDJSON or SQLite in bounded memory:
+
+    python -m common.mock_data --customers 1000000 --appointments 200000 --orders 200000 --ndjson mock_data_outputs
+    python -m common.mock_data --customers 1000000 --sqlite business_data.db
+
+The same seed and reference time always produce the same rows.
+"""
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+MOCK_DATA_SEED = 42
+CHUNK_SIZE = 10000
+SERVICES = ["Consultation", "Follow-up", "Review", "Planning"]
+APPOINTMENT_STATUSES = ["Scheduled", "Completed", "Cancelled"]
+ORDER_STATUSES = ["Pending", "Shipped", "Delivered", "Cancelled"]
+SAMPLE_CUSTOMERS = 3
+TABLES = ("customers", "appointments", "orders")
+
+
+def _customer_id(index):
+    return f"CUST{index:04d}"
+
+
+def _customer_name(index):
+    return f"Customer {index}"
+
+
+def _rng(seed, table):
+    # One stream per table, so tables can be generated in any order (or alone)
+    return random.Random(f"{seed}:{table}")
+
+
+def iter_customers(size, seed=MOCK_DATA_SEED, now=None):
+    now = now or datetime.now()
+    rng = _rng(seed, "customers")
+    for i in range(size):
+        yield {
+            "id": _customer_id(i),
+            "name": _customer_name(i),
+            "phone": f"+1555{i:07d}",
+            "email": f"customer{i}@example.com",
+            "joined_date": (now - timedelta(days=rng.randint(0, 7))).isoformat(),
+        }
+
+
+def iter_appointments(size, customers, seed=MOCK_DATA_SEED, now=None):
+    """Appointments for random customers; only the customer count is needed, not the records"""
+    now = now or datetime.now()
+    rng = _rng(seed, "appointments")
+    for i in range(size):
+        customer = rng.randrange(customers)
+        yield {
+            "id": f"APT{i:04d}",
+            "customer_id": _customer_id(customer),
+            "customer_name": _customer_name(customer),
+            "date": (now + timedelta(days=rng.randint(0, 7))).isoformat(),
+            "service": rng.choice(SERVICES),
+            "status": rng.choice(APPOINTMENT_STATUSES),
+        }
+
+
+def iter_orders(size, customers, seed=MOCK_DATA_SEED, now=None):
+    now = now or datetime.now()
+    rng = _rng(seed, "orders")
+    for i in range(size):
+        customer = rng.randrange(customers)
+        yield {
+            "id": f"ORD{i:04d}",
+            "customer_id": _customer_id(customer),
+            "customer_name": _customer_name(customer),
+            "date": (now - timedelta(days=rng.randint(0, 7))).isoformat(),
+            "items": rng.randint(1, 5),
+            "total": round(rng.uniform(10.0, 500.0), 2),
+            "status": rng.choice(ORDER_STATUSES),
+        }
+
+
+def stream_mock_data(sizes, seed=MOCK_DATA_SEED, now=None):
+    """{"customers": iterator, "appointments": iterator, "orders": iterator} for the given sizes"""
+    now = now or datetime.now()
+    customers = sizes["customers"]
+    return {
+        "customers": iter_customers(customers, seed, now),
+        "appointments": iter_appointments(sizes["appointments"], customers, seed, now),
+        "orders": iter_orders(sizes["orders"], customers, seed, now),
+    }
+
+
+class SampleCollector:
+    """Builds the display sample while records stream past (one pass, bounded memory)"""
+
+    def __init__(self, customers, seed=MOCK_DATA_SEED, per_customer=2):
+        picked = _rng(seed, "sample").sample(range(customers), min(SAMPLE_CUSTOMERS, customers))
+        self.per_customer = per_customer
+        self.samples = {
+            _customer_id(index): {
+                "Customer": _customer_name(index),
+                "ID": _customer_id(index),
+                "Phone": None,
+                "Email": None,
+                "Appointments": [],
+                "Orders": [],
+            }
+            for index in picked
+        }
+
+    def observe(self, table, record):
+        if table == "customers":
+            sample = self.samples.get(record["id"])
+            if sample:
+                sample["Phone"] = record["phone"]
+                sample["Email"] = record["email"]
+            return
+        sample = self.samples.get(record["customer_id"])
+        if sample is None:
+            return
+        if table == "appointments" and len(sample["Appointments"]) < self.per_customer:
+            sample["Appointments"].append(
+                {"Service": record["service"], "Date": record["date"][:10], "Status": record["status"]}
+            )
+        elif table == "orders" and len(sample["Orders"]) < self.per_customer:
+            sample["Orders"].append({
+                "ID": record["id"],
+                "Total": f"${record['total']}",
+                "Status": record["status"],
+                "Date": record["date"][:10],
+                "# Items": record["items"],
+            })
+
+    def sample_data(self):
+        return list(self.samples.values())
+
+    def tap(self, table, records):
+        for record in records:
+            self.observe(table, record)
+            yield record
+
+
+def generate_mock_data(sizes, seed=MOCK_DATA_SEED, now=None):
+    """The whole dataset as in-memory lists, plus sample_data, for InMemoryRepository"""
+    collector = SampleCollector(sizes["customers"], seed)
+    data = {
+        table: list(collector.tap(table, records))
+        for table, records in stream_mock_data(sizes, seed, now).items()
+    }
+    data["sample_data"] = collector.sample_data()
+    return data
+
+
+def write_ndjson(directory, sizes, seed=MOCK_DATA_SEED, now=None, chunk_size=CHUNK_SIZE):
+    """Write <table>.ndjson files plus sample_data.json; returns the paths written"""
+    os.makedirs(directory, exist_ok=True)
+    collector = SampleCollector(sizes["customers"], seed)
+    paths = []
+    for table, records in stream_mock_data(sizes, seed, now).items():
+        path = os.path.join(directory, f"{table}.ndjson")
+        with open(path, "w") as f:
+            chunk = []
+            for record in collector.tap(table, records):
+                chunk.append(json.dumps(record, separators=(",", ":")))
+                if len(chunk) >= chunk_size:
+                    f.write("\n".join(chunk) + "\n")
+                    chunk = []
+            if chunk:
+                f.write("\n".join(chunk) + "\n")
+        paths.append(path)
+    sample_path = os.path.join(directory, "sample_data.json")
+    with open(sample_path, "w") as f:
+        json.dump(collector.sample_data(), f, indent=2)
+    paths.append(sample_path)
+    return paths
+
+
+def read_ndjson(directory):
+    """Stream a dataset written by write_ndjson back as {"table": iterator}"""
+    def records(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    return {table: records(os.path.join(directory, f"{table}.ndjson")) for table in TABLES}
+
+
+def load_sqlite(repository, sizes, seed=MOCK_DATA_SEED, now=None, chunk_size=CHUNK_SIZE):
+    """Stream the dataset straight into a SqliteRepository"""
+    repository.bulk_load(stream_mock_data(sizes, seed, now), chunk_size=chunk_size)
+
+
+def main():
+    from common.config import MOCK_DATA_SIZE
+
+    parser = argparse.ArgumentParser(description="Generate the business_logic mock dataset")
+    parser.add_argument("--customers", type=int, default=MOCK_DATA_SIZE["customers"])
+    parser.add_argument("--appointments", type=int, default=MOCK_DATA_SIZE["appointments"])
+    parser.add_argument("--orders", type=int, default=MOCK_DATA_SIZE["orders"])
+    parser.add_argument("--seed", type=int, default=MOCK_DATA_SEED)
+    parser.add_argument("--ndjson", help="Directory to write <table>.ndjson files to")
+    parser.add_argument("--sqlite", help="SQLite database file to load")
+    args = parser.parse_args()
+
+    sizes = {"customers": args.customers, "appointments": args.appointments, "orders": args.orders}
+    if args.ndjson:
+        for path in write_ndjson(args.ndjson, sizes, args.seed):
+            print(f"Mock data saved to: {path}")
+    if args.sqlite:
+        from common.database import open_database
+
+        repository = open_database(args.sqlite)
+        load_sqlite(repository, sizes, args.seed)
+        repository.close()
+        print(f"Mock data loaded into: {args.sqlite}")
+    if not args.ndjson and not args.sqlite:
+        parser.error("choose --ndjson and/or --sqlite")
+
+
+if __name__ == "__main__":
+    main()
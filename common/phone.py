@@ -0,0 +1,98 @@
+import os
+import re
+from functools import lru_cache
+
+DEFAULT_PHONE_REGION = os.environ.get("DEFAULT_PHONE_REGION", "PK")
+
+# Region -> (country calling code, national trunk prefix, national number lengths)
+REGION_RULES = {
+    "PK": ("92", "0", (10,)),
+    "IN": ("91", "0", (10,)),
+    "AE": ("971", "0", (8, 9)),
+    "SA": ("966", "0", (9,)),
+    "GB": ("44", "0", (10,)),
+    "US": ("1", "1", (10,)),
+    "CA": ("1", "1", (10,)),
+}
+
+E164_REGEX = re.compile(r"^\+[1-9]\d{7,14}$")
+
+SPOKEN_DIGITS = {
+    "zero": "0", "oh": "0", "o": "0",
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5",
+    "six": "6", "seven": "7", "eight": "8", "nine": "9",
+}
+SPOKEN_REPEATS = {"double": 2, "triple": 3}
+SPOKEN_TOKEN_REGEX = re.compile(r"[a-z]+|\d+|\+")
+
+
+def spoken_to_digits(text):
+    """Turn 'plus nine two double three 01...' into '+923301...'.
+
+    Words that are not digits or repeat markers are ignored.
+    """
+    result = []
+    repeat = 1
+    for token in SPOKEN_TOKEN_REGEX.findall(text.lower()):
+        if token in SPOKEN_REPEATS:
+            repeat = SPOKEN_REPEATS[token]
+            continue
+        if token == "plus" or token == "+":
+            if not result:
+                result.append("+")
+            continue
+        if token in SPOKEN_DIGITS:
+            result.append(SPOKEN_DIGITS[token] * repeat)
+        elif token.isdigit():
+            result.append(token[0] * repeat + token[1:])
+        repeat = 1
+    return "".join(result)
+
+
+@lru_cache(maxsize=4096)
+def normalize_phone_number(raw, default_region=DEFAULT_PHONE_REGION):
+    """Normalize a raw phone string to E.164, or return None if it can't be.
+
+    Accepts international (+92..., 0092...), country-code-only (923...),
+    local trunk (0301...) and bare national (301...) formats for the default
+    region, as well as spoken digits. Results are memoized on the raw string.
+    """
+    if raw is None:
+        return None
+    text = str(raw).strip()
+    if not text:
+        return None
+    if E164_REGEX.match(text):
+        return text
+
+    if any(c.isalpha() for c in text):
+        text = spoken_to_digits(text)
+    has_plus = text.startswith("+")
+    digits = "".join(c for c in text if c.isdigit())
+    if not digits:
+        return None
+
+    if has_plus:
+        candidate = f"+{digits}"
+        return candidate if E164_REGEX.match(candidate) else None
+    if digits.startswith("00"):
+        candidate = f"+{digits[2:]}"
+        return candidate if E164_REGEX.match(candidate) else None
+
+    rules = REGION_RULES.get(default_region)
+    if rules:
+        country_code, trunk_prefix, national_lengths = rules
+        if digits.startswith(country_code) and len(digits) - len(country_code) in national_lengths:
+            return f"+{digits}"
+        if digits.startswith(trunk_prefix):
+            if len(digits) - len(trunk_prefix) in national_lengths:
+                return f"+{country_code}{digits[len(trunk_prefix):]}"
+            return None  # Local trunk format with a digit missing or extra
+        if len(digits) in national_lengths:
+            return f"+{country_code}{digits}"
+
+    # Already has some country code we don't have rules for
+    candidate = f"+{digits}"
+    if len(digits) >= 10 and E164_REGEX.match(candidate):
+        return candidate
+    return None
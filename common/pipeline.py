@@ -0,0 +1,90 @@
+import asyncio
+import time
+from common.metrics import REGISTRY
+
+STAGE_LATENCY = REGISTRY.histogram("pipeline_stage_seconds", "Per-item worker latency of each ingestion stage", ("stage",))
+
+_DONE = object()
+
+
+def stage_latency_snapshot():
+    """Histogram snapshot for every stage that has run"""
+    return {key[0]: histogram.snapshot() for key, histogram in list(STAGE_LATENCY.children.items())}
+
+
+async def stage(name, source, worker, concurrency=1, queue_size=0, priority=None, fan_out=False):
+    """Run `worker` over items from the async iterable `source`.
+
+    Each stage owns its own input queue and `concurrency` workers, and yields
+    results as soon as they are ready (completion order, not input order), so
+    stages can be chained into a streaming pipeline. A worker returning None
+    drops the item; with fan_out=True the worker returns an iterable of items.
+    When `priority` is given the input queue is a priority queue ordered by
+    priority(item), lowest first.
+    """
+    histogram = STAGE_LATENCY.labels(name)
+    in_queue = asyncio.PriorityQueue(queue_size) if priority else asyncio.Queue(queue_size)
+    out_queue = asyncio.Queue()
+    source_errors = []
+
+    async def feed():
+        sequence = 0
+        try:
+            async for item in source:
+                if priority:
+                    await in_queue.put((priority(item), sequence, item))
+                else:
+                    await in_queue.put(item)
+                sequence += 1
+        except Exception as e:
+            source_errors.append(e)
+        finally:
+            for _ in range(concurrency):
+                if priority:
+                    await in_queue.put((float("inf"), sequence, _DONE))
+                    sequence += 1
+                else:
+                    await in_queue.put(_DONE)
+
+    async def work():
+        while True:
+            entry = await in_queue.get()
+            item = entry[2] if priority else entry
+            if item is _DONE:
+                break
+            started = time.perf_counter()
+            try:
+                result = await worker(item)
+            except Exception as e:
+                print(f"[ERROR] Pipeline stage {name} failed: {e}")
+                result = None
+            finally:
+                histogram.observe(time.perf_counter() - started)
+            if result is None:
+                continue
+            if fan_out:
+                for output in result:
+                    await out_queue.put(output)
+            else:
+                await out_queue.put(result)
+
+    async def supervise():
+        await asyncio.gather(*workers)
+        await feeder
+        await out_queue.put(_DONE)
+
+    feeder = asyncio.create_task(feed())
+    workers = [asyncio.create_task(work()) for _ in range(concurrency)]
+    supervisor = asyncio.create_task(supervise())
+
+    try:
+        while True:
+            output = await out_queue.get()
+            if output is _DONE:
+                break
+            yield output
+        if source_errors:
+            raise source_errors[0]
+    finally:
+        for task in (feeder, supervisor, *workers):
+            task.cancel()
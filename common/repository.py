@@ -0,0 +1,75 @@
+import bisect
+from collections import defaultdict
+
+
+class InMemoryRepository:
+    """Indexed view over the mock dataset used by business_logic.
+
+    Customers are hashed by id, phone and email; appointments and orders by
+    customer_id. Appointment dates are kept in a sorted list so checking
+    whether a slot is booked is a bisect instead of a scan. The
+    underlying MOCK_DATA lists stay the source of truth and are appended to
+    on every write, so anything still reading them sees the same records.
+    """
+
+    blocking = False
+
+    def __init__(self, data):
+        self.data = data
+        self.customers_by_id = {}
+        self.customers_by_phone = {}
+        self.customers_by_email = {}
+        self.appointments_by_customer = defaultdict(list)
+        self.orders_by_customer = defaultdict(list)
+        self.appointment_dates = []
+
+        for customer in data["customers"]:
+            self._index_customer(customer)
+        for appointment in data["appointments"]:
+            self.appointments_by_customer[appointment["customer_id"]].append(appointment)
+        for order in data["orders"]:
+            self.orders_by_customer[order["customer_id"]].append(order)
+        self.appointment_dates = sorted(appointment["date"] for appointment in data["appointments"])
+
+    def _index_customer(self, customer):
+        self.customers_by_id[customer["id"]] = customer
+        self.customers_by_phone[customer["phone"]] = customer
+        self.customers_by_email[customer["email"]] = customer
+
+    def find_customer(self, phone=None, email=None, customer_id=None):
+        if phone:
+            return self.customers_by_phone.get(phone)
+        if email:
+            return self.customers_by_email.get(email)
+        if customer_id:
+            return self.customers_by_id.get(customer_id)
+        return None
+
+    def appointments_for(self, customer_id):
+        return list(self.appointments_by_customer.get(customer_id, ()))
+
+    def orders_for(self, customer_id):
+        return list(self.orders_by_customer.get(customer_id, ()))
+
+    def add_appointment(self, customer, date, service):
+        appointment = {
+            "id": f"APT{len(self.data['appointments']):04d}",
+            "customer_id": customer["id"],
+            "customer_name": customer["name"],
+            "date": date,
+            "service": service,
+            "status": "Scheduled",
+        }
+        self.data["appointments"].append(appointment)
+        self.appointments_by_customer[customer["id"]].append(appointment)
+        bisect.insort(self.appointment_dates, date)
+        return appointment
+
+    def is_booked(self, date):
+        """Whether an appointment exists at exactly this ISO date"""
+        index = bisect.bisect_left(self.appointment_dates, date)
+        return index < len(self.appointment_dates) and self.appointment_dates[index] == date
+
+    def booked_among(self, dates):
+        """The subset of `dates` (ISO strings) that already have an appointment"""
+        return {date for date in dates if self.is_booked(date)}
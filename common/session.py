@@ -0,0 +1,106 @@
+import os
+import time
+from collections import deque
+
+# Call events kept per call; older events fall off the ring
+SESSION_EVENT_LIMIT = int(os.environ.get("SESSION_EVENT_LIMIT", 64))
+# Transcript turns kept per call, in their own ring so events can't push them out; replayed on reconnect
+CONVERSATION_HISTORY_TURNS = int(os.environ.get("CONVERSATION_HISTORY_TURNS", 20))
+
+TRANSCRIPT_ROLES = ("user", "assistant")
+
+
+class CallSession:
+    """Everything tracked for one call, from dial until the call ends.
+
+    Sessions are created when Twilio accepts a dial and idle until the media
+    stream starts, so they are kept small: fixed __slots__, and the transcript
+    and event rings are only allocated once something is recorded.
+    """
+
+    __slots__ = (
+        "call_sid", "stream_sid", "ticket_data", "voice_agent", "status",
+        "created_at", "frames_in", "frames_out", "turns", "events", "__weakref__",
+    )
+
+    def __init__(self, call_sid, ticket_data):
+        self.call_sid = call_sid
+        self.stream_sid = None
+        self.ticket_data = ticket_data
+        self.voice_agent = None
+        self.status = "dialing"
+        self.created_at = time.time()
+        self.frames_in = 0
+        self.frames_out = 0
+        self.turns = None
+        self.events = None
+
+    def record(self, kind, text=None):
+        """Append a transcript turn (kind "user"/"assistant") or a call event to its ring"""
+        if kind in TRANSCRIPT_ROLES:
+            if self.turns is None:
+                self.turns = deque(maxlen=CONVERSATION_HISTORY_TURNS)
+            self.turns.append((time.time(), kind, text))
+            return
+        if self.events is None:
+            self.events = deque(maxlen=SESSION_EVENT_LIMIT)
+        self.events.append((time.time(), kind, text))
+
+    def transcript(self, limit=None):
+        """The most recent transcript turns as [{"role", "content"}], oldest first"""
+        turns = [{"role": kind, "content": text} for _, kind, text in self.turns or ()]
+        return turns[-limit:] if limit else turns
+
+    def snapshot(self):
+        return {
+            "stream_sid": self.stream_sid,
+            "ticket_id": self.ticket_data.get("ticket_id") if self.ticket_data else None,
+            "status": self.status,
+            "age_seconds": round(time.time() - self.created_at, 1),
+            "frames_in": self.frames_in,
+            "frames_out": self.frames_out,
+            "turns": len(self.turns) if self.turns else 0,
+            "events": len(self.events) if self.events else 0,
+        }
+
+
+class SessionRegistry:
+    """Live CallSessions, indexed by CallSid and by the media StreamSid"""
+
+    def __init__(self):
+        self.by_call_sid = {}
+        self.by_stream_sid = {}
+
+    def __len__(self):
+        return len(self.by_call_sid)
+
+    def __contains__(self, call_sid):
+        return call_sid in self.by_call_sid
+
+    def add(self, session):
+        self.by_call_sid[session.call_sid] = session
+        return session
+
+    def get(self, call_sid):
+        return self.by_call_sid.get(call_sid)
+
+    def by_stream(self, stream_sid):
+        return self.by_stream_sid.get(stream_sid)
+
+    def bind_stream(self, session, stream_sid):
+        if session.stream_sid:
+            self.by_stream_sid.pop(session.stream_sid, None)
+        session.stream_sid = stream_sid
+        if stream_sid:
+            self.by_stream_sid[stream_sid] = session
+
+    def remove(self, call_sid):
+        """Drop a session from both indexes; returns it, or None if it was already gone"""
+        session = self.by_call_sid.pop(call_sid, None)
+        if session and session.stream_sid:
+            self.by_stream_sid.pop(session.stream_sid, None)
+        return session
+
+    def sessions(self):
+        # A copy, so the Flask thread can iterate while the media loop adds and removes calls
+        return list(self.by_call_sid.values())
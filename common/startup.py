@@ -0,0 +1,90 @@
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# Integrations that are imported on first use; warmed in the background once the servers are up
+BACKGROUND_IMPORTS = ("twilio.rest", "groq", "selenium.webdriver")
+STARTUP_READY_LINE = "STARTUP READY"
+
+
+def preload_in_background(modules=BACKGROUND_IMPORTS, logger=None):
+    """Import heavy modules in a daemon thread so the first call does not pay for them"""
+    def preload():
+        for name in modules:
+            started = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                if logger:
+                    logger.warning(f"Background import of {name} failed: {e}")
+                continue
+            if logger:
+                logger.debug(f"Preloaded {name} in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    thread = threading.Thread(target=preload, name="preload-imports", daemon=True)
+    thread.start()
+    return thread
+
+
+def parse_importtime(stderr, module):
+    """Direct imports of `module` from `python -X importtime` output.
+
+    Returns ([(name, self_us, cumulative_us), ...], module's cumulative us).
+    """
+    pending = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # Header line
+        self_us, cumulative_us, name = int(parts[0]), int(parts[1]), parts[2]
+        stripped = name.lstrip(" ")
+        # One space, then two per nesting level
+        depth = (len(name) - len(stripped) - 1) // 2
+        # Children are printed before their parent, so keep only the run that ends at `module`
+        if depth == 0:
+            if stripped == module:
+                return pending, cumulative_us
+            pending = []
+        elif depth == 1:
+            pending.append((stripped, self_us, cumulative_us))
+    return pending, None
+
+
+def profile_startup(script, module, top=15):
+    """Report per-module import cost of `module` and the cold start of `script` until it accepts streams"""
+    root = os.path.dirname(os.path.abspath(script))
+    env = dict(os.environ, MEDIA_PORT="0")
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=root, env=env, capture_output=True, text=True,
+    )
+    imports, total = parse_importtime(result.stderr, module)
+    print(f"\nImport cost of '{module}' (direct imports, cumulative):")
+    for name, self_us, cumulative_us in sorted(imports, key=lambda row: row[2], reverse=True)[:top]:
+        print(f"   {cumulative_us / 1000:8.1f} ms  {name}")
+    if total is not None:
+        print(f"   {total / 1000:8.1f} ms  total")
+
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, script, "--startup-probe"],
+        cwd=root, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    ready = None
+    for line in process.stdout:
+        if line.strip() == STARTUP_READY_LINE:
+            ready = time.perf_counter() - started
+            break
+    process.kill()
+    process.wait()
+    if ready is None:
+        print("\nCold start: the probe exited before the media server was listening")
+    else:
+        print(f"\nCold start to accepting Twilio streams: {ready * 1000:.0f} ms")
+    return ready
@@ -0,0 +1,144 @@
+import asyncio
+import gc
+import os
+import time
+import weakref
+from collections import deque
+
+from common.loop_monitor import call_task_name
+from common.metrics import REGISTRY
+
+CALL_SHUTDOWN_DEADLINE = float(os.environ.get("CALL_SHUTDOWN_DEADLINE", 5))
+# Debug mode: after a call ends, check that its objects were actually freed
+CALL_LEAK_CHECK = os.environ.get("CALL_LEAK_CHECK", "false").lower() == "true"
+CALL_LEAK_CHECK_DELAY = float(os.environ.get("CALL_LEAK_CHECK_DELAY", 10))
+
+STUCK_TASKS = REGISTRY.counter("call_stuck_tasks", "Call tasks still running after the shutdown deadline")
+LEAKED_OBJECTS = REGISTRY.counter("call_leaked_objects", "Call objects still alive after the leak-check delay", ("kind",))
+SUPERVISED_TASKS = REGISTRY.gauge("call_supervised_tasks", "Tasks currently owned by call supervisors")
+SUPERVISED_SOCKETS = REGISTRY.gauge("call_supervised_sockets", "Open WebSockets currently owned by call supervisors")
+
+# Every supervisor that has not been garbage collected, open or closed
+LIVE_SUPERVISORS = weakref.WeakSet()
+# Most recent leak-check findings, for /status
+LEAK_LOG = deque(maxlen=50)
+
+
+class CallSupervisor:
+    """Owns every task and WebSocket of one call so they end together.
+
+    Like asyncio.TaskGroup, except the group lives as long as the call rather
+    than a `with` block: any of the call's code can spawn into it, and close()
+    cancels whatever is still running and closes the sockets, giving up on
+    stragglers after `deadline` seconds. close() is idempotent; concurrent
+    callers wait for the same shutdown.
+    """
+
+    def __init__(self, call_sid, deadline=CALL_SHUTDOWN_DEADLINE):
+        self.call_sid = call_sid
+        self.deadline = deadline
+        self.tasks = set()
+        self.sockets = weakref.WeakSet()
+        self.closed = False
+        self.closing = None
+        self.spawned = weakref.WeakSet() if CALL_LEAK_CHECK else None
+        LIVE_SUPERVISORS.add(self)
+
+    def spawn(self, coro):
+        """Run `coro` as one of the call's tasks; refused once the call is shutting down"""
+        if self.closed:
+            coro.close()
+            return None
+        task = asyncio.ensure_future(coro)
+        task.set_name(call_task_name(self.call_sid))
+        self.tasks.add(task)
+        task.add_done_callback(self._task_done)
+        if self.spawned is not None:
+            self.spawned.add(task)
+        return task
+
+    def _task_done(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[ERROR] Task for call {self.call_sid} failed: {task.exception()!r}")
+
+    def track_socket(self, websocket):
+        self.sockets.add(websocket)
+        return websocket
+
+    def open_sockets(self):
+        return [ws for ws in list(self.sockets) if not ws.closed]
+
+    def counts(self):
+        return {"tasks": len(self.tasks), "sockets": len(self.open_sockets()), "closed": self.closed}
+
+    async def close(self):
+        if self.closing is None:
+            self.closing = asyncio.ensure_future(self._close(asyncio.current_task()))
+        # shield: a caller being cancelled must not abort the shutdown other callers wait on
+        await asyncio.shield(self.closing)
+
+    async def _close(self, requester):
+        self.closed = True
+        # The task that asked for the shutdown (often the run loop itself) finishes on its own
+        pending = [task for task in self.tasks if task is not requester and not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            done, stuck = await asyncio.wait(pending, timeout=self.deadline)
+            if stuck:
+                STUCK_TASKS.inc(len(stuck))
+                print(f"[ERROR] {len(stuck)} task(s) for call {self.call_sid} ignored cancellation for {self.deadline}s")
+
+        for websocket in self.open_sockets():
+            try:
+                await asyncio.wait_for(websocket.close(), self.deadline)
+            except Exception:
+                # Closing handshake timed out or failed; drop the connection outright
+                websocket.transport.abort()
+
+    def watch_for_leaks(self, **objects):
+        """In CALL_LEAK_CHECK mode, report any of `objects` (or this call's tasks) still alive after the delay"""
+        if not CALL_LEAK_CHECK:
+            return
+        refs = {kind: weakref.ref(obj) for kind, obj in objects.items() if obj is not None}
+        refs["supervisor"] = weakref.ref(self)
+        tasks = self.spawned
+        loop = asyncio.get_running_loop()
+        loop.call_later(CALL_LEAK_CHECK_DELAY, check_for_leaks, self.call_sid, refs, tasks, loop)
+
+
+def check_for_leaks(call_sid, refs, tasks, loop):
+    # A full collection stalls the loop for tens of ms, which is why this is debug-only
+    gc.collect()
+    leaked = sorted(kind for kind, ref in refs.items() if ref() is not None)
+    running = [task for task in tasks if not task.done()]
+    # Tasks started for the call outside the supervisor, found by name
+    name = call_task_name(call_sid)
+    running += [task for task in asyncio.all_tasks(loop) if task.get_name() == name and task not in running]
+    if running:
+        leaked.append("task")
+    if not leaked:
+        return
+    for kind in leaked:
+        LEAKED_OBJECTS.labels(kind).inc()
+    finding = {
+        "call_sid": call_sid,
+        "leaked": leaked,
+        "running_tasks": [repr(task.get_coro()) for task in running[:5]],
+        "timestamp": time.time(),
+    }
+    LEAK_LOG.append(finding)
+    print(f"[ERROR] Call {call_sid} ended {CALL_LEAK_CHECK_DELAY:.0f}s ago but still holds: {', '.join(leaked)}")
+
+
+def supervisor_totals():
+    supervisors = list(LIVE_SUPERVISORS)
+    return (
+        sum(len(supervisor.tasks) for supervisor in supervisors),
+        sum(len(supervisor.open_sockets()) for supervisor in supervisors),
+    )
+
+
+SUPERVISED_TASKS.set_function(lambda: supervisor_totals()[0])
+SUPERVISED_SOCKETS.set_function(lambda: supervisor_totals()[1])
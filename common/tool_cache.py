@@ -0,0 +1,174 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from common.metrics import REGISTRY
+
+TOOL_CACHE_SIZE = int(os.environ.get("TOOL_CACHE_SIZE", 1024))
+CALL_TOOL_CACHE_SIZE = 64
+
+# Keys in a function definition that describe caching; never sent to the agent
+CACHE_KEYS = ("idempotent", "cache_ttl")
+
+TOOL_CACHE = REGISTRY.counter("tool_cache", "Agent tool result cache lookups", ("function", "result"))
+
+# name -> {"idempotent": bool, "ttl": seconds or None}
+TOOL_POLICIES = {}
+
+_caches = weakref.WeakSet()
+
+
+def register_tools(definitions):
+    """Read the cache policy of each function definition.
+
+    A definition opts in with "idempotent": True and an optional "cache_ttl"
+    (seconds the process-wide entry lives; without it the result is only
+    reused within the same call).
+    """
+    for definition in definitions:
+        TOOL_POLICIES[definition["name"]] = {
+            "idempotent": definition.get("idempotent", False),
+            "ttl": definition.get("cache_ttl"),
+        }
+
+
+def agent_tool_definitions(definitions):
+    """Function definitions as the Voice Agent API expects them (cache keys stripped)"""
+    return [{key: value for key, value in definition.items() if key not in CACHE_KEYS} for definition in definitions]
+
+
+def _canonical(value):
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items() if item is not None}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, bool) or value is None:
+        return value
+    # "123" and 123 are the same ticket to every tool we have
+    return str(value)
+
+
+def canonical_args(params):
+    """Stable cache key for tool arguments (key order, whitespace and number types ignored)"""
+    return json.dumps(_canonical(params or {}), sort_keys=True, separators=(",", ":"))
+
+
+class ToolCache:
+    """LRU of tool results keyed by (function, canonical arguments), with optional TTLs"""
+
+    def __init__(self, max_entries=TOOL_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (function, key) -> (expires_at or None, params, result)
+        self.lock = threading.Lock()
+        _caches.add(self)
+
+    def get(self, function, key):
+        with self.lock:
+            entry = self.entries.get((function, key))
+            if entry is None:
+                return None
+            expires_at, _, result = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self.entries[(function, key)]
+                return None
+            self.entries.move_to_end((function, key))
+            return result
+
+    def put(self, function, key, params, result, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self.lock:
+            self.entries[(function, key)] = (expires_at, params, result)
+            self.entries.move_to_end((function, key))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, function, argument=None, value=None):
+        """Drop function's results, or only those whose `argument` equals `value`"""
+        with self.lock:
+            stale = [
+                cache_key for cache_key, (_, params, _) in self.entries.items()
+                if cache_key[0] == function
+                and (argument is None or _canonical(params.get(argument)) == _canonical(value))
+            ]
+            for cache_key in stale:
+                del self.entries[cache_key]
+        return len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+PROCESS_TOOL_CACHE = ToolCache()
+_inflight = {}
+# Bumped on invalidation so a lookup that raced a mutation is not stored
+_generation = {}
+# Invalidation comes from the Flask and poll threads while calls use the caches on the media loop
+_lock = threading.Lock()
+
+
+def invalidate_tool_results(function, argument=None, value=None):
+    """Invalidate cached results of function in the process cache and every call's cache"""
+    with _lock:
+        _generation[function] = _generation.get(function, 0) + 1
+        for inflight_key in [k for k in _inflight if k[0] == function]:
+            _inflight.pop(inflight_key, None)
+    return sum(cache.invalidate(function, argument, value) for cache in list(_caches))
+
+
+async def cached_call(function, func, params, call_cache=None):
+    """Run a tool through the per-call and per-process caches.
+
+    Only idempotent tools are cached, and only successful results (no
+    "error" key). Identical calls already in flight share one execution.
+    """
+    policy = TOOL_POLICIES.get(function)
+    if not policy or not policy["idempotent"]:
+        return await func(params)
+
+    key = canonical_args(params)
+    for scope, cache in (("call", call_cache), ("process", PROCESS_TOOL_CACHE)):
+        if cache is None:
+            continue
+        result = cache.get(function, key)
+        if result is not None:
+            TOOL_CACHE.labels(function, f"{scope}_hit").inc()
+            if scope == "process" and call_cache is not None:
+                call_cache.put(function, key, params, result)
+            return result
+
+    with _lock:
+        pending = _inflight.get((function, key))
+    if pending is not None:
+        TOOL_CACHE.labels(function, "coalesced").inc()
+        return await asyncio.shield(pending)
+
+    TOOL_CACHE.labels(function, "miss").inc()
+    future = asyncio.ensure_future(func(params))
+    # Retrieve the outcome even if every waiter was cancelled
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    with _lock:
+        generation = _generation.get(function, 0)
+        _inflight[(function, key)] = future
+    try:
+        result = await asyncio.shield(future)
+    finally:
+        with _lock:
+            if _inflight.get((function, key)) is future:
+                del _inflight[(function, key)]
+
+    if isinstance(result, dict) and "error" not in result:
+        # Under the lock, so an invalidation either comes first (and this is not stored) or clears it after
+        with _lock:
+            if _generation.get(function, 0) == generation:
+                if call_cache is not None:
+                    call_cache.put(function, key, params, result)
+                if policy["ttl"]:
+                    PROCESS_TOOL_CACHE.put(function, key, params, result, ttl=policy["ttl"])
+    return result
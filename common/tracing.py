@@ -0,0 +1,241 @@
+import json
+import os
+import threading
+import time
+import urllib.request
+from collections import deque
+from contextlib import contextmanager
+
+TRACE_BUFFER_SIZE = int(os.environ.get("TRACE_BUFFER_SIZE", 5000))
+OTLP_ENDPOINT = os.environ.get("OTLP_ENDPOINT")  # e.g. http://localhost:4318/v1/traces
+OTLP_EXPORT_INTERVAL = float(os.environ.get("OTLP_EXPORT_INTERVAL", 5))
+SERVICE_NAME = "city-monitor-agent"
+
+
+class Trace:
+    """One incident's timeline, from ticket detection to call end.
+
+    Child spans are written to the tracer's ring buffer as soon as they end,
+    so a trace can be inspected while the call is still running. The root
+    span is written by finish().
+    """
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.start_ns = time.time_ns()
+        self.finished = False
+
+    def record(self, name, start_ns, end_ns=None, **attributes):
+        self.tracer.record({
+            "trace_id": self.trace_id,
+            "span_id": os.urandom(8).hex(),
+            "parent_span_id": self.span_id,
+            "name": name,
+            "start_ns": start_ns,
+            "end_ns": end_ns if end_ns is not None else time.time_ns(),
+            "attributes": attributes,
+        })
+
+    def event(self, name, **attributes):
+        """Zero-length span marking a milestone"""
+        now = time.time_ns()
+        self.record(name, now, now, **attributes)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        start_ns = time.time_ns()
+        try:
+            yield attributes
+        finally:
+            self.record(name, start_ns, **attributes)
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def finish(self, **attributes):
+        if self.finished:
+            return
+        self.finished = True
+        self.attributes.update(attributes)
+        self.tracer.record({
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": None,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": time.time_ns(),
+            "attributes": self.attributes,
+        })
+
+
+class NullTrace:
+    """Stand-in for calls that were not traced (e.g. unknown CallSid)"""
+
+    trace_id = None
+
+    def record(self, name, start_ns, end_ns=None, **attributes):
+        pass
+
+    def event(self, name, **attributes):
+        pass
+
+    @contextmanager
+    def span(self, name, **attributes):
+        yield attributes
+
+    def set_attribute(self, key, value):
+        pass
+
+    def finish(self, **attributes):
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+class Tracer:
+    """Keeps finished spans in a ring buffer and live traces by key (ticket id, CallSid)"""
+
+    def __init__(self, buffer_size=TRACE_BUFFER_SIZE, otlp_endpoint=OTLP_ENDPOINT):
+        self.spans = deque(maxlen=buffer_size)
+        self.active = {}
+        self.lock = threading.Lock()
+        self.exporter = OtlpExporter(otlp_endpoint) if otlp_endpoint else None
+
+    def start_trace(self, name, key=None, **attributes):
+        trace = Trace(self, name, attributes)
+        if key is not None:
+            self.bind(key, trace)
+        return trace
+
+    def bind(self, key, trace):
+        with self.lock:
+            self.active[key] = trace
+
+    def unbind(self, key):
+        """Stop routing `key` to its trace without finishing it (e.g. a losing call leg)"""
+        with self.lock:
+            self.active.pop(key, None)
+
+    def get(self, key):
+        return self.active.get(key, NULL_TRACE)
+
+    def finish(self, key, **attributes):
+        """Finish the trace bound to key and drop every key bound to it"""
+        with self.lock:
+            trace = self.active.pop(key, None)
+            if trace is None:
+                return
+            for other_key in [k for k, t in self.active.items() if t is trace]:
+                del self.active[other_key]
+        trace.finish(**attributes)
+
+    def record(self, span):
+        self.spans.append(span)
+        if self.exporter:
+            self.exporter.enqueue(span)
+
+    def export_json(self, trace_id=None, call_sid=None):
+        """Finished spans grouped per trace, oldest first"""
+        traces = {}
+        for span in list(self.spans):
+            traces.setdefault(span["trace_id"], []).append(span)
+        result = []
+        for span_trace_id, spans in traces.items():
+            if trace_id and span_trace_id != trace_id:
+                continue
+            if call_sid and not any(span["attributes"].get("call_sid") == call_sid for span in spans):
+                continue
+            spans.sort(key=lambda span: span["start_ns"])
+            start_ns = spans[0]["start_ns"]
+            result.append({
+                "trace_id": span_trace_id,
+                "spans": [
+                    {
+                        **span,
+                        "offset_ms": round((span["start_ns"] - start_ns) / 1e6, 3),
+                        "duration_ms": round((span["end_ns"] - span["start_ns"]) / 1e6, 3),
+                    }
+                    for span in spans
+                ],
+            })
+        return result
+
+
+class OtlpExporter:
+    """Batches spans and POSTs them as OTLP/HTTP JSON to a local collector"""
+
+    def __init__(self, endpoint, interval=OTLP_EXPORT_INTERVAL):
+        self.endpoint = endpoint
+        self.interval = interval
+        self.pending = deque(maxlen=TRACE_BUFFER_SIZE)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def enqueue(self, span):
+        self.pending.append(span)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            batch = []
+            while self.pending:
+                batch.append(self.pending.popleft())
+            if batch:
+                self.export(batch)
+
+    def export(self, spans):
+        body = json.dumps(to_otlp(spans)).encode("utf-8")
+        request = urllib.request.Request(
+            self.endpoint, data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+        except Exception as e:
+            print(f"[ERROR] OTLP export of {len(spans)} spans failed: {e}")
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans):
+    """Convert recorded spans to an OTLP ExportTraceServiceRequest (JSON encoding)"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": "city_monitor"},
+                "spans": [
+                    {
+                        "traceId": span["trace_id"],
+                        "spanId": span["span_id"],
+                        "parentSpanId": span["parent_span_id"] or "",
+                        "name": span["name"],
+                        "kind": 1,
+                        "startTimeUnixNano": str(span["start_ns"]),
+                        "endTimeUnixNano": str(span["end_ns"]),
+                        "attributes": [
+                            {"key": key, "value": _otlp_value(value)}
+                            for key, value in span["attributes"].items() if value is not None
+                        ],
+                    }
+                    for span in spans
+                ],
+            }],
+        }]
+    }
+
+
+TRACER = Tracer()
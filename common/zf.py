@@ -5,60 +5,143 @@ import time
 import threading
 import requests
 from datetime import datetime
-from typing import Dict, Any
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException
-from groq import Groq
+from typing import Dict, Any, List
+from common.phone import normalize_phone_number
+from common.metrics import EXTERNAL_REQUEST_LATENCY
+from common.tool_cache import register_tools, invalidate_tool_results
+from common.evidence import EVIDENCE
 
 FRESHDESK_DOMAIN = os.environ.get("FRESHDESK_DOMAIN", "FRESHDESK_DOMAIN")
+FRESHDESK_URL = os.environ.get("FRESHDESK_URL", f"https://{FRESHDESK_DOMAIN}")  # Override to point at a local stand-in
 API_KEY = os.environ.get("API_KEY", "API_KEY")
 CHROME_DRIVER_PATH = os.environ.get("CHROME_DRIVER_PATH", "path/to/chromedriver")
 WHATSAPP_GROUP_NAME = os.environ.get("WHATSAPP_GROUP_NAME", "Safe City Emergency Group")
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "GROQ_API_KEY")
 MODEL_NAME = "llama3-8b-8192"
 
+# Batched extraction settings
+EXTRACTION_BATCH_SIZE = int(os.environ.get("EXTRACTION_BATCH_SIZE", 8))
+EXTRACTION_BATCH_MAX_CHARS = int(os.environ.get("EXTRACTION_BATCH_MAX_CHARS", 12000))
+EXTRACTION_TOKENS_PER_TICKET = 300
+
+EXTRACTION_FIELDS = """{{
+    "phone_number": "any numeric number written against 'phone:' key word is phone number",
+    "incident_type": "fire/accident/robbery/medical/etc", 
+    "address": "complete address",
+    "priority": 1-4 (1=Critical, 4=Low),
+    "confidence_score": 0.0-1.0,
+    "image_urls": ["array of URLs"]{extra}
+}}"""
+SINGLE_EXTRACTION_FIELDS = EXTRACTION_FIELDS.format(extra="")
+BATCH_EXTRACTION_FIELDS = EXTRACTION_FIELDS.format(extra=',\n    "ticket_id": "the number after ### Ticket"')
+
+
+def build_ticket_text(ticket_data: Dict[str, Any]) -> str:
+    """Subject + description, the text the LLM extracts from"""
+    subject = ticket_data.get("subject", "")
+    description = ticket_data.get("description", "") or ticket_data.get("description_text", "")
+    return f"Subject: {subject}\nDescription: {description}"
+
+
+def validate_extraction(result: Any) -> Dict[str, Any]:
+    """Coerce an LLM extraction result into the expected schema.
+
+    Returns the cleaned result, or a dict with an "error" key when the
+    result cannot be used at all.
+    """
+    if not isinstance(result, dict):
+        return {"error": f"Extraction is not an object: {type(result).__name__}"}
+
+    clean = {}
+
+    phone_number = result.get("phone_number")
+    if isinstance(phone_number, (int, float)) and not isinstance(phone_number, bool):
+        phone_number = str(int(phone_number))
+    if isinstance(phone_number, str) and phone_number.strip():
+        # Keep the raw text when it can't be normalized so callers can report it
+        clean["phone_number"] = normalize_phone_number(phone_number) or phone_number.strip()
+    else:
+        clean["phone_number"] = None
+
+    for key in ("incident_type", "address"):
+        value = result.get(key)
+        clean[key] = value.strip() if isinstance(value, str) and value.strip() else None
+
+    try:
+        priority = int(result.get("priority"))
+        clean["priority"] = min(max(priority, 1), 4)
+    except (TypeError, ValueError):
+        clean["priority"] = None
+
+    try:
+        confidence = float(result.get("confidence_score"))
+        if 1.0 < confidence <= 100.0:
+            confidence /= 100.0
+        clean["confidence_score"] = min(max(confidence, 0.0), 1.0)
+    except (TypeError, ValueError):
+        clean["confidence_score"] = None
+
+    image_urls = result.get("image_urls") or []
+    if isinstance(image_urls, str):
+        image_urls = [image_urls]
+    clean["image_urls"] = [url for url in image_urls if isinstance(url, str) and url.strip()] if isinstance(image_urls, list) else []
+
+    if not clean["incident_type"] and not clean["address"] and not clean["phone_number"]:
+        return {"error": "Extraction has no usable fields"}
+
+    return clean
+
+
+def split_extraction_batches(tickets):
+    """Greedily pack tickets into batches bounded by count and prompt size"""
+    batches = []
+    current = []
+    current_chars = 0
+    for ticket in tickets:
+        size = len(build_ticket_text(ticket))
+        if current and (len(current) >= EXTRACTION_BATCH_SIZE or current_chars + size > EXTRACTION_BATCH_MAX_CHARS):
+            batches.append(current)
+            current = []
+            current_chars = 0
+        current.append(ticket)
+        current_chars += size
+    if current:
+        batches.append(current)
+    return batches
+
+
 class GrokAI:
     """Simple Grok AI integration - let AI do what AI does best!"""
 
     def __init__(self):
+        # Imported on first use; the groq SDK alone costs ~0.1s at startup
+        from groq import Groq
+
         self.client = Groq(api_key=GROQ_API_KEY)
 
     async def extract_ticket_info(self, ticket_data: Dict[str, Any]) -> Dict[str, Any]:
         """Let Groq handle the extraction - simple and clean"""
         try:
-            # Get the ticket text (subject + description)
-            subject = ticket_data.get("subject", "")
-            description = ticket_data.get("description", "") or ticket_data.get("description_text", "")
-            
-            ticket_text = f"Subject: {subject}\nDescription: {description}"
+            ticket_text = build_ticket_text(ticket_data)
             print(f"[DEBUG] Sending to Groq: {ticket_text}")
 
-            response = self.client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[{
-                    "role": "user", 
-                    "content": f"""Extract emergency info from this ticket and return ONLY clean JSON:
+            with EXTERNAL_REQUEST_LATENCY.labels("groq", "extract").time():
+                response = await asyncio.to_thread(
+                    self.client.chat.completions.create,
+                    model=MODEL_NAME,
+                    messages=[{
+                        "role": "user", 
+                        "content": f"""Extract emergency info from this ticket and return ONLY clean JSON:
 
 {ticket_text}
 
 Return JSON with these exact keys:
-{{
-    "phone_number": "any numeric number written against 'phone:' key word is phone number",
-    "incident_type": "fire/accident/robbery/medical/etc", 
-    "address": "complete address",
-    "priority": 1-4 (1=Critical, 4=Low),
-    "confidence_score": 0.0-1.0,
-    "image_urls": ["array of URLs"]
-}}"""
-                }],
-                response_format={"type": "json_object"},
-                temperature=0.0,
-                max_tokens=300
-            )
+{SINGLE_EXTRACTION_FIELDS}"""
+                    }],
+                    response_format={"type": "json_object"},
+                    temperature=0.0,
+                    max_tokens=EXTRACTION_TOKENS_PER_TICKET
+                )
 
             result = json.loads(response.choices[0].message.content)
             print(f"[DEBUG] Groq extracted: {result}")
@@ -68,8 +151,90 @@ Return JSON with these exact keys:
             print(f"[ERROR] Groq failed: {e}")
             return {"error": str(e)}
 
+    async def extract_ticket_batch(self, tickets) -> Dict[Any, Dict[str, Any]]:
+        """Extract several tickets in one JSON-mode request.
+
+        Returns a dict of ticket id -> validated extraction. Batches that are
+        truncated or rejected are split in half and retried; single tickets
+        that still fail fall back to extract_ticket_info.
+        """
+        results = {}
+        for batch in split_extraction_batches(tickets):
+            results.update(await self._extract_batch(batch))
+        return results
+
+    async def _extract_single(self, ticket: Dict[str, Any]) -> Dict[str, Any]:
+        extracted = await self.extract_ticket_info(ticket)
+        if "error" in extracted:
+            return extracted
+        return validate_extraction(extracted)
+
+    async def _extract_batch(self, batch) -> Dict[Any, Dict[str, Any]]:
+        if len(batch) == 1:
+            return {batch[0].get("id"): await self._extract_single(batch[0])}
+
+        ticket_blocks = "\n\n".join(
+            f"### Ticket {ticket.get('id')}\n{build_ticket_text(ticket)}" for ticket in batch
+        )
+        print(f"[DEBUG] Sending batch of {len(batch)} tickets to Groq")
+
+        try:
+            with EXTERNAL_REQUEST_LATENCY.labels("groq", "extract_batch").time():
+                response = await asyncio.to_thread(
+                    self.client.chat.completions.create,
+                    model=MODEL_NAME,
+                    messages=[{
+                        "role": "user",
+                        "content": f"""Extract emergency info from each ticket below and return ONLY clean JSON:
+
+{ticket_blocks}
+
+Return JSON of the form {{"tickets": [...]}} with one entry per ticket, each with these exact keys:
+{BATCH_EXTRACTION_FIELDS}"""
+                    }],
+                    response_format={"type": "json_object"},
+                    temperature=0.0,
+                    max_tokens=EXTRACTION_TOKENS_PER_TICKET * len(batch)
+                )
+
+            choice = response.choices[0]
+            if getattr(choice, "finish_reason", None) == "length":
+                raise ValueError("response truncated")
+            entries = json.loads(choice.message.content).get("tickets")
+            if not isinstance(entries, list):
+                raise ValueError("response has no tickets array")
+        except Exception as e:
+            middle = len(batch) // 2
+            print(f"[ERROR] Groq batch of {len(batch)} failed ({e}), splitting")
+            results = await self._extract_batch(batch[:middle])
+            results.update(await self._extract_batch(batch[middle:]))
+            return results
+
+        by_id = {str(ticket.get("id")): ticket for ticket in batch}
+        results = {}
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            ticket = by_id.get(str(entry.get("ticket_id")))
+            if ticket is None:
+                continue
+            extracted = validate_extraction(entry)
+            if "error" not in extracted:
+                results[ticket.get("id")] = extracted
+
+        # Anything missing or invalid in the batch response is retried on its own
+        for ticket in batch:
+            if ticket.get("id") not in results:
+                print(f"[DEBUG] Ticket {ticket.get('id')} missing from batch response, retrying alone")
+                results[ticket.get("id")] = await self._extract_single(ticket)
+
+        print(f"[DEBUG] Groq batch extracted {len(results)} tickets")
+        return results
+
 
 class WhatsAppBot:
+    """WhatsApp Web driven through Selenium (imported only when the first alert is sent)"""
+
     def __init__(self):
         self.driver = None
         self.lock = threading.Lock()
@@ -78,6 +243,8 @@ class WhatsAppBot:
 
     def start_driver(self):
         try:
+            from selenium import webdriver
+
             options = webdriver.ChromeOptions()
             options.add_argument("--user-data-dir=F:/Hiring_Bot/chrome-data")
             options.add_argument("--remote-debugging-port=9222")
@@ -87,21 +254,26 @@ class WhatsAppBot:
             self.driver = webdriver.Chrome(service=service, options=options)
             self.driver.get("https://web.whatsapp.com")
 
-            WebDriverWait(self.driver, 60).until(
-                EC.presence_of_element_located((By.XPATH, "//div[@aria-label='Chat list']"))
-            )
+            self.wait_for(60, "//div[@aria-label='Chat list']")
             print("[INFO] WhatsApp loaded")
         except Exception as e:
             print(f"[ERROR] WhatsApp failed: {e}")
             self.driver = None
 
+    def wait_for(self, timeout, xpath):
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        return WebDriverWait(self.driver, timeout).until(EC.presence_of_element_located((By.XPATH, xpath)))
+
     def open_chat(self):
         if not self.driver:
             return
         try:
-            search_box = WebDriverWait(self.driver, 20).until(
-                EC.presence_of_element_located((By.XPATH, "//div[@contenteditable='true']"))
-            )
+            from selenium.webdriver.common.keys import Keys
+
+            search_box = self.wait_for(20, "//div[@contenteditable='true']")
             search_box.click()
             search_box.send_keys(WHATSAPP_GROUP_NAME)
             time.sleep(2)
@@ -116,9 +288,9 @@ class WhatsAppBot:
             return False
         with self.lock:
             try:
-                message_box = WebDriverWait(self.driver, 20).until(
-                    EC.presence_of_element_located((By.XPATH, "//footer//div[@contenteditable='true']"))
-                )
+                from selenium.webdriver.common.keys import Keys
+
+                message_box = self.wait_for(20, "//footer//div[@contenteditable='true']")
                 message_box.click()
                 message_box.send_keys(Keys.CTRL + "a")
                 message_box.send_keys(message)
@@ -130,25 +302,60 @@ class WhatsAppBot:
                 print(f"[ERROR] Send failed: {e}")
                 return False
 
+    def send_image(self, path, caption=""):
+        """Attach a local image; the caption is typed into the preview and Enter sends both"""
+        if not self.driver:
+            return False
+        with self.lock:
+            try:
+                from selenium.webdriver.common.action_chains import ActionChains
+                from selenium.webdriver.common.keys import Keys
+
+                self.wait_for(20, "//footer//*[@title='Attach' or @data-icon='plus' or @data-icon='clip']").click()
+                file_input = self.wait_for(10, "//input[@type='file' and contains(@accept, 'image')]")
+                file_input.send_keys(os.path.abspath(path))
+                self.wait_for(20, "//*[@data-icon='send']")
+                ActionChains(self.driver).send_keys(caption).send_keys(Keys.ENTER).perform()
+                time.sleep(2)
+                print("[INFO] Image sent")
+                return True
+            except Exception as e:
+                print(f"[ERROR] Image send failed: {e}")
+                return False
+
 
 # Global instances
 whatsapp_bot = None
 grok_ai = None
+_grok_ai_lock = threading.Lock()
 
-async def retrieve_freshdesk_ticket(params: Dict[str, Any]) -> Dict[str, Any]:
-    """Retrieve ticket and let Groq extract everything"""
+
+def get_grok_ai() -> "GrokAI":
     global grok_ai
-    if not grok_ai:
-        grok_ai = GrokAI()
+    with _grok_ai_lock:
+        if not grok_ai:
+            grok_ai = GrokAI()
+    return grok_ai
+
+
+async def get_grok_ai_async() -> "GrokAI":
+    """get_grok_ai without blocking the loop while the groq SDK is first imported"""
+    if grok_ai:
+        return grok_ai
+    return await asyncio.to_thread(get_grok_ai)
 
+
+async def retrieve_freshdesk_ticket(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Retrieve ticket and let Groq extract everything"""
     ticket_id = params.get("ticket_id")
     if not ticket_id:
         return {"error": "Ticket ID required"}
 
     try:
         # Get ticket from Freshdesk
-        url = f"https://{FRESHDESK_DOMAIN}/api/v2/tickets/{ticket_id}"
-        response = requests.get(url, auth=(API_KEY, "X"))
+        url = f"{FRESHDESK_URL}/api/v2/tickets/{ticket_id}"
+        with EXTERNAL_REQUEST_LATENCY.labels("freshdesk", "get_ticket").time():
+            response = await asyncio.to_thread(requests.get, url, auth=(API_KEY, "X"))
         
         if response.status_code != 200:
             return {"error": f"Failed to get ticket: {response.status_code}"}
@@ -156,7 +363,7 @@ async def retrieve_freshdesk_ticket(params: Dict[str, Any]) -> Dict[str, Any]:
         ticket = response.json()
         
         # Let Groq extract everything
-        extracted = await grok_ai.extract_ticket_info(ticket)
+        extracted = await (await get_grok_ai_async()).extract_ticket_info(ticket)
         
         if "error" in extracted:
             return extracted
@@ -182,23 +389,42 @@ async def send_whatsapp_message(params: Dict[str, Any]) -> Dict[str, Any]:
     """Send emergency alert to WhatsApp"""
     global whatsapp_bot
     if not whatsapp_bot:
-        whatsapp_bot = WhatsAppBot()
+        # Selenium start-up and sends block for seconds; keep them off the event loop
+        whatsapp_bot = await asyncio.to_thread(WhatsAppBot)
 
     incident = params.get("incident_details", {})
     images = params.get("image_urls", [])
 
+    recipient = params.get("whatsapp_number")
+    if recipient:
+        recipient = normalize_phone_number(recipient)
+        if not recipient:
+            return {"error": f"WhatsApp number '{params.get('whatsapp_number')}' is not a valid phone number, please confirm it again"}
+
+    phone_number = normalize_phone_number(incident.get("phone_number")) or incident.get("phone_number") or "N/A"
+
     message = f"""🚨 EMERGENCY ALERT 🚨
 Type: {incident.get('incident_type', 'Unknown')}
 Location: {incident.get('address', 'Unknown')}
-Phone: {incident.get('phone_number', 'N/A')}
+Phone: {phone_number}
 Priority: {incident.get('priority', 'Unknown')}
 Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"""
+    if recipient:
+        message += f"\nResponder WhatsApp: {recipient}"
+
+    # Prefetched at ticket intake; only what is already on disk is used, nothing is downloaded here
+    ready, unreachable = EVIDENCE.attachments(images)
+    images = [url for url in images if url not in unreachable]
+    if unreachable:
+        message += f"\n⚠️ {len(unreachable)} evidence image(s) could not be retrieved"
 
-    success = whatsapp_bot.send_message(message)
+    success = await asyncio.to_thread(whatsapp_bot.send_message, message)
     
     # Send images if any
     for img_url in images[:3]:  # Max 3 images
-        whatsapp_bot.send_message(f"📸 Evidence: {img_url}")
+        if img_url in ready and await asyncio.to_thread(whatsapp_bot.send_image, ready[img_url], "📸 Evidence"):
+            continue
+        await asyncio.to_thread(whatsapp_bot.send_message, f"📸 Evidence: {img_url}")
 
     return {"message": "Alert sent successfully" if success else "Failed to send alert"}
 
@@ -212,10 +438,12 @@ async def update_freshdesk_ticket_status(params: Dict[str, Any]) -> Dict[str, An
         return {"error": "Ticket ID and status required"}
 
     try:
-        url = f"https://{FRESHDESK_DOMAIN}/api/v2/tickets/{ticket_id}"
-        response = requests.put(url, auth=(API_KEY, "X"), json={"status": status})
+        url = f"{FRESHDESK_URL}/api/v2/tickets/{ticket_id}"
+        with EXTERNAL_REQUEST_LATENCY.labels("freshdesk", "update_ticket").time():
+            response = await asyncio.to_thread(requests.put, url, auth=(API_KEY, "X"), json={"status": status})
         
         if response.status_code == 200:
+            invalidate_tool_results("retrieve_freshdesk_ticket", "ticket_id", ticket_id)
             return {"message": f"Ticket {ticket_id} updated to status {status}"}
         else:
             return {"error": f"Update failed: {response.status_code}"}
@@ -223,35 +451,71 @@ async def update_freshdesk_ticket_status(params: Dict[str, Any]) -> Dict[str, An
         return {"error": f"Request failed: {str(e)}"}
 
 
-async def list_freshdesk_tickets(params: Dict[str, Any]) -> Dict[str, Any]:
-    """List all open tickets with AI extraction"""
-    global grok_ai
-    if not grok_ai:
-        grok_ai = GrokAI()
+async def bulk_update_freshdesk_tickets(ticket_ids: List[Any], properties: Dict[str, Any]) -> Dict[str, Any]:
+    """Update several tickets in one request (Freshdesk runs it as a background job)"""
+    if not ticket_ids:
+        return {"error": "Ticket IDs required"}
 
     try:
-        url = f"https://{FRESHDESK_DOMAIN}/api/v2/tickets?filter=new_and_my_open"
-        response = requests.get(url, auth=(API_KEY, "X"))
-        
+        url = f"{FRESHDESK_URL}/api/v2/tickets/bulk_update"
+        body = {"bulk_action": {"ids": list(ticket_ids), "properties": properties}}
+        with EXTERNAL_REQUEST_LATENCY.labels("freshdesk", "bulk_update").time():
+            response = await asyncio.to_thread(requests.post, url, auth=(API_KEY, "X"), json=body)
+
+        if response.status_code in (200, 202):
+            for ticket_id in ticket_ids:
+                invalidate_tool_results("retrieve_freshdesk_ticket", "ticket_id", ticket_id)
+            job_id = response.json().get("job_id") if response.content else None
+            return {"message": f"{len(ticket_ids)} tickets updated", "job_id": job_id}
+        else:
+            return {"error": f"Bulk update failed: {response.status_code}"}
+    except Exception as e:
+        return {"error": f"Request failed: {str(e)}"}
+
+
+async def fetch_freshdesk_tickets() -> Dict[str, Any]:
+    """Fetch raw new/open tickets from Freshdesk without extraction"""
+    try:
+        url = f"{FRESHDESK_URL}/api/v2/tickets?filter=new_and_my_open"
+        with EXTERNAL_REQUEST_LATENCY.labels("freshdesk", "list_tickets").time():
+            response = await asyncio.to_thread(requests.get, url, auth=(API_KEY, "X"))
+
         if response.status_code != 200:
             return {"error": f"Failed to list tickets: {response.status_code}"}
 
-        tickets = response.json()
-        enhanced_tickets = []
-        
-        for ticket in tickets:
-            extracted = await grok_ai.extract_ticket_info(ticket)
-            enhanced_tickets.append({
-                "ticket_id": ticket.get("id"),
-                "subject": ticket.get("subject"),
-                "phone_number": extracted.get("phone_number"),
-                "incident_type": extracted.get("incident_type"),
-                "address": extracted.get("address"),
-                "priority": extracted.get("priority"),
-                "confidence_score": extracted.get("confidence_score"),
-                "status": ticket.get("status")
-            })
-        
+        return {"tickets": response.json()}
+    except Exception as e:
+        return {"error": f"Request failed: {str(e)}"}
+
+
+def build_ticket_summary(ticket: Dict[str, Any], extracted: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge a raw Freshdesk ticket with its extraction"""
+    return {
+        "ticket_id": ticket.get("id"),
+        "subject": ticket.get("subject"),
+        "phone_number": extracted.get("phone_number"),
+        "incident_type": extracted.get("incident_type"),
+        "address": extracted.get("address"),
+        "priority": extracted.get("priority"),
+        "confidence_score": extracted.get("confidence_score"),
+        "image_urls": extracted.get("image_urls", []),
+        "status": ticket.get("status")
+    }
+
+
+async def list_freshdesk_tickets(params: Dict[str, Any]) -> Dict[str, Any]:
+    """List all open tickets with AI extraction"""
+    result = await fetch_freshdesk_tickets()
+    if "error" in result:
+        return result
+
+    try:
+        tickets = result["tickets"]
+        extractions = await (await get_grok_ai_async()).extract_ticket_batch(tickets)
+        enhanced_tickets = [
+            build_ticket_summary(ticket, extractions.get(ticket.get("id"), {}))
+            for ticket in tickets
+        ]
         return {"tickets": enhanced_tickets}
     except Exception as e:
         return {"error": f"Request failed: {str(e)}"}
@@ -262,6 +526,8 @@ FUNCTION_DEFINITIONS = [
     {
         "name": "retrieve_freshdesk_ticket",
         "description": "Get ticket and extract emergency info with AI",
+        "idempotent": True,
+        "cache_ttl": 60,  # Invalidated early by update_freshdesk_ticket_status
         "parameters": {
             "type": "object",
             "properties": {
@@ -285,7 +551,11 @@ FUNCTION_DEFINITIONS = [
                         "priority": {"type": "integer"}
                     }
                 },
-                "image_urls": {"type": "array", "items": {"type": "string"}}
+                "image_urls": {"type": "array", "items": {"type": "string"}},
+                "whatsapp_number": {
+                    "type": "string",
+                    "description": "Responder's confirmed WhatsApp number, digits as spoken (local or international format)"
+                }
             },
             "required": ["incident_details"]
         }
@@ -309,4 +579,6 @@ FUNCTION_MAP = {
     "send_whatsapp_message": send_whatsapp_message, 
     "update_freshdesk_ticket_status": update_freshdesk_ticket_status,
     "list_freshdesk_tickets": list_freshdesk_tickets
-}
\ No newline at end of file
+}
+
+register_tools(FUNCTION_DEFINITIONS)
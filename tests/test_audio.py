@@ -0,0 +1,47 @@
+import array
+import math
+import random
+import unittest
+
+from common.audio import FRAME_MS, VoiceActivityDetector
+
+SAMPLE_RATE = 16000
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+
+
+def tone(rms, start, frequency=300):
+    """One 20 ms frame of a sine whose RMS is `rms`, continuing from sample `start`"""
+    amplitude = rms * math.sqrt(2)
+    return array.array("h", (
+        int(amplitude * math.sin(2 * math.pi * frequency * (start + i) / SAMPLE_RATE)) for i in range(FRAME_SAMPLES)
+    )).tobytes()
+
+
+class VoiceActivityDetectorTest(unittest.TestCase):
+    def test_varied_level_speech_keeps_being_forwarded(self):
+        # 10 s of speech whose loudness swings from frame to frame, as a voice does
+        rng = random.Random(3)
+        vad = VoiceActivityDetector(hangover_ms=600, preroll_ms=200, min_rms=300)
+        forwarded = []
+        for n in range(500):
+            rms = math.exp(rng.uniform(math.log(150), math.log(2000)))
+            forwarded.append(bool(vad.process(tone(rms, n * FRAME_SAMPLES))))
+        self.assertLessEqual(vad.noise_floor, vad.min_rms)
+        self.assertGreater(sum(forwarded[100:]) / len(forwarded[100:]), 0.95)
+
+    def test_silence_after_hangover_is_dropped(self):
+        vad = VoiceActivityDetector(hangover_ms=600, preroll_ms=200, min_rms=300)
+        self.assertTrue(vad.process(tone(2000, 0)))
+        outputs = [vad.process(tone(20, n * FRAME_SAMPLES)) for n in range(1, 100)]
+        self.assertTrue(all(outputs[:30]))
+        self.assertFalse(any(outputs[31:]))
+
+    def test_floor_follows_a_quieter_line_down(self):
+        vad = VoiceActivityDetector(min_rms=300)
+        for n in range(50):
+            vad.process(tone(10, n * FRAME_SAMPLES))
+        self.assertLess(vad.noise_floor, 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
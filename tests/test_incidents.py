@@ -0,0 +1,83 @@
+import unittest
+
+from common.incidents import IncidentIndex
+
+
+def ticket(ticket_id, incident_type="fire", address="12 Mall Road, Lahore"):
+    return {"ticket_id": ticket_id, "incident_type": incident_type, "address": address, "image_urls": []}
+
+
+class IncidentIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = IncidentIndex(window=900, threshold=0.6)
+
+    def test_same_address_within_window_is_a_sibling(self):
+        primary, is_new = self.index.correlate(ticket(1), now=1)
+        self.assertTrue(is_new)
+        incident, is_new = self.index.correlate(ticket(2, address="12 mall rd lahore"), now=800)
+        self.assertFalse(is_new)
+        self.assertIs(incident, primary)
+        self.assertEqual(incident.ticket_ids, [1, 2])
+
+    def test_window_runs_from_the_latest_ticket(self):
+        self.index.correlate(ticket(1), now=1)
+        self.index.correlate(ticket(2), now=800)
+        _, is_new = self.index.correlate(ticket(3), now=1650)
+        self.assertFalse(is_new)
+
+    def test_incident_idle_for_the_window_expires(self):
+        # Younger incidents of other types must not keep the stale fire incident alive
+        self.index.correlate(ticket(1), now=1)
+        self.index.correlate(ticket(2), now=800)
+        self.index.correlate(ticket(3, "flood", "Canal Bank Road"), now=860)
+        self.index.correlate(ticket(4, "theft", "Liberty Market, Gulberg"), now=950)
+        _, is_new = self.index.correlate(ticket(5), now=1750)
+        self.assertTrue(is_new)
+        self.assertEqual(len(self.index), 3)  # flood, theft and the new fire
+
+    def test_reopen_dials_the_next_sibling(self):
+        self.index.correlate(ticket(1), now=1)
+        self.assertIsNotNone(self.index.reopen(1))
+        incident, is_new = self.index.correlate(ticket(2), now=10)
+        self.assertTrue(is_new)
+        self.assertEqual(incident.primary["ticket_id"], 2)
+        self.assertEqual(len(self.index), 1)
+
+    def test_siblings_are_held_until_answered(self):
+        self.index.correlate(ticket(1), now=1)
+        incident, _ = self.index.correlate(ticket(2), now=5)
+        self.assertFalse(incident.answered)
+        self.assertTrue(self.index.linked(2))
+        self.assertIsNone(self.index.answered(2))  # Only the primary's call can answer the incident
+        self.assertIs(self.index.answered(1), incident)
+        self.assertTrue(incident.answered)
+        self.assertEqual(incident.siblings, [2])
+
+    def test_reopen_hands_back_the_held_siblings(self):
+        self.index.correlate(ticket(1), now=1)
+        self.index.correlate(ticket(2), now=5)
+        self.index.correlate(ticket(3), now=9)
+        incident = self.index.reopen(1)
+        self.assertEqual(incident.siblings, [2, 3])
+        self.assertFalse(self.index.linked(2))
+        # Retried, the first sibling leads a new incident and is dialed; the next one is linked to it
+        retried, is_new = self.index.correlate(ticket(2), now=70)
+        self.assertTrue(is_new)
+        _, is_new = self.index.correlate(ticket(3), now=70)
+        self.assertFalse(is_new)
+        self.assertEqual(retried.siblings, [3])
+
+    def test_reopen_unknown_ticket(self):
+        self.index.correlate(ticket(1), now=1)
+        self.assertIsNone(self.index.reopen(99))
+        _, is_new = self.index.correlate(ticket(2), now=10)
+        self.assertFalse(is_new)
+
+    def test_different_house_numbers_are_different_incidents(self):
+        self.index.correlate(ticket(1), now=1)
+        _, is_new = self.index.correlate(ticket(2, address="14 Mall Road, Lahore"), now=2)
+        self.assertTrue(is_new)
+
+
+if __name__ == "__main__":
+    unittest.main()
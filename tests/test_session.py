@@ -0,0 +1,48 @@
+import unittest
+
+from common.session import CONVERSATION_HISTORY_TURNS, SESSION_EVENT_LIMIT, CallSession, SessionRegistry
+
+
+class SessionRegistryTest(unittest.TestCase):
+    def test_lookup_by_call_sid_and_stream_sid(self):
+        registry = SessionRegistry()
+        session = registry.add(CallSession("CA1", {"ticket_id": 1}))
+        registry.bind_stream(session, "MZ1")
+        self.assertIs(registry.get("CA1"), session)
+        self.assertIs(registry.by_stream("MZ1"), session)
+
+        registry.bind_stream(session, "MZ2")
+        self.assertIsNone(registry.by_stream("MZ1"))
+        self.assertIs(registry.by_stream("MZ2"), session)
+
+        self.assertIs(registry.remove("CA1"), session)
+        self.assertIsNone(registry.by_stream("MZ2"))
+        self.assertNotIn("CA1", registry)
+        self.assertIsNone(registry.remove("CA1"))
+
+
+class CallSessionTest(unittest.TestCase):
+    def test_events_do_not_evict_transcript_turns(self):
+        session = CallSession("CA1", {"ticket_id": 1})
+        session.record("user", "Fire at the market")
+        session.record("assistant", "Units are on the way")
+        for _ in range(SESSION_EVENT_LIMIT * 2):
+            session.record("function_call", "retrieve_freshdesk_ticket")
+        self.assertEqual(
+            session.transcript(),
+            [{"role": "user", "content": "Fire at the market"}, {"role": "assistant", "content": "Units are on the way"}],
+        )
+        self.assertEqual(len(session.events), SESSION_EVENT_LIMIT)
+
+    def test_transcript_keeps_the_latest_turns(self):
+        session = CallSession("CA1", {"ticket_id": 1})
+        for turn in range(CONVERSATION_HISTORY_TURNS + 5):
+            session.record("user", str(turn))
+        turns = session.transcript()
+        self.assertEqual(len(turns), CONVERSATION_HISTORY_TURNS)
+        self.assertEqual(turns[-1]["content"], str(CONVERSATION_HISTORY_TURNS + 4))
+        self.assertEqual(len(session.transcript(3)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()